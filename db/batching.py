@@ -0,0 +1,144 @@
+import hashlib
+import time
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_BATCH_BYTES = 4 * 1024 * 1024
+
+def document_key(page_content, metadata):
+    """
+    Returns a key identifying a chunk by its location and content, used to drop duplicate writes:
+    its chunk ID ("uuid", see db.chunks.chunk_id) when it has one.
+    """
+    if metadata.get("uuid"):
+        return metadata["uuid"]
+    digest = hashlib.sha1()
+    for part in (metadata.get("file_path"), metadata.get("name"), metadata.get("start_line"), metadata.get("end_line")):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+def stored_ids(db):
+    """
+    Returns the set of document IDs already in a vector store: a DeepLake store's id tensor,
+    or what the store's own stored_ids() or in-memory `ids` report. Returns None if the store
+    cannot list them.
+    """
+    if callable(getattr(db, "stored_ids", None)):
+        return db.stored_ids()
+    if isinstance(getattr(db, "ids", None), list):
+        return set(db.ids)
+    dataset = getattr(getattr(db, "vectorstore", None), "dataset", None)
+    tensor = getattr(db, "_id_tensor_name", "id")
+    if dataset is None or tensor not in dataset.tensors:
+        return None
+    return set(dataset[tensor].data()["value"]) if len(dataset) else set()
+
+class BatchWriter:
+    """
+    Collects documents and writes them to a vector store in batches. A batch is flushed once it
+    holds `batch_size` documents or `batch_bytes` bytes of text, so each batch costs one
+    `add_texts` call (and therefore one embedding call). Duplicate documents are skipped.
+    `on_flush`, if given, is called with the metadatas of every batch that was written successfully.
+
+    Documents with a chunk ID ("uuid" in their metadata) are written under that ID. IDs in
+    `existing_ids` (see stored_ids) are skipped without being embedded: a chunk ID covers the
+    file path and content, so the stored document is already up to date and rerunning an
+    ingestion does not grow the store.
+    """
+    def __init__(self, db, batch_size=DEFAULT_BATCH_SIZE, batch_bytes=DEFAULT_BATCH_BYTES, verbose=True, on_flush=None,
+                 existing_ids=None):
+        if batch_size < 1 or batch_bytes < 1:
+            raise ValueError("batch_size and batch_bytes must be positive")
+        self.db = db
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.verbose = verbose
+        self.on_flush = on_flush
+        self.texts = []
+        self.metadatas = []
+        self.pending_bytes = 0
+        self.seen = set()
+        self.existing_ids = existing_ids or set()
+        self.batches = []
+        self.chunks_saved = 0
+        self.duplicates = 0
+        self.existing = 0
+        self.errors = []
+
+    def add(self, page_content, metadata=None):
+        """
+        Queues a document, flushing the current batch first if it is full.
+        Returns False if the document was empty, a duplicate or already stored.
+        """
+        metadata = metadata or {}
+        if not page_content:
+            return False
+        key = document_key(page_content, metadata)
+        if key in self.seen:
+            self.duplicates += 1
+            return False
+        self.seen.add(key)
+        if key in self.existing_ids:
+            self.existing += 1
+            return False
+
+        size = len(page_content.encode("utf-8"))
+        if self.texts and self.pending_bytes + size > self.batch_bytes:
+            self.flush()
+        self.texts.append(page_content)
+        self.metadatas.append(metadata)
+        self.pending_bytes += size
+        if len(self.texts) >= self.batch_size or self.pending_bytes >= self.batch_bytes:
+            self.flush()
+        return True
+
+    def add_documents(self, documents):
+        for document in documents:
+            self.add(document.get('page_content', ''), document.get('metadata', {}))
+
+    def flush(self):
+        """
+        Writes the pending batch with a single add_texts call and records its throughput.
+        """
+        if not self.texts:
+            return None
+        texts, metadatas, size = self.texts, self.metadatas, self.pending_bytes
+        self.texts, self.metadatas, self.pending_bytes = [], [], 0
+
+        ids = [metadata.get("uuid") for metadata in metadatas]
+        start = time.perf_counter()
+        try:
+            self.db.add_texts(texts, metadatas=metadatas, ids=ids if all(ids) else None)
+        except Exception as e:
+            self.errors.append(e)
+            print(f"Error adding batch of {len(texts)} documents: {e}")
+            return None
+        elapsed = time.perf_counter() - start
+
+        stats = {
+            "batch": len(self.batches) + 1,
+            "documents": len(texts),
+            "bytes": size,
+            "seconds": elapsed,
+            "docs_per_sec": len(texts) / elapsed if elapsed else float("inf"),
+            "bytes_per_sec": size / elapsed if elapsed else float("inf"),
+        }
+        self.batches.append(stats)
+        self.chunks_saved += len(texts)
+        if self.verbose:
+            print(f"Batch {stats['batch']}: wrote {stats['documents']} documents ({stats['bytes']} bytes) "
+                  f"in {elapsed:.2f}s ({stats['docs_per_sec']:.1f} docs/s)")
+        if self.on_flush is not None:
+            self.on_flush(metadatas)
+        return stats
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,32 @@
+import argparse
+import time
+from ..chunks import extract_chunks_from_code, EXTRACTION_MODES
+from .synthetic import generate_source
+
+def time_mode(source, mode, repeat):
+    best = float("inf")
+    chunks = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = extract_chunks_from_code(source, mode=mode)
+        best = min(best, time.perf_counter() - start)
+    return best, len(chunks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare astor and slice chunk extraction.")
+    parser.add_argument("--classes", type=int, default=50)
+    parser.add_argument("--methods", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    source = generate_source(args.classes, args.methods, args.depth)
+    print(f"Source: {len(source.splitlines())} lines, {len(source.encode('utf-8'))} bytes, nesting depth {args.depth}")
+
+    results = {mode: time_mode(source, mode, args.repeat) for mode in EXTRACTION_MODES}
+    for mode, (elapsed, count) in results.items():
+        print(f"{mode:>6}: {elapsed * 1000:10.2f} ms for {count} chunks")
+    print(f"Speedup (astor / slice): {results['astor'][0] / results['slice'][0]:.1f}x")
+
+if __name__ == "__main__":
+    main()
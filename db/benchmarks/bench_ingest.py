@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+import git
+from .. import utils
+from ..chunks import extract_chunks_from_code, process_python_file
+from ..connectors import ingest_git_repo
+from ..pipeline import iter_repo_files, iter_repo_documents
+from ..state import CheckpointStore
+from .synthetic import build_synthetic_repo, build_bare_remote
+
+class InMemoryVectorStore:
+    """
+    Stand-in for the DeepLake store: embeds texts with the given embedding function and keeps
+    everything in lists.
+    """
+    def __init__(self, dataset_path=None, embedding_function=None):
+        self.dataset_path = dataset_path
+        self.embedding_function = embedding_function
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.vectors = []
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        texts = list(texts)
+        ids = ids or [str(len(self.texts) + i) for i in range(len(texts))]
+        self.vectors.extend(self.embedding_function.embed_documents(texts))
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas or [{}] * len(texts))
+        return ids
+
+    def delete(self, ids=None, filter=None, **kwargs):
+        wanted = (filter or {}).get("metadata", {})
+        unwanted = set(ids or ())
+        keep = [i for i, metadata in enumerate(self.metadatas)
+                if self.ids[i] not in unwanted and (not wanted or any(metadata.get(k) != v for k, v in wanted.items()))]
+        self.ids = [self.ids[i] for i in keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self.vectors = [self.vectors[i] for i in keep]
+        return True
+
+def max_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    Lifetime maximum resident set size, in MB, of this process (RUSAGE_SELF) or of the largest
+    of its terminated children (RUSAGE_CHILDREN). Neither can go down between stages.
+    """
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+def current_rss_mb():
+    """
+    Current resident set size of this process in MB, or None where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+class RssSampler:
+    """
+    Polls this process's RSS on a background thread while a stage runs and keeps the maximum,
+    so each stage reports its own peak rather than the process's lifetime one.
+    """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        return False
+
+def run_stage(name, func):
+    """
+    Runs one stage; func returns (files, chunks). Returns the stage's metrics.
+    """
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        files, chunks = func()
+        seconds = time.perf_counter() - start
+    result = {
+        "stage": name,
+        "seconds": seconds,
+        "files": files,
+        "chunks": chunks,
+        "files_per_sec": files / seconds if seconds else None,
+        "chunks_per_sec": chunks / seconds if seconds else None,
+        # Sampled peak of this process during the stage; pool workers are not included
+        "stage_peak_rss_mb": sampler.peak,
+        # Lifetime maxima, reported separately because they cannot be attributed to a stage
+        "max_rss_self_mb": max_rss_mb(resource.RUSAGE_SELF),
+        "max_rss_children_mb": max_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    stage_peak = f"{sampler.peak:.1f} MB" if sampler.peak is not None else "n/a"
+    print(f"{name:<24} {seconds:8.3f}s  {result['files_per_sec'] or 0:10.1f} files/s  "
+          f"{result['chunks_per_sec'] or 0:10.1f} chunks/s  stage peak RSS {stage_peak}  "
+          f"(max self {result['max_rss_self_mb']:.1f} MB, max child {result['max_rss_children_mb']:.1f} MB)")
+    return result
+
+def tree_commit():
+    try:
+        return git.Repo(os.path.dirname(__file__), search_parent_directories=True).head.commit.hexsha
+    except Exception:
+        return None
+
+def run_benchmarks(args, work_dir):
+    repo_dir = os.path.join(work_dir, "source", "synthetic")
+    repo = build_synthetic_repo(repo_dir, num_files=args.files, num_classes=args.classes,
+                                methods_per_class=args.methods, depth=args.depth)
+    repo_url = build_bare_remote(repo, os.path.join(work_dir, "remote", "synthetic.git"))
+    files = list(iter_repo_files(repo_dir))
+    base_path = os.path.join(work_dir, "ingest", "base")
+    stages = []
+
+    def extract():
+        chunks = 0
+        for file_path in files:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                chunks += len(extract_chunks_from_code(f.read(), mode=args.mode))
+        return len(files), chunks
+    stages.append(run_stage("extract_chunks_from_code", extract))
+
+    def process():
+        return len(files), sum(len(process_python_file(f, mode=args.mode)) for f in files)
+    stages.append(run_stage("process_python_file", process))
+
+    def parallel():
+        return len(files), sum(1 for _ in iter_repo_documents(repo_dir, workers=args.workers, mode=args.mode))
+    stages.append(run_stage("iter_repo_documents", parallel))
+
+    def ingest():
+        path = ingest_git_repo(repo_url, base_path, snapshot=args.snapshot)
+        return len(list(iter_repo_files(path))), 0
+    stages.append(run_stage(f"ingest_git_repo ({args.snapshot})", ingest))
+
+    cache_path = os.path.join(work_dir, "chunk_cache.sqlite3")
+    for label in ("cold", "warm"):
+        store = InMemoryVectorStore()
+
+        def save():
+            # A fresh checkpoint store per run, kept away from the real one
+            state = CheckpointStore(os.path.join(work_dir, f"checkpoints_{label}.sqlite3"))
+            try:
+                utils.save_to_db(repo_url, "memory://benchmark", base_path, commit_id=repo.head.commit.hexsha,
+                                 workers=args.workers, cache_path=cache_path, embedding_backend="hashing",
+                                 vectorstore=lambda path, embedding: _bind(store, path, embedding), state=state)
+            finally:
+                state.close()
+            return len(files), len(store.texts)
+        stages.append(run_stage(f"save_to_db ({label} cache)", save))
+
+    return stages
+
+def _bind(store, path, embedding):
+    store.dataset_path = path
+    store.embedding_function = embedding
+    return store
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {stage["stage"]: stage for stage in json.load(f)["stages"]}
+    print(f"\nComparison with {baseline_path}:")
+    for stage in results["stages"]:
+        previous = baseline.get(stage["stage"])
+        if previous and previous["seconds"]:
+            ratio = stage["seconds"] / previous["seconds"]
+            print(f"{stage['stage']:<24} {previous['seconds']:8.3f}s -> {stage['seconds']:8.3f}s ({ratio:.2f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the db ingestion pipeline on a synthetic repository.")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--classes", type=int, default=5)
+    parser.add_argument("--methods", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--mode", choices=("astor", "slice"), default="slice")
+    parser.add_argument("--snapshot", choices=("copy", "hardlink", "git"), default="git")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Compare against a previous JSON result")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="berlayar-bench-")
+    try:
+        stages = run_benchmarks(args, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "commit": tree_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": vars(args),
+        "stages": stages,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
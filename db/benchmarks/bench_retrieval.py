@@ -0,0 +1,64 @@
+import argparse
+import json
+import time
+import numpy as np
+from langchain.vectorstores.utils import maximal_marginal_relevance
+from ..retrieval import mmr, top_k_cosine
+
+def time_call(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run_benchmarks(fetch_ks=(20, 100, 1000), k=4, dim=384, lambda_mult=0.5, repeat=5, seed=0):
+    """
+    Times langchain's maximal_marginal_relevance against db.retrieval.mmr and top_k_cosine on
+    random candidate matrices of every size in `fetch_ks`. Returns one result dict per size.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for fetch_k in fetch_ks:
+        candidates = rng.normal(size=(fetch_k, dim)).astype(np.float32)
+        query = rng.normal(size=dim).astype(np.float32)
+        langchain_seconds, expected = time_call(
+            lambda: maximal_marginal_relevance(query, candidates, lambda_mult=lambda_mult, k=k), repeat)
+        mmr_seconds, selected = time_call(lambda: mmr(query, candidates, k=k, lambda_mult=lambda_mult), repeat)
+        top_k_seconds, _ = time_call(lambda: top_k_cosine(query, candidates, k=k), repeat)
+        results.append({
+            "fetch_k": fetch_k,
+            "k": k,
+            "dim": dim,
+            "langchain_mmr_ms": langchain_seconds * 1000,
+            "numpy_mmr_ms": mmr_seconds * 1000,
+            "top_k_ms": top_k_seconds * 1000,
+            "speedup": langchain_seconds / mmr_seconds if mmr_seconds else float("inf"),
+            "same_selection": [int(i) for i in expected] == selected,
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare langchain's and the vectorized MMR reranking.")
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.fetch_k, args.k, args.dim, args.lambda_mult, args.repeat)
+    print(f"{'fetch_k':>8} {'langchain mmr':>14} {'numpy mmr':>10} {'top-k':>8} {'speedup':>8}")
+    for result in results:
+        print(f"{result['fetch_k']:>8} {result['langchain_mmr_ms']:>11.3f} ms {result['numpy_mmr_ms']:>7.3f} ms "
+              f"{result['top_k_ms']:>5.3f} ms {result['speedup']:>7.1f}x"
+              f"{'' if result['same_selection'] else '  (selections differ)'}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import git
+
+def generate_source(num_classes=50, methods_per_class=10, depth=3, prefix=""):
+    """
+    Generates a synthetic Python module with decorated, commented and nested definitions.
+    """
+    lines = []
+    for c in range(num_classes):
+        lines.append(f"class {prefix}Class{c}:")
+        lines.append(f'    """Docstring for {prefix}Class{c}."""')
+        for m in range(methods_per_class):
+            indent = "    "
+            lines.append(f"{indent}@staticmethod")
+            lines.append(f"{indent}def method_{m}(x, y=1):")
+            for d in range(depth):
+                indent += "    "
+                lines.append(f"{indent}# nesting level {d}")
+                lines.append(f"{indent}def inner_{d}(z):")
+            indent += "    "
+            lines.append(f"{indent}total = len(\"{prefix}\")")
+            lines.append(f"{indent}for i in range(10):")
+            lines.append(f"{indent}    total += i * {m}  # accumulate")
+            lines.append(f"{indent}return total")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def build_synthetic_repo(path, num_files=100, files_per_dir=20, num_classes=5, methods_per_class=5, depth=2):
+    """
+    Creates a git repository at `path` with `num_files` generated Python modules spread over
+    nested package directories, commits them, and returns the git.Repo.
+    """
+    repo = git.Repo.init(path)
+    for i in range(num_files):
+        package = os.path.join(*[f"pkg_{i // files_per_dir}"] + [f"sub_{d}" for d in range(i % 3)])
+        file_path = os.path.join(path, package, f"module_{i}.py")
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(generate_source(num_classes, methods_per_class, depth, prefix=f"M{i}"))
+    repo.git.add(A=True)
+    actor = git.Actor("Benchmark", "benchmark@example.com")
+    repo.index.commit("synthetic repository", author=actor, committer=actor)
+    return repo
+
+def build_bare_remote(repo, path):
+    """
+    Clones `repo` into a bare repository at `path` and returns its file:// URL. Like GitHub, the
+    remote serves partial clone filters and fetches of arbitrary commits.
+    """
+    remote = git.Repo.clone_from(repo.working_tree_dir, path, bare=True)
+    with remote.config_writer() as config:
+        config.set_value("uploadpack", "allowFilter", "true")
+        config.set_value("uploadpack", "allowAnySHA1InWant", "true")
+    return "file://" + os.path.abspath(path)
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from array import array
+from .chunks import CHUNKER_VERSION
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'chunk_cache.sqlite3')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+LOCATION_KEYS = ("file_path", "object_id", "commit_id")
+
+def chunks_key(object_id, mode="slice"):
+    """
+    Cache key of a blob's chunks. Chunks differ by extraction mode and chunker version, so both
+    are part of the key; for files other than Python `mode` names their chunker (see
+    db.chunkers.chunker_kind).
+    """
+    return f"blob:v{CHUNKER_VERSION}:{mode}:{object_id}"
+
+def content_key(text, model_name=""):
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+class ChunkCache:
+    """
+    On-disk, content-addressed cache backed by SQLite. Extracted chunks are stored under the git
+    blob SHA of the file they came from, and embedding vectors under the hash of the chunk text
+    (and model), so an unchanged blob costs one lookup instead of a parse and a forward pass.
+    Entries are evicted least-recently-used first once the cache exceeds `max_bytes` or
+    `max_entries`.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, max_entries=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.conn.commit()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.vector_hits = 0
+        self.vector_misses = 0
+
+    def _totals(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries").fetchone()
+
+    def stats(self):
+        total_bytes, total_entries = self._totals()
+        lookups = self.hits + self.misses
+        vector_lookups = self.vector_hits + self.vector_misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "vector_hits": self.vector_hits,
+            "vector_misses": self.vector_misses,
+            "vector_hit_ratio": self.vector_hits / vector_lookups if vector_lookups else 0.0,
+            "entries": total_entries,
+            "bytes": total_bytes,
+        }
+
+    def _get(self, keys):
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self.conn.execute(
+                f"SELECT key, value FROM entries WHERE key IN ({placeholders})", batch).fetchall())
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(now, k) for k in found])
+            self.conn.commit()
+        return found
+
+    def _put(self, items):
+        now = time.time()
+        self.conn.executemany("INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                              [(key, value, len(value), now) for key, value in items])
+        self.conn.commit()
+        self.evict()
+
+    def get_chunks(self, object_id, mode="slice"):
+        """
+        Returns the cached chunks of a blob extracted in `mode` (without per-location metadata), or None.
+        """
+        key = chunks_key(object_id, mode)
+        value = self._get([key]).get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def put_chunks(self, object_id, chunks, mode="slice"):
+        chunks = [{k: v for k, v in chunk.items() if k not in LOCATION_KEYS} for chunk in chunks]
+        self._put([(chunks_key(object_id, mode), json.dumps(chunks).encode("utf-8"))])
+
+    def get_vectors(self, keys):
+        """
+        Returns a dict of content key -> vector for the keys present in the cache.
+        """
+        found = self._get([f"vec:{k}" for k in keys])
+        vectors = {}
+        for key, value in found.items():
+            vector = array("f")
+            vector.frombytes(value)
+            vectors[key[4:]] = vector.tolist()
+        self.vector_hits += len(vectors)
+        self.vector_misses += len(keys) - len(vectors)
+        return vectors
+
+    def put_vectors(self, vectors):
+        self._put([(f"vec:{k}", array("f", v).tobytes()) for k, v in vectors.items()])
+
+    def evict(self):
+        """
+        Drops least-recently-used entries until the cache fits its size and entry limits. The
+        totals are read from the database inside a write transaction rather than counted per
+        connection, so every process sharing the file enforces the limits on the same numbers.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            total_bytes, total_entries = self._totals()
+            excess_bytes = total_bytes - self.max_bytes
+            excess_entries = total_entries - self.max_entries if self.max_entries is not None else 0
+            if excess_bytes <= 0 and excess_entries <= 0:
+                return
+            evicted = []
+            for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+                if excess_bytes <= 0 and excess_entries <= 0:
+                    break
+                evicted.append((key,))
+                excess_bytes -= size
+                excess_entries -= 1
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def close(self):
+        self.conn.close()
+
+class CachedEmbeddings:
+    """
+    Wraps a langchain embeddings object so that vectors for chunk text already seen are served
+    from the ChunkCache, and only the missing texts go through the model in one call.
+    """
+    def __init__(self, embedding, cache, model_name=""):
+        self.embedding = embedding
+        self.cache = cache
+        self.model_name = model_name or getattr(embedding, "model_name", "")
+
+    def embed_documents(self, texts):
+        keys = [content_key(text, self.model_name) for text in texts]
+        vectors = self.cache.get_vectors(list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            computed = dict(zip(missing, self.embedding.embed_documents(list(missing.values()))))
+            self.cache.put_vectors(computed)
+            vectors.update(computed)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embedding.embed_query(text)
@@ -0,0 +1,248 @@
+import bisect
+import json
+import os
+import re
+from .chunks import assign_chunk_ids, process_python_source, to_documents
+
+# Members of a JSON document longer than this are split into their own members
+JSON_MAX_CHARS = 2000
+
+_HEADING = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+# Strings (skipped whole, so brackets inside them are ignored) and brackets of a JSON document
+_JSON_STRUCTURE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]')
+
+# suffix -> (kind, chunker); see register_chunker
+CHUNKERS = {}
+
+def register_chunker(suffixes, kind, chunker):
+    """
+    Registers `chunker` for files ending in any of `suffixes`. A chunker is called as
+    chunker(code, file_path, object_id=None, commit_id=None, mode=...) and returns documents in
+    the schema of process_python_source. `kind` names the chunker in chunk cache keys, so two
+    chunkers never share cached chunks of the same blob.
+
+    Chunking runs in pool workers, which only see chunkers registered at import time of a
+    module they import; register custom chunkers in an imported module, not in __main__.
+    """
+    for suffix in suffixes:
+        CHUNKERS[suffix.lower()] = (kind, chunker)
+
+def registered_suffixes():
+    """
+    Returns the suffixes of every registered chunker, for filtering the walk over a repository.
+    """
+    return tuple(CHUNKERS)
+
+def get_chunker(file_path):
+    suffix = os.path.splitext(file_path)[1].lower()
+    if suffix not in CHUNKERS:
+        raise ValueError(f"No chunker registered for {file_path}")
+    return CHUNKERS[suffix]
+
+def chunker_kind(file_path, mode):
+    """
+    Names the chunker (and, for Python, the extraction mode) that chunks `file_path`, as used
+    in chunk cache keys.
+    """
+    kind, _ = get_chunker(file_path)
+    return mode if kind == "python" else kind
+
+def chunk_source(code, file_path, object_id=None, commit_id=None, mode="astor"):
+    """
+    Chunks source that is already in memory with the chunker registered for its extension.
+    """
+    _, chunker = get_chunker(file_path)
+    return chunker(code, file_path, object_id=object_id, commit_id=commit_id, mode=mode)
+
+def process_file(file_path, object_id=None, commit_id=None, mode="astor"):
+    """
+    Reads a file from disk and chunks it with the chunker registered for its extension.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        code = file.read()
+
+    return chunk_source(code, file_path, object_id=object_id, commit_id=commit_id, mode=mode)
+
+def _chunk(chunk_uuid, name, qualified_name, code, start_line, end_line, parent):
+    # chunk_uuid only has to be unique within the file until assign_chunk_ids replaces it
+    return {
+        "uuid": chunk_uuid,
+        "name": name,
+        "qualified_name": qualified_name,
+        "code": code,
+        "start_line": start_line,
+        "end_line": end_line,
+        "parent": parent
+    }
+
+def extract_markdown_chunks(text):
+    """
+    Splits Markdown into one chunk per ATX heading section, from the heading to the next heading
+    of any level. A section's parent is the closest preceding heading of a higher level, and
+    text before the first heading becomes a "preamble" chunk. Headings inside fenced code
+    blocks are ignored. A section's qualified name joins the titles of its enclosing headings
+    with " > ".
+    """
+    lines = text.splitlines(keepends=True)
+    chunks = []
+    # (level, uuid, qualified name) of the headings enclosing the current line
+    stack = []
+    fence = None
+    # uuid, name, qualified name, first line index and parent uuid of the section being read
+    section = ("preamble", "preamble", "preamble", 0, None)
+
+    def close(end):
+        chunk_uuid, name, qualified_name, start, parent = section
+        code = "".join(lines[start:end])
+        if code.strip():
+            chunks.append(_chunk(chunk_uuid, name, qualified_name, code, start + 1, end, parent))
+
+    for i, line in enumerate(lines):
+        match = _FENCE.match(line)
+        if match:
+            marker = match.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+            continue
+        if fence is not None:
+            continue
+        match = _HEADING.match(line.rstrip("\r\n"))
+        if not match:
+            continue
+        close(i)
+        level = len(match.group(1))
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        title = (match.group(2) or '').strip()
+        qualified_name = f"{stack[-1][2]} > {title}" if stack else title
+        section = (str(i), f"section_{title}", qualified_name, i, stack[-1][1] if stack else None)
+        stack.append((level, str(i), qualified_name))
+    close(len(lines))
+
+    return assign_chunk_ids(chunks)
+
+def _member_path(path, key):
+    return f"{path}.{key}" if key.isidentifier() else f"{path}[{json.dumps(key)}]"
+
+def _skip(text, pos):
+    return _WHITESPACE.match(text, pos).end()
+
+def _value_end(text, pos):
+    """
+    Returns the end of the (valid) JSON value at `pos`. Objects and arrays are matched bracket by
+    bracket with a regex that skips over strings, so nesting depth costs no recursion.
+    """
+    if text[pos] not in "{[":
+        return _decoder.raw_decode(text, pos)[1]
+    depth = 0
+    for match in _JSON_STRUCTURE.finditer(text, pos):
+        token = match.group()
+        if token in "{[":
+            depth += 1
+        elif token in "}]":
+            depth -= 1
+            if not depth:
+                return match.end()
+    raise ValueError(f"Unterminated JSON value at char {pos}")
+
+def _json_members(text, pos, path):
+    """
+    Yields (path, key, start, value_start, end) for each member of the (valid) object or array
+    at `pos`, where an object member starts at its key.
+    """
+    is_object = text[pos] == "{"
+    pos = _skip(text, pos + 1)
+    index = 0
+    while text[pos] not in "}]":
+        start, key = pos, None
+        if is_object:
+            key, pos = _decoder.raw_decode(text, pos)
+            pos = _skip(text, _skip(text, pos) + 1)
+            member_path = _member_path(path, key)
+        else:
+            member_path = f"{path}[{index}]"
+        end = _value_end(text, pos)
+        yield member_path, key, start, pos, end
+        index += 1
+        pos = _skip(text, end)
+        if text[pos] == ",":
+            pos = _skip(text, pos + 1)
+
+def extract_json_chunks(text, max_chars=JSON_MAX_CHARS):
+    """
+    Splits a JSON document by JSON path. A value of at most `max_chars` characters (object
+    members including their key) is one chunk with its source text, named by its path, e.g.
+    "$.resources[0]". A larger object or array becomes an outline chunk listing its keys or
+    length, and each of its members is chunked the same way with the outline as parent.
+
+    The document is validated with json.loads; spans are then found only for the members of
+    values that have to be split. Raises ValueError for invalid JSON, including documents nested
+    too deeply for the json module.
+    """
+    try:
+        json.loads(text)
+    except RecursionError:
+        raise ValueError("JSON document is nested too deeply to chunk") from None
+    line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+
+    def line(offset):
+        return bisect.bisect_right(line_starts, offset)
+
+    chunks = []
+    start = _skip(text, 0)
+    stack = [(("$", None, start, start, _value_end(text, start)), None)]
+    while stack:
+        (path, _, start, value_start, end), parent = stack.pop()
+        children = []
+        if end - start > max_chars and text[value_start] in "{[":
+            children = list(_json_members(text, value_start, path))
+        if not children:
+            chunks.append(_chunk(str(len(chunks)), path, path, text[start:end], line(start), line(end - 1), parent))
+            continue
+        if text[value_start] == "[":
+            outline = f"{path}: array of {len(children)} items"
+        else:
+            keys = ", ".join(child[1] for child in children)
+            outline = f"{path}: object with keys {keys}"
+        chunk = _chunk(str(len(chunks)), path, path, outline[:max_chars], line(start), line(end - 1), parent)
+        chunks.append(chunk)
+        stack.extend((child, chunk["uuid"]) for child in reversed(children))
+    return assign_chunk_ids(chunks)
+
+def extract_notebook_chunks(text):
+    """
+    Splits a Jupyter notebook into one chunk per non-empty cell, named "<cell_type>_cell_<n>".
+    Line numbers count the cells' source lines one after another, as if the notebook were
+    exported to a script.
+    """
+    notebook = json.loads(text)
+    chunks = []
+    line = 1
+    for n, cell in enumerate(notebook.get("cells", [])):
+        source = cell.get("source", "")
+        code = "".join(source) if isinstance(source, list) else source
+        lines = len(code.splitlines()) or 1
+        if code.strip():
+            name = f"{cell.get('cell_type', 'code')}_cell_{n}"
+            chunks.append(_chunk(str(n), name, name, code, line, line + lines - 1, None))
+        line += lines
+    return assign_chunk_ids(chunks)
+
+def process_markdown_source(code, file_path, object_id=None, commit_id=None, mode=None):
+    return to_documents(extract_markdown_chunks(code), file_path, object_id, commit_id)
+
+def process_json_source(code, file_path, object_id=None, commit_id=None, mode=None):
+    return to_documents(extract_json_chunks(code), file_path, object_id, commit_id)
+
+def process_notebook_source(code, file_path, object_id=None, commit_id=None, mode=None):
+    return to_documents(extract_notebook_chunks(code), file_path, object_id, commit_id)
+
+register_chunker((".py",), "python", process_python_source)
+register_chunker((".md", ".markdown"), "markdown", process_markdown_source)
+register_chunker((".json",), "json", process_json_source)
+register_chunker((".ipynb",), "ipynb", process_notebook_source)
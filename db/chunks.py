@@ -1,43 +1,135 @@
 import ast
+import hashlib
 import uuid
 import astor
 
-def extract_chunks_from_code(code_string):
+CHUNK_NODE_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+EXTRACTION_MODES = ("astor", "slice")
+# Bump whenever the chunks extracted from the same source change, so cached chunks are not reused
+CHUNKER_VERSION = 2
+# Chunk IDs are name-based UUIDs in this namespace (see chunk_id)
+CHUNK_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "db.chunks")
+
+class SourceIndex:
+    """
+    Wraps the UTF-8 bytes of a source file with a precomputed line-offset table so that
+    AST positions (1-based lines, byte columns) can be turned into slices without copying.
+    """
+    def __init__(self, code_string):
+        self.data = code_string.encode("utf-8")
+        self.view = memoryview(self.data)
+        self.line_offsets = [0]
+        find = self.data.find
+        pos = find(b"\n")
+        while pos != -1:
+            self.line_offsets.append(pos + 1)
+            pos = find(b"\n", pos + 1)
+
+    def offset(self, lineno, col_offset):
+        return self.line_offsets[lineno - 1] + col_offset
+
+    def node_span(self, node):
+        """
+        Returns the (start, end) byte offsets of a node, including any decorators.
+        """
+        start_line = node.lineno
+        decorators = getattr(node, "decorator_list", None)
+        if decorators:
+            start_line = min(start_line, min(d.lineno for d in decorators))
+        start = self.offset(start_line, node.col_offset)
+        end = self.offset(node.end_lineno, node.end_col_offset)
+        return start, end
+
+    def slice(self, start, end):
+        return self.view[start:end]
+
+    def text(self, start, end):
+        return str(self.view[start:end], "utf-8")
+
+def chunk_id(file_path, qualified_name, code):
+    """
+    Returns the ID of a chunk: a UUID derived from its file path, qualified name and a hash of
+    its content, so the same chunk gets the same ID on every run.
+    """
+    digest = hashlib.sha1(code.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{file_path}\0{qualified_name}\0{digest}"))
+
+def assign_chunk_ids(chunks, file_path=""):
+    """
+    Sets every chunk's "uuid" to its chunk_id in `file_path` and points "parent" links at the
+    new IDs. Chunks repeated verbatim under the same qualified name are told apart by their
+    order. Extractors call this without a path; to_documents calls it again with the file's
+    path, which also re-derives the IDs of chunks served from the cache for another path.
+    """
+    ids = {}
+    occurrences = {}
+    for chunk in chunks:
+        key = (chunk["qualified_name"], chunk["code"])
+        occurrences[key] = occurrences.get(key, 0) + 1
+        qualified_name = chunk["qualified_name"]
+        if occurrences[key] > 1:
+            qualified_name = f"{qualified_name}#{occurrences[key]}"
+        ids[chunk["uuid"]] = chunk["uuid"] = chunk_id(file_path, qualified_name, chunk["code"])
+    for chunk in chunks:
+        if chunk["parent"] is not None:
+            chunk["parent"] = ids.get(chunk["parent"], chunk["parent"])
+    return chunks
+
+def extract_chunks_from_code(code_string, mode="astor"):
     """
     Extracts functions, classes, methods, and global code chunks from the given Python code string.
+
+    With mode="astor" every chunk is regenerated from its AST node. With mode="slice" the chunk
+    text is sliced out of the original source (decorators, comments and formatting included) and
+    the chunk also records its "start_offset"/"end_offset" byte offsets into the UTF-8 source.
+    Chunks are named by their dotted path from the module ("qualified_name", e.g. "Bar.baz")
+    and identified by chunk_id.
     """
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    index = SourceIndex(code_string) if mode == "slice" else None
+
     class ChunkVisitor(ast.NodeVisitor):
         def __init__(self):
             self.chunks = []
             self.parent_stack = []
 
         def generic_visit(self, node):
-            parent_uuid = self.parent_stack[-1] if self.parent_stack else None
+            parent = self.parent_stack[-1] if self.parent_stack else None
 
-            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-                self.process_code_chunk(node, parent_uuid)
+            if isinstance(node, CHUNK_NODE_TYPES):
+                self.process_code_chunk(node, parent)
             else:
                 super().generic_visit(node)
 
-        def process_code_chunk(self, node, parent_uuid):
-            chunk_code = astor.to_source(node)
+        def process_code_chunk(self, node, parent):
+            if index is not None:
+                start_offset, end_offset = index.node_span(node)
+                chunk_code = index.text(start_offset, end_offset)
+            else:
+                chunk_code = astor.to_source(node)
             if isinstance(node, ast.ClassDef):
                 chunk_name = f"class_{node.name}"
             else:
                 chunk_name = f"func_{node.name}"
 
             chunk_info = {
-                "uuid": str(uuid.uuid4()),
+                "uuid": str(len(self.chunks)),
                 "name": chunk_name,
+                "qualified_name": f"{parent['qualified_name']}.{node.name}" if parent else node.name,
                 "code": chunk_code,
                 "start_line": node.lineno,
                 "end_line": node.end_lineno,
-                "parent": parent_uuid
+                "parent": parent["uuid"] if parent else None
             }
+            if index is not None:
+                chunk_info["start_offset"] = start_offset
+                chunk_info["end_offset"] = end_offset
             self.chunks.append(chunk_info)
 
             # Handle nested chunks
-            self.parent_stack.append(chunk_info["uuid"])
+            self.parent_stack.append(chunk_info)
             super().generic_visit(node)
             self.parent_stack.pop()
 
@@ -45,7 +137,17 @@ def extract_chunks_from_code(code_string):
     tree = ast.parse(code_string)
     visitor.visit(tree)
 
-    return visitor.chunks
+    return assign_chunk_ids(visitor.chunks)
+
+def iter_chunk_spans(code_string):
+    """
+    Yields (node, memoryview) pairs for every function, method and class in the given code string.
+    The memoryviews share the buffer of a single SourceIndex, so no chunk text is copied or rendered.
+    """
+    index = SourceIndex(code_string)
+    for node in ast.walk(ast.parse(code_string)):
+        if isinstance(node, CHUNK_NODE_TYPES):
+            yield node, index.slice(*index.node_span(node))
 
 def append_metadata(chunk, file_path, object_id, commit_id):
     """
@@ -57,15 +159,18 @@ def append_metadata(chunk, file_path, object_id, commit_id):
     if commit_id:
         chunk["commit_id"] = commit_id
 
-def process_python_file(file_path, repo=None, object_id=None, commit_id=None):
+def process_python_source(code, file_path, object_id=None, commit_id=None, mode="astor"):
     """
-    Processes a Python file to extract its chunks (functions, classes, methods, and global code)
-    and generate metadata.
+    Extracts chunks from Python source that is already in memory (e.g. read from a git blob)
+    and generates metadata, exactly as process_python_file does for files on disk.
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        code = file.read()
+    return to_documents(extract_chunks_from_code(code, mode=mode), file_path, object_id, commit_id)
 
-    chunks = extract_chunks_from_code(code)
+def to_documents(chunks, file_path, object_id=None, commit_id=None):
+    """
+    Derives the chunks' IDs for `file_path`, appends metadata and wraps each one in a document.
+    """
+    assign_chunk_ids(chunks, file_path)
     documents = []
 
     for chunk in chunks:
@@ -79,3 +184,13 @@ def process_python_file(file_path, repo=None, object_id=None, commit_id=None):
         documents.append(document)
 
     return documents
+
+def process_python_file(file_path, repo=None, object_id=None, commit_id=None, mode="astor"):
+    """
+    Processes a Python file to extract its chunks (functions, classes, methods, and global code)
+    and generate metadata.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        code = file.read()
+
+    return process_python_source(code, file_path, object_id=object_id, commit_id=commit_id, mode=mode)
@@ -1,9 +1,13 @@
+import hashlib
 import os
 import git
 import shutil
 from dotenv import load_dotenv, find_dotenv
-import random
-from .chunks import process_python_file
+from .parallel import ParallelChunker
+from .chunkers import registered_suffixes
+from .fetch import fetch_repo
+from .snapshot import link_py_files, hash_blob, get_blob_ids, iter_files_with_blob_ids
+from .pipeline import iter_repo_documents, sample_documents
 
 # Load environment variables from .env
 load_dotenv(find_dotenv())
@@ -16,6 +20,16 @@ def get_repo_name_and_path(repo_url, base_path):
     repo_path = os.path.join(os.path.dirname(os.path.abspath(base_path)), 'raw_data', 'git', repo_name)
     return repo_name, repo_path
 
+def get_clone_path(repo_url, base_path, ref=None):
+    """
+    Path of a clone dedicated to one (repo URL, ref) pair: the repo name followed by a hash of the
+    URL and ref, so repositories with the same name from different owners, or several refs of one
+    repository, are fetched and checked out in separate working trees.
+    """
+    repo_name, repo_path = get_repo_name_and_path(repo_url, base_path)
+    digest = hashlib.sha1(f"{repo_url}\0{ref or ''}".encode("utf-8")).hexdigest()[:12]
+    return f"{repo_path}-{digest}"
+
 def get_configurations():
     """
     Loads configuration values from environment or uses default.
@@ -26,44 +40,53 @@ def get_configurations():
         "GITHUB_TOKEN": os.getenv("GITHUB_TOKEN")
     }
 
-def copy_py_files(src_dir, dest_dir):
+def copy_py_files(src_dir, dest_dir, suffixes=(".py",)):
     """
-    Recursively copy .py files from source directory to destination directory.
+    Recursively copy files with one of `suffixes` (.py files by default) from source directory to destination directory.
     """
     for root, dirs, files in os.walk(src_dir):
         for file in files:
-            if file.endswith(".py"):
+            if file.endswith(tuple(suffixes)):
                 src_path = os.path.join(root, file)
                 dest_path = os.path.join(dest_dir, os.path.relpath(src_path, src_dir))
                 dest_dirname = os.path.dirname(dest_path)
                 os.makedirs(dest_dirname, exist_ok=True)
                 shutil.copy2(src_path, dest_path)
 
-def ingest_git_repo(repo_url, base_path, token=None):
+SNAPSHOT_MODES = ("copy", "hardlink", "git")
+
+def ingest_git_repo(repo_url, base_path, token=None, snapshot="copy", strategy=None):
     """
-    Clone or pull the latest from a git repository, copy only .py files, and return the path to the location where they are saved.
+    Clone or pull the latest from a git repository, copy only the files a chunker is registered for (see db.chunkers), and return the path to the location where they are saved.
+
+    `strategy` is a db.fetch.FetchStrategy; by default only the tip of the remote's HEAD is
+    fetched, blobs are downloaded on demand and only files a chunker is registered for are
+    checked out. Use FetchStrategy.full() for a complete clone, or FetchStrategy(ref=...) for
+    another branch/ref.
+
+    snapshot="hardlink" links those files into the commit directory instead of copying them.
+    snapshot="git" writes no snapshot at all and returns the clone's path; read the commit's files
+    with db.snapshot.iter_commit_files instead.
     """
+    if snapshot not in SNAPSHOT_MODES:
+        raise ValueError(f"Unknown snapshot mode: {snapshot}")
     repo_name, repo_path = get_repo_name_and_path(repo_url, base_path)
 
-    # Check if the repo already exists
-    if os.path.exists(repo_path):
-        # If the repo exists, perform a git pull to get the latest
-        repo = git.Repo(repo_path)
-        origin = repo.remotes.origin
-        origin.pull()
-    else:
-        # If the repo doesn't exist, clone it
-        if token:
-            git.cmd.Git().clone(repo_url, repo_path, depth=1, branch='master', config=f"http.extraheader='AUTHORIZATION: bearer {token}'")
-        else:
-            git.Repo.clone_from(repo_url, repo_path)
+    # Clone on first use, otherwise fetch and reset to the latest tip
+    fetch_repo(repo_url, repo_path, strategy=strategy, token=token)
+
+    if snapshot == "git":
+        return repo_path
 
-    # Copy .py files to a separate directory
+    # Copy the chunkable files to a separate directory
     commit_id = git.Repo(repo_path).head.commit.hexsha
     commit_id_directory = os.path.join(os.path.dirname(repo_path), commit_id)
     if not os.path.exists(commit_id_directory):
         os.makedirs(commit_id_directory)
-    copy_py_files(repo_path, commit_id_directory)
+    if snapshot == "hardlink":
+        link_py_files(repo_path, commit_id_directory, suffixes=registered_suffixes())
+    else:
+        copy_py_files(repo_path, commit_id_directory, suffixes=registered_suffixes())
 
     return commit_id_directory
 
@@ -76,24 +99,18 @@ def streamlined_connector_workflow():
     repo_path = ingest_git_repo(repo_url, base_path, token)
     process_files_and_print(repo_url, base_path, repo_path)
 
-def process_files_and_print(repo_url, base_path, repo_path):
+def process_files_and_print(repo_url, base_path, repo_path, workers=None):
     repo_name, _ = get_repo_name_and_path(repo_url, base_path)
-    repo = git.Repo(os.path.join(repo_path, '.git'))
-    commit_id = repo.head.commit.hexsha
 
-    all_chunks = []
-    for root, _, files in os.walk(repo_path):
-        for file in files:
-            if file.endswith(".py"):
-                file_path = os.path.join(root, file)
-                object_id = repo.git.hash_object(file_path)
-                chunks = process_python_file(file_path, repo=repo, object_id=object_id, commit_id=commit_id)
-                all_chunks.extend(chunks)
+    chunker = ParallelChunker(workers=workers)
+    chunks = (document["metadata"] for document in iter_repo_documents(repo_path, chunker=chunker))
+    sampled = sample_documents(chunks, k=1)
+    for file_path, error in chunker.errors:
+        print(f"Error processing file {file_path}: {error}")
 
     # Random chunk printing
-    if all_chunks:
-        random_chunk = random.choice(all_chunks)
-        print_chunk(random_chunk)
+    if sampled:
+        print_chunk(sampled[0])
 
 def print_chunk(chunk):
     print(f"Sample Chunk:")
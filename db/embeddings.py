@@ -0,0 +1,185 @@
+import hashlib
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.embeddings.base import Embeddings
+from .cache import ChunkCache, CachedEmbeddings
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+class HashingEncoder(Embeddings):
+    """
+    Deterministic, dependency-free encoder for tests and offline runs: texts are mapped to
+    unit vectors seeded from their SHA-256 digest. Identical texts get identical vectors.
+    """
+    def __init__(self, model_name="hashing", dim=64):
+        self.model_name = model_name
+        self.dim = dim
+        self.calls = 0
+
+    def _encode(self, text):
+        values = []
+        counter = 0
+        while len(values) < self.dim:
+            digest = hashlib.sha256(f"{counter}\0{text}".encode("utf-8")).digest()
+            values.extend(b / 127.5 - 1.0 for b in digest)
+            counter += 1
+        values = values[:self.dim]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._encode(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def huggingface_backend(model_name, **kwargs):
+    return HuggingFaceEmbeddings(model_name=model_name, **kwargs)
+
+def hashing_backend(model_name, **kwargs):
+    return HashingEncoder(model_name=model_name, **kwargs)
+
+BACKENDS = {
+    "huggingface": huggingface_backend,
+    "hashing": hashing_backend,
+}
+
+class EmbeddingService(Embeddings):
+    """
+    Serves embeddings from a single loaded model. Requests from any number of threads are queued
+    and a worker thread merges them into micro-batches of up to `max_batch_size` texts, waiting at
+    most `max_latency` seconds for a batch to fill. Vectors are memoized by content hash in a
+    ChunkCache when `cache_path` is given, so repeated texts never reach the model.
+
+    It is a langchain Embeddings, so it can be passed straight to a vector store.
+    """
+    def __init__(self, backend, model_name=None, cache_path=None, max_batch_size=64, max_latency=0.005, warm_start=True):
+        self.backend = backend
+        self.model_name = model_name or getattr(backend, "model_name", "")
+        self.cache_path = cache_path
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.texts_encoded = 0
+        self.cache_stats = {}
+        self.error = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(warm_start,), name="embedding-service", daemon=True)
+        self.thread.start()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        if self.error is not None:
+            raise self.error
+        future = Future()
+        self.requests.put((texts, future))
+        return future.result()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        return {"batches": self.batches, "texts_encoded": self.texts_encoded, **self.cache_stats}
+
+    def close(self):
+        if self.thread.is_alive():
+            self.requests.put(None)
+            self.thread.join()
+
+    def _collect(self, first):
+        """
+        Gathers queued requests behind `first` until the batch is full or the deadline passes.
+        Returns (batch, stop).
+        """
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_latency
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            size += len(item[0])
+        return batch, False
+
+    def _fail_all(self, error):
+        """
+        Fails every queued and future request with `error` until the service is closed.
+        """
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            item[1].set_exception(error)
+
+    def _run(self, warm_start):
+        # The cache's SQLite connection lives on this thread
+        try:
+            cache = ChunkCache(self.cache_path) if self.cache_path else None
+        except Exception as e:
+            self.error = RuntimeError(f"Embedding service could not open its cache at {self.cache_path}: {e}")
+            self.ready.set()
+            self._fail_all(self.error)
+            return
+        encoder = CachedEmbeddings(self.backend, cache, self.model_name) if cache else self.backend
+        if warm_start:
+            try:
+                self.backend.embed_documents(["warm up"])
+            except Exception as e:
+                print(f"Embedding model warm-up failed: {e}")
+        self.ready.set()
+
+        stop = False
+        while not stop:
+            item = self.requests.get()
+            if item is None:
+                break
+            batch, stop = self._collect(item)
+            unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            try:
+                vectors = dict(zip(unique, encoder.embed_documents(unique)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts_encoded += len(unique)
+            if cache is not None:
+                self.cache_stats = cache.stats()
+            for texts, future in batch:
+                future.set_result([vectors[text] for text in texts])
+
+        if cache is not None:
+            cache.close()
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_embedding_service(model_name=DEFAULT_MODEL_NAME, backend="huggingface", cache_path=None, **backend_kwargs):
+    """
+    Returns the process-wide EmbeddingService for a model, loading the model on first use only.
+    `backend` is a name from BACKENDS or an already constructed encoder object.
+    """
+    backend_name = backend if isinstance(backend, str) else type(backend).__name__
+    key = (model_name, backend_name, cache_path)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            encoder = BACKENDS[backend](model_name, **backend_kwargs) if isinstance(backend, str) else backend
+            service = EmbeddingService(encoder, model_name=model_name, cache_path=cache_path)
+            _services[key] = service
+        return service
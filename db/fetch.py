@@ -0,0 +1,92 @@
+import os
+import git
+from .chunkers import registered_suffixes
+
+class FetchStrategy:
+    """
+    Describes how much of a remote repository to download.
+
+    depth: number of commits of history to fetch (None for the full history).
+    blob_filter: partial clone filter, e.g. "blob:none", so only the blobs that are checked out
+        (or read later) are downloaded. None fetches every blob.
+    sparse_patterns: non-cone sparse-checkout patterns restricting the working tree; by default
+        the files a chunker is registered for (see db.chunkers). None checks out everything.
+    ref: branch, tag or commit to fetch; None follows the remote's HEAD.
+    """
+    def __init__(self, depth=1, blob_filter="blob:none", sparse_patterns=(), ref=None):
+        if sparse_patterns == ():
+            sparse_patterns = tuple(f"*{suffix}" for suffix in registered_suffixes())
+        self.depth = depth
+        self.blob_filter = blob_filter
+        self.sparse_patterns = tuple(sparse_patterns) if sparse_patterns else None
+        self.ref = ref
+
+    @classmethod
+    def full(cls, ref=None):
+        """
+        A complete clone: all history, all blobs, full working tree.
+        """
+        return cls(depth=None, blob_filter=None, sparse_patterns=None, ref=ref)
+
+    def fetch_args(self):
+        args = []
+        if self.depth:
+            args.append(f"--depth={self.depth}")
+        if self.blob_filter:
+            args.append(f"--filter={self.blob_filter}")
+        return args + ["origin", self.ref or "HEAD"]
+
+    def __repr__(self):
+        return (f"FetchStrategy(depth={self.depth!r}, blob_filter={self.blob_filter!r}, "
+                f"sparse_patterns={self.sparse_patterns!r}, ref={self.ref!r})")
+
+DEFAULT_STRATEGY = FetchStrategy()
+
+def auth_env(token):
+    """
+    Environment variables that make git send `token` with every request to the remote. The
+    header is passed as GIT_CONFIG_* entries (git 2.31+) so it is never written to .git/config.
+    """
+    if not token:
+        return {}
+    return {"GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "http.extraheader",
+            "GIT_CONFIG_VALUE_0": f"AUTHORIZATION: bearer {token}"}
+
+def open_repo(repo_path, token=None):
+    """
+    Opens a clone made by fetch_repo. A partial clone downloads missing blobs from the remote
+    whenever a command needs them (checkouts, cat-file reads, rename detection in diffs), so
+    with a token every git command the returned Repo runs is authenticated, not only fetches.
+    """
+    repo = git.Repo(repo_path)
+    repo.git.update_environment(**auth_env(token))
+    return repo
+
+def configure_sparse_checkout(repo, strategy):
+    """
+    Applies the strategy's sparse-checkout patterns, or turns sparse checkout off when it has none.
+    """
+    if strategy.sparse_patterns:
+        repo.git.sparse_checkout("set", "--no-cone", *strategy.sparse_patterns)
+    elif repo.config_reader().get_value("core", "sparseCheckout", False):
+        repo.git.sparse_checkout("disable")
+
+def fetch_repo(repo_url, repo_path, strategy=None, token=None):
+    """
+    Brings repo_path to the tip of `strategy.ref` on the remote and returns the git.Repo.
+
+    Both the first clone and later updates run the same shallow `git fetch` followed by
+    `git reset --hard FETCH_HEAD`, so an update downloads only the new tip instead of pulling
+    and merging history, and any ref (branch, tag or commit SHA) can be requested. Previously
+    checked-out commits stay in the object database, so diffs against the last processed commit
+    keep working. With a token, the returned Repo stays authenticated (see open_repo).
+    """
+    strategy = strategy or DEFAULT_STRATEGY
+    if not os.path.exists(os.path.join(repo_path, ".git")):
+        git.Repo.init(repo_path).create_remote("origin", repo_url)
+    repo = open_repo(repo_path, token)
+    configure_sparse_checkout(repo, strategy)
+
+    repo.git.fetch(*strategy.fetch_args())
+    repo.git.reset("--hard", "FETCH_HEAD")
+    return repo
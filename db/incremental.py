@@ -0,0 +1,106 @@
+import os
+from .chunkers import registered_suffixes
+
+class ChangeSet:
+    """
+    Files changed between two commits, as repo-relative paths mapped to blob IDs.
+    `modified_from` maps modified paths to their previous blob ID, and `renamed` holds
+    ((old_path, old_blob), (new_path, new_blob)) pairs.
+
+    Renamed files are not updated in place: the vector store wrapper has no metadata update, so
+    their vectors are deleted under the old path and written again under the new one. The
+    embedding model is skipped only while the blob's chunks and vectors are still in the
+    ChunkCache; without a cache (cache_path=None) or after they were evicted, a rename is
+    re-embedded like any other change.
+    """
+    def __init__(self, commit_id=None, last_commit_id=None):
+        self.commit_id = commit_id
+        self.last_commit_id = last_commit_id
+        self.added = {}
+        self.modified = {}
+        self.deleted = {}
+        self.modified_from = {}
+        self.renamed = []
+
+    def to_index(self):
+        """
+        Paths (and new blob IDs) whose chunks have to be written.
+        """
+        files = dict(self.added)
+        files.update(self.modified)
+        files.update(new for _, new in self.renamed)
+        return files
+
+    def to_remove(self):
+        """
+        (path, old blob ID) pairs whose vectors have to be deleted.
+        """
+        removed = list(self.deleted.items())
+        removed.extend((path, self.modified_from[path]) for path in self.modified)
+        removed.extend(old for old, _ in self.renamed)
+        return removed
+
+    def __bool__(self):
+        return bool(self.added or self.modified or self.deleted or self.renamed)
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.modified)} modified, "
+                f"{len(self.deleted)} deleted, {len(self.renamed)} renamed")
+
+def diff_commits(repo, last_commit_id, commit_id=None, suffixes=None):
+    """
+    Diffs two commits (with git's rename detection) and returns a ChangeSet of matching files
+    (by default every file a chunker is registered for). Without a previous commit every
+    matching file in the tree counts as added.
+    """
+    suffixes = tuple(suffixes or registered_suffixes())
+    commit = repo.commit(commit_id) if commit_id else repo.head.commit
+    changes = ChangeSet(commit.hexsha, last_commit_id)
+
+    if not last_commit_id:
+        for item in commit.tree.traverse():
+            if item.type == 'blob' and item.path.endswith(suffixes):
+                changes.added[item.path] = item.hexsha
+        return changes
+
+    for diff in repo.commit(last_commit_id).diff(commit):
+        old_match = bool(diff.a_path and diff.a_path.endswith(suffixes))
+        new_match = bool(diff.b_path and diff.b_path.endswith(suffixes))
+        if diff.change_type == 'A' and new_match:
+            changes.added[diff.b_path] = diff.b_blob.hexsha
+        elif diff.change_type == 'D' and old_match:
+            changes.deleted[diff.a_path] = diff.a_blob.hexsha
+        elif diff.change_type == 'R':
+            if old_match and new_match:
+                changes.renamed.append(((diff.a_path, diff.a_blob.hexsha), (diff.b_path, diff.b_blob.hexsha)))
+            elif old_match:
+                changes.deleted[diff.a_path] = diff.a_blob.hexsha
+            elif new_match:
+                changes.added[diff.b_path] = diff.b_blob.hexsha
+        elif new_match and diff.b_blob is not None:
+            # M (modified) and T (type change)
+            changes.modified[diff.b_path] = diff.b_blob.hexsha
+            changes.modified_from[diff.b_path] = diff.a_blob.hexsha if diff.a_blob else None
+    return changes
+
+def remove_file_vectors(db, file_path, object_id=None):
+    """
+    Deletes the vectors of one file from a vector store (DeepLake or LocalVectorStore) by metadata filter.
+    """
+    metadata = {"file_path": file_path}
+    if object_id:
+        metadata["object_id"] = object_id
+    return db.delete(filter={"metadata": metadata})
+
+def remove_changed_vectors(db, repo_path, changes):
+    """
+    Deletes vectors for deleted, modified and renamed-away files. Returns the number of files removed.
+    """
+    removed = 0
+    for rel_path, object_id in changes.to_remove():
+        try:
+            remove_file_vectors(db, os.path.join(repo_path, rel_path), object_id)
+            removed += 1
+        except Exception as e:
+            print(f"Error removing vectors for {rel_path}: {e}")
+    return removed
@@ -1,9 +1,10 @@
 import os
 from dotenv import load_dotenv
-from connectors import ingest_git_repo
-from chunks import process_python_file, extract_chunks_from_code
-from utils import save_to_db, get_last_processed_commit, save_last_processed_commit
-import git
+from .connectors import ingest_git_repo
+from .fetch import open_repo
+from .incremental import diff_commits
+from .state import CheckpointStore
+from .utils import save_to_db
 
 def main():
     try:
@@ -13,43 +14,52 @@ def main():
         repo_url = input(f"Enter the repository URL (or press Enter to use default: {os.getenv('DEFAULT_REPO_URL')}): ") or os.getenv("DEFAULT_REPO_URL")
         base_path = input(f"Enter the base path (or press Enter to use default: {os.getenv('DEFAULT_BASE_PATH')}): ") or os.getenv("DEFAULT_BASE_PATH")
         token = os.getenv("GITHUB_TOKEN")
-        repo_path = ingest_git_repo(repo_url, base_path, token)
-        print(f"Copied .py files from repository to: {repo_path}")
+        repo_path = ingest_git_repo(repo_url, base_path, token, snapshot="git")
+        print(f"Fetched repository to: {repo_path}")
 
         repo_name = repo_url.rstrip('/').split('/')[-1].replace('.git', '')
         repo_path = os.path.join(os.path.dirname(os.path.abspath(base_path)), 'raw_data', 'git', repo_name)
 
-        repo = git.Repo(os.path.join(repo_path, '.git'))
+        repo = open_repo(repo_path, token)
         commit_id = repo.head.commit.hexsha
-        last_commit_id = get_last_processed_commit()
+        state = CheckpointStore()
+        state.import_legacy_commit(repo_url, repo)
+        last_commit_id = state.get_commit(repo_url)
 
         if commit_id != last_commit_id:
-            new_files = []
-            sample = True  # Default to sample one file
+            changes = diff_commits(repo, last_commit_id, commit_id)
             if last_commit_id:  # If there's a previously processed commit
-                new_files = repo.git.diff('--name-only', last_commit_id, commit_id).split()
-                user_input = input("Do you want to process new files? (y/n/1 for sampling one file): ").strip().lower()
-
-                if user_input == 'y':
-                    sample = False
-                elif user_input == '1':
-                    sample = True
-                else:
-                    print("Exiting without processing.")
-                    return
+                prompt = "Do you want to process new files? (y/n/1 for sampling one file): "
             else:  # If it's the first run
-                new_files = [item.path for item in repo.head.commit.tree.traverse() if item.type == 'blob' and item.path.endswith('.py')]
-                print("First run detected. Sampling one file by default.")
+                prompt = "First run detected. Do you want to process every file? (y/n/1 for sampling one file): "
+            user_input = input(prompt).strip().lower()
 
-            if new_files:
+            if user_input == 'y':
+                sample = False
+            elif user_input == '1':
+                sample = True
+                print("Sampling one file; the commit is not marked as processed.")
+            else:
+                print("Exiting without processing.")
+                return
+
+            if changes:
                 print(f"New commit detected: {commit_id} (Last processed: {last_commit_id or 'None'})")
-                print("New files:")
-                print('\n'.join(new_files))
-                deeplake_path = f"hub://erniesg/test0820_{repo_name}_{commit_id}" if commit_id else None
-                save_to_db(repo_url, deeplake_path, base_path, sample=sample, commit_id=commit_id)
-                save_last_processed_commit(commit_id)  # Save the commit ID after processing
+                print(f"Changes: {changes.summary()}")
+                print('\n'.join(sorted(changes.to_index())))
+                # One dataset per repository, updated in place: only changed files are re-embedded
+                deeplake_path = f"hub://erniesg/test0820_{repo_name}"
+                if sample:
+                    # A preview of one file; the checkpoint is left alone so the next run still sees every change
+                    save_to_db(repo_url, deeplake_path, base_path, sample=True, commit_id=commit_id, state=state,
+                               token=token)
+                else:
+                    # save_to_db checkpoints the commit once every batch is written
+                    save_to_db(repo_url, deeplake_path, base_path, commit_id=commit_id, changes=changes, state=state,
+                               token=token)
             else:
                 print("No new files detected since the last processed commit.")
+                state.set_commit(repo_url, commit_id)
         else:
             print("Current commit matches the last processed commit. No new files to process.")
 
@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from .chunks import to_documents
+from .chunkers import chunk_source, chunker_kind, process_file
+
+def process_pool(workers):
+    """
+    Returns a ProcessPoolExecutor whose workers are not forked from this process, for pools
+    created while other threads are running: forking a process that holds other threads' locks
+    can deadlock the child. forkserver (or spawn where unavailable) workers import the main
+    module again, which costs seconds with langchain loaded, so use this for long-lived pools
+    shared across runs (as the scheduler does) rather than one pool per file batch.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+def chunk_file(file_path, object_id=None, commit_id=None, mode="slice", content=None):
+    """
+    Worker entry point. Chunks `content` (bytes read from a git blob) when given, otherwise
+    reads the file from disk, with the chunker registered for the file's extension
+    (see db.chunkers). Returns (file_path, documents, error) so that a bad file never
+    takes down the pool; error is None on success.
+    """
+    try:
+        if content is not None:
+            code = content.decode("utf-8") if isinstance(content, bytes) else content
+            documents = chunk_source(code, file_path, object_id=object_id, commit_id=commit_id, mode=mode)
+        else:
+            documents = process_file(file_path, object_id=object_id, commit_id=commit_id, mode=mode)
+        return file_path, documents, None
+    except Exception as e:
+        return file_path, [], f"{type(e).__name__}: {e}"
+
+class ParallelChunker:
+    """
+    Fans source files out to a process pool and streams their chunk documents back in completion
+    order. At most `max_in_flight` files are queued at once, so memory stays flat regardless of
+    how many files the input iterable produces. Per-file errors are collected in `errors`.
+
+    If a ChunkCache is given, files whose blob object_id is cached are served from it without
+    being parsed, and freshly parsed blobs are added to it; entries are keyed by the chunker
+    that produced them as well, so a blob is never served with another chunker's chunks. Pass an `executor` to share one
+    process pool between several chunkers instead of starting one per run, together with its
+    worker count in `workers`, which sizes the in-flight limit.
+    """
+    def __init__(self, workers=None, max_in_flight=None, mode="slice", cache=None, executor=None):
+        if executor is not None and not workers:
+            raise ValueError("workers must be given with a shared executor")
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 4
+        self.mode = mode
+        self.cache = cache
+        self.executor = executor
+        self.errors = []
+        self.files_processed = 0
+
+    def _cache_kind(self, file_path):
+        try:
+            return chunker_kind(file_path, self.mode)
+        except ValueError:
+            return None
+
+    def _record(self, result, object_id=None):
+        file_path, documents, error = result
+        self.files_processed += 1
+        if error is not None:
+            self.errors.append((file_path, error))
+        elif self.cache is not None and object_id and self._cache_kind(file_path):
+            self.cache.put_chunks(object_id, [document["metadata"] for document in documents], self._cache_kind(file_path))
+        return documents
+
+    def _cached(self, file_path, object_id, commit_id):
+        kind = self._cache_kind(file_path) if self.cache is not None and object_id else None
+        if kind is None:
+            return None
+        chunks = self.cache.get_chunks(object_id, kind)
+        if chunks is None:
+            return None
+        self.files_processed += 1
+        return to_documents(chunks, file_path, object_id, commit_id)
+
+    def iter_file_results(self, files, commit_id=None):
+        """
+        Yields (file_path, documents) as files finish. `files` yields paths, (path, object_id)
+        tuples or (path, object_id, content) tuples and is consumed lazily. `content` may be a
+        callable, so blobs served from the cache are never read.
+        """
+        tasks = (_as_task(f) for f in files)
+
+        if self.workers == 1 and self.executor is None:
+            for file_path, object_id, content in tasks:
+                documents = self._cached(file_path, object_id, commit_id)
+                if documents is None:
+                    content = content() if callable(content) else content
+                    result = chunk_file(file_path, object_id, commit_id, self.mode, content)
+                    documents = self._record(result, object_id)
+                yield file_path, documents
+            return
+
+        with nullcontext(self.executor) if self.executor else ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = {}
+            for file_path, object_id, content in tasks:
+                documents = self._cached(file_path, object_id, commit_id)
+                if documents is not None:
+                    yield file_path, documents
+                    continue
+                content = content() if callable(content) else content
+                pending[pool.submit(chunk_file, file_path, object_id, commit_id, self.mode, content)] = object_id
+                if len(pending) >= self.max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        yield result[0], self._record(result, pending.pop(future))
+            for future in as_completed(list(pending)):
+                result = future.result()
+                yield result[0], self._record(result, pending.pop(future))
+
+    def iter_documents(self, files, commit_id=None):
+        """
+        Yields chunk documents from all files in completion order.
+        """
+        for _, documents in self.iter_file_results(files, commit_id=commit_id):
+            yield from documents
+
+def _as_task(file):
+    if isinstance(file, str):
+        return file, None, None
+    if len(file) == 2:
+        return file[0], file[1], None
+    return tuple(file)
@@ -0,0 +1,79 @@
+import os
+import random
+import git
+from .chunkers import registered_suffixes
+from .fetch import open_repo
+from .parallel import ParallelChunker
+from .snapshot import iter_commit_files, iter_files_with_blob_ids
+
+def iter_repo_files(repo_path, suffixes=None):
+    """
+    Lazily walks a directory (skipping .git) and yields the paths of matching files, by default
+    of every file a chunker is registered for.
+    """
+    suffixes = tuple(suffixes or registered_suffixes())
+    for root, dirs, files in os.walk(repo_path):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        for file in files:
+            if file.endswith(suffixes):
+                yield os.path.join(root, file)
+
+def iter_repo_file_results(repo_path, commit_id=None, paths=None, suffixes=None, chunker=None, token=None,
+                           **chunker_kwargs):
+    """
+    Lazily chunks a repository's files, from the walk through chunking.
+
+    If repo_path is a git repository the files are read from the objects of `commit_id` (HEAD by
+    default); otherwise the directory is walked on disk and blob IDs are hashed in-process.
+    `paths` restricts the run to repo-relative paths and `suffixes` to file types, by default
+    every type a chunker is registered for: one walk feeds the Python, Markdown, JSON and
+    notebook chunkers alike (see db.chunkers). Nothing is collected, so consuming the
+    generator with a BatchWriter keeps peak memory bounded by the batch size and the chunker's
+    in-flight limit. Pass a ParallelChunker to inspect its errors afterwards; otherwise one is
+    built from `chunker_kwargs` (workers, max_in_flight, mode, cache). `token` authenticates the
+    blob reads of a partial clone (see db.fetch.open_repo).
+
+    Yields (file_path, documents) as each file finishes; iter_repo_documents flattens this into
+    a stream of documents.
+    """
+    chunker = chunker or ParallelChunker(**chunker_kwargs)
+    suffixes = tuple(suffixes or registered_suffixes())
+    try:
+        repo = open_repo(repo_path, token)
+    except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError):
+        repo = None
+
+    if repo is not None:
+        commit_id = commit_id or repo.head.commit.hexsha
+        files = iter_commit_files(repo, commit_id, paths=paths, suffixes=suffixes, lazy=True)
+    else:
+        if paths is not None:
+            file_paths = (os.path.join(repo_path, path) for path in paths)
+        else:
+            file_paths = iter_repo_files(repo_path, suffixes)
+        files = iter_files_with_blob_ids(repo_path, file_paths, {})
+
+    yield from chunker.iter_file_results(files, commit_id=commit_id)
+
+def iter_repo_documents(repo_path, commit_id=None, paths=None, suffixes=None, chunker=None, token=None, **chunker_kwargs):
+    """
+    Lazily yields the chunk documents of a repository (see iter_repo_file_results).
+    """
+    for _, documents in iter_repo_file_results(repo_path, commit_id, paths, suffixes, chunker, token, **chunker_kwargs):
+        yield from documents
+
+def sample_documents(documents, k=1, rng=random):
+    """
+    Picks k documents uniformly at random from an iterable in one pass (reservoir sampling),
+    without holding the whole stream in memory.
+    """
+    reservoir = []
+    for i, document in enumerate(documents):
+        if i < k:
+            reservoir.append(document)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                reservoir[j] = document
+    return reservoir
@@ -0,0 +1,104 @@
+from typing import Any
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.schema import BaseRetriever
+
+DEFAULT_K = 4
+DEFAULT_FETCH_K = 100
+DEFAULT_LAMBDA_MULT = 0.5
+SEARCH_TYPES = ("mmr", "similarity")
+
+def normalize(vectors):
+    """
+    Returns float32 copies of `vectors` (one per row) scaled to unit length.
+    """
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k_cosine(query, candidates, k=DEFAULT_K):
+    """
+    Returns the indices of the `k` candidates (rows of a matrix) most cosine-similar to `query`
+    and their similarities, best first.
+    """
+    if not len(candidates) or k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    similarities = normalize(candidates) @ normalize(query)[0]
+    k = min(k, len(similarities))
+    top = np.argpartition(-similarities, k - 1)[:k] if k < len(similarities) else np.arange(k)
+    top = top[np.argsort(-similarities[top], kind="stable")]
+    return top, similarities[top]
+
+def mmr(query, candidates, k=DEFAULT_K, lambda_mult=DEFAULT_LAMBDA_MULT):
+    """
+    Maximal marginal relevance: picks `k` candidates one at a time, each maximizing
+    lambda_mult * similarity to the query - (1 - lambda_mult) * the highest similarity to an
+    already picked candidate. Returns the picked indices in order, as langchain's
+    maximal_marginal_relevance does.
+
+    Each pick costs one matrix-vector product over the candidates, updating the running
+    maximum similarity to the picked set, so the work is O(k * fetch_k * dim) in NumPy with no
+    Python loop over candidates.
+    """
+    if not len(candidates) or k <= 0:
+        return []
+    candidates = normalize(candidates)
+    relevance = candidates @ normalize(query)[0]
+    picked = np.zeros(len(candidates), dtype=bool)
+    index = int(np.argmax(relevance))
+    indices = [index]
+    picked[index] = True
+    redundancy = candidates @ candidates[index]
+    while len(indices) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[picked] = -np.inf
+        index = int(np.argmax(scores))
+        indices.append(index)
+        picked[index] = True
+        np.maximum(redundancy, candidates @ candidates[index], out=redundancy)
+    return indices
+
+def search_candidates(store, embedding, fetch_k):
+    """
+    Returns the `fetch_k` documents nearest to `embedding` in a vector store and their vectors
+    as a matrix: through similarity_search_with_vectors for stores that have it (see
+    db.vectorstore.LocalVectorStore), otherwise from a DeepLake store's embedding tensor.
+    """
+    if hasattr(store, "similarity_search_with_vectors"):
+        return store.similarity_search_with_vectors(embedding, fetch_k)
+    result = store.vectorstore.search(embedding=np.asarray(embedding, dtype=np.float32), k=fetch_k,
+                                      distance_metric="cos", return_tensors=["embedding", "metadata", "text"])
+    documents = [Document(page_content=text, metadata=metadata)
+                 for text, metadata in zip(result["text"], result["metadata"])]
+    return documents, np.asarray(result["embedding"], dtype=np.float32).reshape(len(documents), -1)
+
+class MMRRetriever(BaseRetriever):
+    """
+    Retrieves `fetch_k` candidates with their vectors from a vector store and reranks them in
+    NumPy: with mmr (search_type="mmr") for relevant but diverse context, or by cosine
+    similarity (search_type="similarity").
+    """
+    store: Any
+    embeddings: Any
+    k: int = DEFAULT_K
+    fetch_k: int = DEFAULT_FETCH_K
+    lambda_mult: float = DEFAULT_LAMBDA_MULT
+    search_type: str = "mmr"
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        if self.search_type not in SEARCH_TYPES:
+            raise ValueError(f"Unknown search type: {self.search_type}")
+        embedding = self.embeddings.embed_query(query)
+        documents, vectors = search_candidates(self.store, embedding, max(self.k, self.fetch_k))
+        if self.search_type == "mmr":
+            indices = mmr(embedding, vectors, k=self.k, lambda_mult=self.lambda_mult)
+        else:
+            indices, _ = top_k_cosine(embedding, vectors, k=self.k)
+        return [documents[i] for i in indices]
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        return self._get_relevant_documents(query)
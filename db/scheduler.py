@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from .connectors import get_clone_path
+from .fetch import FetchStrategy, fetch_repo
+from .incremental import diff_commits
+from .parallel import process_pool
+from .state import CheckpointStore, DEFAULT_STATE_PATH
+from .utils import save_to_db
+
+DEFAULT_TARGET_TEMPLATE = "hub://erniesg/test0820_{repo_name}"
+
+def load_manifest(path):
+    """
+    Reads a JSON manifest of repositories to ingest:
+
+        {
+          "base_path": "data/base",
+          "target_template": "hub://org/code_{repo_name}",
+          "repos": [
+            {"url": "https://github.com/org/a.git"},
+            {"url": "https://github.com/org/b.git", "ref": "develop", "depth": 1, "target": "hub://org/b"}
+          ]
+        }
+
+    Each repo entry may set `ref`, `target`, `depth`, `blob_filter` and `sparse_patterns`; `target`
+    defaults to `target_template` formatted with the repo name. Targets are DeepLake paths or
+    "local://<directory>" paths for offline stores (see db.vectorstore.open_vector_store). A repo
+    may be listed several times with different refs, but not twice with the same ref.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not manifest.get("repos"):
+        raise ValueError(f"Manifest {path} lists no repos")
+    template = manifest.get("target_template", DEFAULT_TARGET_TEMPLATE)
+    seen = set()
+    for spec in manifest["repos"]:
+        if "url" not in spec:
+            raise ValueError(f"Manifest entry without a url: {spec}")
+        if result_key(spec) in seen:
+            raise ValueError(f"Manifest lists {result_key(spec)} twice")
+        seen.add(result_key(spec))
+        repo_name = spec["url"].rstrip('/').split('/')[-1].replace('.git', '')
+        spec.setdefault("target", template.format(repo_name=repo_name))
+    return manifest
+
+def result_key(spec):
+    """
+    Identifies a repo spec in the scheduler's results: its url, followed by "@ref" if it sets a ref.
+    """
+    return f"{spec['url']}@{spec['ref']}" if spec.get("ref") else spec["url"]
+
+def strategy_for(spec):
+    strategy = FetchStrategy(ref=spec.get("ref"))
+    for key in ("depth", "blob_filter", "sparse_patterns"):
+        if key in spec:
+            setattr(strategy, key, spec[key])
+    return strategy
+
+class IngestScheduler:
+    """
+    Ingests many repositories concurrently in two stages connected by a bounded queue.
+
+    Fetches run on a pool of `io_workers` threads. Each fetched repository is queued for one of
+    `index_workers` indexing threads, which diff it against its last processed commit and chunk
+    and embed the changed files; chunking for all of them shares one process pool of
+    `cpu_workers` (cpu_workers=1 chunks inline), and embedding shares the process-wide
+    embedding service. When the queue is full, fetch threads wait, so fetched-but-unindexed
+    repositories never pile up. Repositories are indexed in the order their fetches finish and
+    failures are recorded per repository, so a slow or broken repository does not hold up the
+    others.
+
+    Extra keyword arguments are passed to save_to_db; its `workers` is always `cpu_workers`.
+    """
+    def __init__(self, base_path, state=None, io_workers=4, index_workers=2, cpu_workers=None,
+                 queue_size=None, token=None, fetch=fetch_repo, save=save_to_db, **save_kwargs):
+        self.base_path = base_path
+        self.state = state if state is not None else CheckpointStore()
+        self.io_workers = io_workers
+        self.index_workers = index_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.queue_size = queue_size or index_workers
+        self.token = token
+        self.fetch = fetch
+        self.save = save
+        self.save_kwargs = save_kwargs
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def _record(self, spec, **values):
+        with self.lock:
+            self.results.setdefault(result_key(spec), {"url": spec["url"], "ref": spec.get("ref")}).update(values)
+
+    def _fetch(self, spec, fetched):
+        url = spec["url"]
+        start = time.perf_counter()
+        try:
+            # One working tree per (url, ref), so concurrent jobs never check out each other's commits
+            repo_path = get_clone_path(url, self.base_path, spec.get("ref"))
+            repo = self.fetch(url, repo_path, strategy=strategy_for(spec), token=self.token)
+            self._record(spec, fetch_seconds=time.perf_counter() - start)
+        except Exception as e:
+            self._record(spec, status="fetch_failed", error=f"{type(e).__name__}: {e}",
+                         fetch_seconds=time.perf_counter() - start)
+            return
+        # Blocks while the indexing stage is behind
+        fetched.put((spec, repo))
+
+    def _index(self, spec, repo, executor):
+        url, ref = spec["url"], spec.get("ref")
+        start = time.perf_counter()
+        try:
+            commit_id = repo.head.commit.hexsha
+            self.state.import_legacy_commit(url, repo, ref)
+            last_commit_id = self.state.get_commit(url, ref)
+            if commit_id == last_commit_id:
+                self._record(spec, status="unchanged", commit_id=commit_id, index_seconds=0.0)
+                return
+            changes = diff_commits(repo, last_commit_id, commit_id)
+            if not changes:
+                self.state.set_commit(url, commit_id, ref)
+                self._record(spec, status="no_changes", commit_id=commit_id, index_seconds=0.0)
+                return
+            summary = self.save(url, spec["target"], self.base_path, commit_id=commit_id, changes=changes,
+                                state=self.state, ref=ref, executor=executor, workers=self.cpu_workers,
+                                token=self.token, repo_path=repo.working_tree_dir, **self.save_kwargs)
+            status = "indexed" if summary.get("completed", True) else "incomplete"
+            self._record(spec, status=status, commit_id=commit_id, changes=changes.summary(),
+                         summary=summary, index_seconds=time.perf_counter() - start)
+        except Exception as e:
+            self._record(spec, status="index_failed", error=f"{type(e).__name__}: {e}",
+                         index_seconds=time.perf_counter() - start)
+        finally:
+            repo.close()
+
+    def _index_loop(self, fetched, executor):
+        while True:
+            item = fetched.get()
+            if item is None:
+                return
+            self._index(*item, executor)
+
+    def run(self, repos):
+        """
+        Fetches and indexes every repo spec (dicts as produced by load_manifest) and returns a
+        map of result_key(spec) -> result with `status`, timings and the indexing summary or error.
+        """
+        fetched = queue.Queue(maxsize=self.queue_size)
+        # Not forked: indexing and embedding threads are running by the time workers start
+        executor = process_pool(self.cpu_workers) if self.cpu_workers > 1 else None
+        indexers = [threading.Thread(target=self._index_loop, args=(fetched, executor), name=f"indexer-{i}", daemon=True)
+                    for i in range(self.index_workers)]
+        try:
+            for thread in indexers:
+                thread.start()
+            with ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="fetch") as io_pool:
+                for spec in repos:
+                    io_pool.submit(self._fetch, spec, fetched)
+            for _ in indexers:
+                fetched.put(None)
+            for thread in indexers:
+                thread.join()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return dict(self.results)
+
+def print_results(results):
+    for key, result in results.items():
+        timings = f"fetch {result.get('fetch_seconds', 0):.1f}s, index {result.get('index_seconds', 0):.1f}s"
+        detail = result.get("error") or result.get("changes") or ""
+        print(f"{result.get('status', 'unknown'):<13} {key} ({timings}) {detail}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest every repository listed in a manifest.")
+    parser.add_argument("manifest", help="Path to a JSON manifest (see db.scheduler.load_manifest)")
+    parser.add_argument("--base-path", help="Overrides the manifest's base_path")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="Checkpoint database (see db.state.CheckpointStore)")
+    parser.add_argument("--io-workers", type=int, default=4)
+    parser.add_argument("--index-workers", type=int, default=2)
+    parser.add_argument("--cpu-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+    manifest = load_manifest(args.manifest)
+    base_path = args.base_path or manifest.get("base_path") or os.getenv("DEFAULT_BASE_PATH")
+    scheduler = IngestScheduler(base_path, state=CheckpointStore(args.state), io_workers=args.io_workers,
+                                index_workers=args.index_workers, cpu_workers=args.cpu_workers,
+                                token=os.getenv("GITHUB_TOKEN"))
+    print_results(scheduler.run(manifest["repos"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import hashlib
+
+def hash_blob(file_path):
+    """
+    Computes the git blob ID of a file in-process (SHA-1 over the "blob <size>\\0" header and
+    the file contents), matching `git hash-object` for files without clean/smudge filters.
+    """
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    digest = hashlib.sha1(b"blob %d\0" % len(data))
+    digest.update(data)
+    return digest.hexdigest()
+
+def get_blob_ids(repo, commit=None, suffixes=(".py",)):
+    """
+    Builds a map of repo-relative path -> blob ID for every matching file in a commit's tree
+    (HEAD by default) in a single pass, without starting a git process per file.
+    """
+    tree = (repo.commit(commit) if commit else repo.head.commit).tree
+    return {item.path: item.hexsha for item in tree.traverse()
+            if item.type == 'blob' and item.path.endswith(tuple(suffixes))}
+
+def iter_files_with_blob_ids(repo_path, file_paths, blob_ids):
+    """
+    Pairs each file with its blob ID, looked up by repo-relative path and hashed in-process
+    for files that are not in the commit tree.
+    """
+    for file_path in file_paths:
+        rel_path = os.path.relpath(file_path, repo_path).replace(os.sep, '/')
+        object_id = blob_ids.get(rel_path)
+        yield file_path, object_id or hash_blob(file_path)
+
+def iter_commit_files(repo, commit=None, paths=None, suffixes=(".py",), lazy=False):
+    """
+    Yields (file_path, blob_id, content) for the matching files of a commit straight from the git
+    object database, without checking anything out or copying it to disk. GitPython serves blob
+    data through a single persistent `git cat-file --batch` process.
+
+    file_path is the path the file has in the working tree, so chunk metadata matches what a
+    walk of the checkout would produce. `paths` restricts the snapshot to repo-relative paths.
+    With lazy=True, content is a callable that reads the blob when invoked.
+    """
+    commit = repo.commit(commit) if commit else repo.head.commit
+    root = repo.working_tree_dir or repo.git_dir
+    if paths is None:
+        blobs = (item for item in commit.tree.traverse()
+                 if item.type == 'blob' and item.path.endswith(tuple(suffixes)))
+    else:
+        blobs = (commit.tree[path] for path in paths)
+
+    for blob in blobs:
+        content = (lambda blob=blob: blob.data_stream.read()) if lazy else blob.data_stream.read()
+        yield os.path.join(root, blob.path), blob.hexsha, content
+
+def link_py_files(src_dir, dest_dir, suffixes=(".py",)):
+    """
+    Mirrors the matching files of src_dir into dest_dir as hardlinks, falling back to a copy
+    when linking is not possible (e.g. across filesystems). Returns the number of files linked.
+    """
+    linked = 0
+    for root, dirs, files in os.walk(src_dir):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        for file in files:
+            if file.endswith(tuple(suffixes)):
+                src_path = os.path.join(root, file)
+                dest_path = os.path.join(dest_dir, os.path.relpath(src_path, src_dir))
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                if os.path.exists(dest_path):
+                    continue
+                try:
+                    os.link(src_path, dest_path)
+                    linked += 1
+                except OSError:
+                    shutil.copy2(src_path, dest_path)
+    return linked
@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+import time
+import git
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(__file__), 'checkpoints.sqlite3')
+# Single-repository checkpoint file used before CheckpointStore existed
+LEGACY_COMMIT_FILE_PATH = os.path.join(os.path.dirname(__file__), 'last_processed_commit.txt')
+
+class CheckpointStore:
+    """
+    Transactional ingestion state in SQLite (WAL), keyed by repository URL and ref.
+
+    `checkpoints` holds, per repository, the last fully processed commit, the commit of a run
+    in progress (`pending_commit_id`) and the counts and timings of the last run. `files` holds
+    the blob ID and chunk count of every file written so far, tagged with the commit it was
+    written for. Files are recorded as soon as all of their chunks are in the vector store, so a
+    run that crashes mid-batch resumes where it stopped instead of starting over. Every update is
+    a single transaction, and one store may be shared between threads.
+    """
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "repo_url TEXT NOT NULL, ref TEXT NOT NULL, commit_id TEXT, pending_commit_id TEXT, "
+                "started_at REAL, finished_at REAL, seconds REAL, files INTEGER, chunks INTEGER, "
+                "PRIMARY KEY (repo_url, ref))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "repo_url TEXT NOT NULL, ref TEXT NOT NULL, path TEXT NOT NULL, object_id TEXT, "
+                "commit_id TEXT NOT NULL, chunks INTEGER NOT NULL, indexed_at REAL NOT NULL, "
+                "PRIMARY KEY (repo_url, ref, path))"
+            )
+
+    def get_checkpoint(self, repo_url, ref=None):
+        """
+        Returns the repository's checkpoint row as a dict, or None if it was never processed.
+        """
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM checkpoints WHERE repo_url = ? AND ref = ?",
+                                       (repo_url, ref or "HEAD"))
+            row = cursor.fetchone()
+            return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+    def get_commit(self, repo_url, ref=None):
+        """
+        Returns the last fully processed commit of a repository, or None.
+        """
+        checkpoint = self.get_checkpoint(repo_url, ref)
+        return checkpoint["commit_id"] if checkpoint else None
+
+    def get_files(self, repo_url, ref=None, commit_id=None):
+        """
+        Returns path -> blob ID of the files written for a repository, optionally only those
+        written for `commit_id`.
+        """
+        query = "SELECT path, object_id FROM files WHERE repo_url = ? AND ref = ?"
+        params = [repo_url, ref or "HEAD"]
+        if commit_id is not None:
+            query += " AND commit_id = ?"
+            params.append(commit_id)
+        with self.lock:
+            return dict(self.conn.execute(query, params).fetchall())
+
+    def begin(self, repo_url, ref, commit_id):
+        """
+        Marks a run of `commit_id` as in progress. If a run of the same commit was interrupted,
+        its start time is kept and the path -> blob ID map of the files it already wrote is
+        returned so they can be skipped; otherwise the map is empty.
+        """
+        ref = ref or "HEAD"
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT pending_commit_id FROM checkpoints WHERE repo_url = ? AND ref = ?",
+                                    (repo_url, ref)).fetchone()
+            if row and row[0] == commit_id:
+                return dict(self.conn.execute(
+                    "SELECT path, object_id FROM files WHERE repo_url = ? AND ref = ? AND commit_id = ?",
+                    (repo_url, ref, commit_id)).fetchall())
+            self.conn.execute(
+                "INSERT INTO checkpoints (repo_url, ref, pending_commit_id, started_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (repo_url, ref) DO UPDATE SET pending_commit_id = excluded.pending_commit_id, "
+                "started_at = excluded.started_at",
+                (repo_url, ref, commit_id, time.time()))
+            return {}
+
+    def record_files(self, repo_url, ref, commit_id, files):
+        """
+        Records (path, blob ID, chunk count) tuples as written for `commit_id`.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (repo_url, ref, path, object_id, commit_id, chunks, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(repo_url, ref or "HEAD", path, object_id, commit_id, chunks, now) for path, object_id, chunks in files])
+
+    def complete(self, repo_url, ref, commit_id, removed_paths=()):
+        """
+        Atomically makes `commit_id` the last processed commit, forgets `removed_paths` and
+        stores the run's file and chunk counts and duration.
+        """
+        ref = ref or "HEAD"
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM files WHERE repo_url = ? AND ref = ? AND path = ?",
+                                  [(repo_url, ref, path) for path in removed_paths])
+            files, chunks = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM files WHERE repo_url = ? AND ref = ? AND commit_id = ?",
+                (repo_url, ref, commit_id)).fetchone()
+            self.conn.execute(
+                "INSERT INTO checkpoints (repo_url, ref, started_at) VALUES (?, ?, ?) ON CONFLICT (repo_url, ref) DO NOTHING",
+                (repo_url, ref, now))
+            self.conn.execute(
+                "UPDATE checkpoints SET commit_id = ?, pending_commit_id = NULL, finished_at = ?, "
+                "seconds = ? - COALESCE(started_at, ?), files = ?, chunks = ? WHERE repo_url = ? AND ref = ?",
+                (commit_id, now, now, now, files, chunks, repo_url, ref))
+
+    def set_commit(self, repo_url, commit_id, ref=None):
+        """
+        Marks a commit as processed without a run, e.g. when it changed no relevant files.
+        """
+        self.begin(repo_url, ref, commit_id)
+        self.complete(repo_url, ref, commit_id)
+
+    def import_legacy_commit(self, repo_url, repo, ref=None, path=LEGACY_COMMIT_FILE_PATH):
+        """
+        One-time migration of last_processed_commit.txt. The old file was not keyed by
+        repository, so its commit is only imported for a repository that contains it and has no
+        checkpoint yet; the file is then renamed to `<path>.imported` so it is never read again.
+        Returns the imported commit or None.
+        """
+        with self.lock:
+            if not os.path.exists(path):
+                return None
+            with open(path, 'r') as file:
+                commit_id = file.read().strip() or None
+        if not commit_id or self.get_commit(repo_url, ref) is not None:
+            return None
+        try:
+            repo.git.cat_file('-e', f'{commit_id}^{{commit}}')
+        except git.exc.GitCommandError:
+            return None
+        self.set_commit(repo_url, commit_id, ref)
+        with self.lock:
+            if os.path.exists(path):
+                os.replace(path, path + '.imported')
+        print(f"Imported last processed commit {commit_id} for {repo_url} from {path}")
+        return commit_id
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class FileProgress:
+    """
+    Follows the files of one run through a BatchWriter and records each one in the
+    CheckpointStore (if any) once every chunk it queued has been flushed. Pass `flushed` as the writer's
+    on_flush callback, call `queued` for each accepted document and `finish` after a file's
+    last document.
+    """
+    def __init__(self, store, repo_url, ref, commit_id):
+        self.store = store
+        self.repo_url = repo_url
+        self.ref = ref
+        self.commit_id = commit_id
+        self.outstanding = {}
+        self.chunks = {}
+        self.finished = {}
+        self.files_recorded = 0
+
+    def queued(self, file_path):
+        self.outstanding[file_path] = self.outstanding.get(file_path, 0) + 1
+        self.chunks[file_path] = self.chunks.get(file_path, 0) + 1
+
+    def flushed(self, metadatas):
+        # May run inside writer.add, before `queued` was called for the same document
+        for metadata in metadatas:
+            file_path = metadata.get("file_path")
+            self.outstanding[file_path] = self.outstanding.get(file_path, 0) - 1
+        self._record()
+
+    def finish(self, file_path, rel_path, object_id):
+        self.finished[file_path] = (rel_path, object_id)
+        self._record()
+
+    def _record(self):
+        done = [file_path for file_path in self.finished if not self.outstanding.get(file_path)]
+        if not done:
+            return
+        files = []
+        for file_path in done:
+            rel_path, object_id = self.finished.pop(file_path)
+            self.outstanding.pop(file_path, None)
+            files.append((rel_path, object_id, self.chunks.pop(file_path, 0)))
+        if self.store is not None:
+            self.store.record_files(self.repo_url, self.ref, self.commit_id, files)
+        self.files_recorded += len(files)
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock
+from ..batching import BatchWriter
+
+class TestBatchWriter(unittest.TestCase):
+
+    def make_document(self, i, code=None):
+        return {
+            "page_content": code or f"def func_{i}():\n    return {i}\n",
+            "metadata": {"name": f"func_{i}", "file_path": "a.py", "start_line": i, "end_line": i + 1}
+        }
+
+    def test_flushes_by_count(self):
+        db = MagicMock()
+        with BatchWriter(db, batch_size=3, verbose=False) as writer:
+            writer.add_documents(self.make_document(i) for i in range(7))
+
+        self.assertEqual(db.add_texts.call_count, 3)
+        sizes = [len(call.args[0]) for call in db.add_texts.call_args_list]
+        self.assertEqual(sizes, [3, 3, 1])
+        self.assertEqual(writer.chunks_saved, 7)
+        self.assertEqual(len(writer.batches), 3)
+
+    def test_flushes_by_bytes(self):
+        db = MagicMock()
+        writer = BatchWriter(db, batch_size=100, batch_bytes=10, verbose=False)
+        writer.add("x" * 6, {"name": "a"})
+        writer.add("y" * 6, {"name": "b"})
+        self.assertEqual(db.add_texts.call_count, 1)
+        writer.close()
+        self.assertEqual(db.add_texts.call_count, 2)
+
+    def test_skips_duplicates_and_empty(self):
+        db = MagicMock()
+        with BatchWriter(db, verbose=False) as writer:
+            documents = [self.make_document(i) for i in range(3)]
+            writer.add_documents(documents)
+            writer.add_documents(documents)
+            writer.add("", {"name": "empty"})
+
+        db.add_texts.assert_called_once()
+        self.assertEqual(writer.chunks_saved, 3)
+        self.assertEqual(writer.duplicates, 3)
+
+    def test_writes_chunk_ids_and_skips_stored_ones(self):
+        db = MagicMock()
+        documents = [self.make_document(i) for i in range(3)]
+        for i, document in enumerate(documents):
+            document["metadata"]["uuid"] = f"id-{i}"
+        with BatchWriter(db, verbose=False, existing_ids={"id-1"}) as writer:
+            writer.add_documents(documents)
+
+        self.assertEqual(db.add_texts.call_args.kwargs["ids"], ["id-0", "id-2"])
+        self.assertEqual(writer.chunks_saved, 2)
+        self.assertEqual(writer.existing, 1)
+
+    def test_records_failed_batches(self):
+        db = MagicMock()
+        db.add_texts.side_effect = RuntimeError("boom")
+        with BatchWriter(db, verbose=False) as writer:
+            writer.add_documents([self.make_document(0)])
+
+        self.assertEqual(writer.chunks_saved, 0)
+        self.assertEqual(len(writer.errors), 1)
+
+if __name__ == "__main__":
+    unittest.main()
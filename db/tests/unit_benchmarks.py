@@ -0,0 +1,40 @@
+import argparse
+import shutil
+import tempfile
+import unittest
+from ..benchmarks.bench_ingest import run_benchmarks
+from ..benchmarks import bench_retrieval
+
+class TestIngestBenchmarks(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_runs_every_stage_on_a_tiny_repository(self):
+        args = argparse.Namespace(files=3, classes=1, methods=1, depth=1, workers=1, mode="slice", snapshot="git")
+        stages = run_benchmarks(args, self.temp_dir)
+
+        self.assertEqual([s["stage"] for s in stages], [
+            "extract_chunks_from_code", "process_python_file", "iter_repo_documents",
+            "ingest_git_repo (git)", "save_to_db (cold cache)", "save_to_db (warm cache)"])
+        self.assertEqual(stages[0]["chunks"], stages[-1]["chunks"])
+        for stage in stages:
+            self.assertEqual(stage["files"], 3)
+            self.assertGreater(stage["stage_peak_rss_mb"], 0)
+            self.assertGreater(stage["max_rss_self_mb"], 0)
+            self.assertIn("max_rss_children_mb", stage)
+
+class TestRetrievalBenchmarks(unittest.TestCase):
+
+    def test_vectorized_mmr_selects_like_langchain(self):
+        results = bench_retrieval.run_benchmarks(fetch_ks=(20, 100), k=4, dim=32, repeat=1)
+        self.assertEqual([r["fetch_k"] for r in results], [20, 100])
+        for result in results:
+            self.assertTrue(result["same_selection"])
+            self.assertGreater(result["numpy_mmr_ms"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
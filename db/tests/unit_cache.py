@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from ..cache import ChunkCache, CachedEmbeddings
+from ..parallel import ParallelChunker
+
+class TestChunkCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.temp_dir, "cache.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_chunks_round_trip_without_location(self):
+        cache = ChunkCache(self.cache_path)
+        self.assertIsNone(cache.get_chunks("abc"))
+        cache.put_chunks("abc", [{"name": "func_foo", "code": "def foo(): pass", "file_path": "a.py", "commit_id": "c1"}])
+        cache.close()
+
+        cache = ChunkCache(self.cache_path)
+        self.assertEqual(cache.get_chunks("abc"), [{"name": "func_foo", "code": "def foo(): pass"}])
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_chunks_are_keyed_by_mode(self):
+        cache = ChunkCache(self.cache_path)
+        file_path = os.path.join(self.temp_dir, "m.py")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write("def f():\n    # keep me\n    return 1\n")
+
+        astor_docs = list(ParallelChunker(workers=1, mode="astor", cache=cache).iter_documents([(file_path, "blob1")]))
+        slice_docs = list(ParallelChunker(workers=1, mode="slice", cache=cache).iter_documents([(file_path, "blob1")]))
+        self.assertNotIn("# keep me", astor_docs[0]["page_content"])
+        self.assertIn("# keep me", slice_docs[0]["page_content"])
+        self.assertEqual(cache.stats()["misses"], 2)
+        cache.close()
+
+    def test_lru_eviction_by_entries(self):
+        cache = ChunkCache(self.cache_path, max_entries=2)
+        cache.put_chunks("a", [])
+        cache.put_chunks("b", [])
+        cache.get_chunks("a")
+        cache.put_chunks("c", [])
+
+        self.assertIsNotNone(cache.get_chunks("a"))
+        self.assertIsNone(cache.get_chunks("b"))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_eviction_by_bytes(self):
+        cache = ChunkCache(self.cache_path, max_bytes=200)
+        for i in range(10):
+            cache.put_chunks(str(i), [{"code": "x" * 50}])
+        self.assertLessEqual(cache.stats()["bytes"], 200)
+        self.assertIsNotNone(cache.get_chunks("9"))
+
+    def test_eviction_counts_entries_written_by_other_connections(self):
+        first = ChunkCache(self.cache_path, max_bytes=250)
+        second = ChunkCache(self.cache_path, max_bytes=250)
+        first.put_vectors({"a": [0.0] * 25, "b": [0.0] * 25})
+        second.put_vectors({"c": [0.0] * 25})
+        second.put_vectors({"d": [0.0] * 25})
+
+        self.assertLessEqual(first.stats()["bytes"], 250)
+        self.assertEqual(first.get_vectors(["a", "b"]), {})
+        self.assertEqual(len(first.get_vectors(["c", "d"])), 2)
+        first.close()
+        second.close()
+
+    def test_cached_embeddings_skip_model(self):
+        cache = ChunkCache(self.cache_path)
+        model = MagicMock()
+        model.embed_documents.side_effect = lambda texts: [[float(len(t)), 0.5] for t in texts]
+        embeddings = CachedEmbeddings(model, cache, model_name="fake")
+
+        self.assertEqual(embeddings.embed_documents(["ab", "abc"]), [[2.0, 0.5], [3.0, 0.5]])
+        self.assertEqual(embeddings.embed_documents(["abc", "abcd"]), [[3.0, 0.5], [4.0, 0.5]])
+        self.assertEqual(model.embed_documents.call_args_list[1].args[0], ["abcd"])
+        self.assertEqual(cache.stats()["vector_hits"], 1)
+
+    def test_chunker_serves_cached_blobs(self):
+        file_path = os.path.join(self.temp_dir, "module.py")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write("def foo():\n    return 1\n")
+        cache = ChunkCache(self.cache_path)
+
+        first = list(ParallelChunker(workers=1, cache=cache).iter_documents([(file_path, "blob1")], commit_id="c1"))
+        os.remove(file_path)
+        second = list(ParallelChunker(workers=1, cache=cache).iter_documents([(file_path, "blob1")], commit_id="c2"))
+
+        self.assertEqual([d["page_content"] for d in first], [d["page_content"] for d in second])
+        self.assertEqual(second[0]["metadata"]["commit_id"], "c2")
+        self.assertEqual(second[0]["metadata"]["file_path"], file_path)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import os
 import unittest
-from ..chunks import process_python_file, extract_chunks_from_code
+from ..chunks import process_python_file, process_python_source, extract_chunks_from_code, iter_chunk_spans
 
 class TestChunkFunctions(unittest.TestCase):
 
@@ -34,6 +34,64 @@ print("Hello World")
         chunks = extract_chunks_from_code(code_string)
         self.assertEqual(len(chunks), 1)  # 1 import statement, 1 function, 1 print statement
 
+    def test_slice_mode_keeps_original_source(self):
+        code_string = """
+class Greeter:
+    # say hello
+    @staticmethod
+    def greet(name):
+        # keep me
+        return f"héllo {name}"
+"""
+        chunks = extract_chunks_from_code(code_string, mode="slice")
+        self.assertEqual([c['name'] for c in chunks], ['class_Greeter', 'func_greet'])
+        self.assertTrue(chunks[0]['code'].startswith('class Greeter:\n    # say hello'))
+        self.assertTrue(chunks[1]['code'].startswith('@staticmethod\n    def greet(name):'))
+        self.assertIn('# keep me', chunks[1]['code'])
+        self.assertEqual(chunks[1]['parent'], chunks[0]['uuid'])
+
+        source = code_string.encode('utf-8')
+        for chunk in chunks:
+            self.assertEqual(source[chunk['start_offset']:chunk['end_offset']].decode('utf-8'), chunk['code'])
+
+    def test_slice_mode_matches_astor_chunking(self):
+        with open(os.path.join(os.path.dirname(__file__), '..', 'chunks.py'), 'r', encoding='utf-8') as f:
+            code_string = f.read()
+        astor_chunks = extract_chunks_from_code(code_string)
+        slice_chunks = extract_chunks_from_code(code_string, mode="slice")
+        self.assertEqual([(c['name'], c['start_line'], c['end_line']) for c in astor_chunks],
+                         [(c['name'], c['start_line'], c['end_line']) for c in slice_chunks])
+
+    def test_chunk_ids_are_deterministic(self):
+        code_string = "class Bar:\n    def baz(self):\n        return 1\n\ndef qux():\n    pass\n"
+        first = extract_chunks_from_code(code_string, mode="slice")
+        self.assertEqual([c['uuid'] for c in first], [c['uuid'] for c in extract_chunks_from_code(code_string, mode="slice")])
+        self.assertEqual([c['qualified_name'] for c in first], ['Bar', 'Bar.baz', 'qux'])
+        self.assertEqual(first[1]['parent'], first[0]['uuid'])
+
+        # Editing a method changes its ID and its class's, but not the ID of untouched code
+        changed = extract_chunks_from_code(code_string.replace("return 1", "return 2"), mode="slice")
+        self.assertNotEqual(changed[1]['uuid'], first[1]['uuid'])
+        self.assertEqual(changed[2]['uuid'], first[2]['uuid'])
+
+        # IDs are scoped to the file, with parent links following
+        a = [d['metadata'] for d in process_python_source(code_string, "a.py", mode="slice")]
+        b = [d['metadata'] for d in process_python_source(code_string, "b.py", mode="slice")]
+        self.assertTrue(set(c['uuid'] for c in a).isdisjoint(c['uuid'] for c in b))
+        self.assertEqual(a[1]['parent'], a[0]['uuid'])
+
+    def test_identical_chunks_get_distinct_ids(self):
+        code_string = "class A:\n    def f(self):\n        pass\n\n    def f(self):\n        pass\n"
+        chunks = extract_chunks_from_code(code_string)
+        self.assertEqual(len({c['uuid'] for c in chunks}), 3)
+
+    def test_iter_chunk_spans(self):
+        code_string = "def foo():\n    return 1\n"
+        spans = list(iter_chunk_spans(code_string))
+        self.assertEqual(len(spans), 1)
+        self.assertIsInstance(spans[0][1], memoryview)
+        self.assertEqual(bytes(spans[0][1]), b"def foo():\n    return 1")
+
     def test_process_python_file(self):
         file_path = "../chunks.py"  # Testing chunk.py
         if not os.path.exists(file_path):
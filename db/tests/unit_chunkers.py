@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from ..chunkers import (chunk_source, chunker_kind, extract_json_chunks, extract_markdown_chunks,
+                        extract_notebook_chunks, registered_suffixes)
+from ..parallel import ParallelChunker
+from ..pipeline import iter_repo_documents
+
+MARKDOWN = """Intro text.
+
+# Title
+
+Some words.
+
+## Install
+
+```sh
+# not a heading
+pip install x
+```
+
+## Usage
+
+Run it.
+
+# Appendix
+"""
+
+TEMPLATE = {
+    "$schema": "https://schema.management.azure.com/schemas/2018-05-01/pipeline.json#",
+    "parameters": {"factoryName": {"type": "string"}},
+    "resources": [
+        {"name": "pipeline_a", "type": "Microsoft.DataFactory/factories/pipelines", "properties": {"activities": []}},
+        {"name": "pipeline_b", "type": "Microsoft.DataFactory/factories/pipelines", "properties": {"activities": []}}
+    ]
+}
+
+NOTEBOOK = {
+    "cells": [
+        {"cell_type": "markdown", "source": ["# Notebook\n", "Explains things.\n"]},
+        {"cell_type": "code", "source": "import os\nprint(os.getcwd())\n"},
+        {"cell_type": "code", "source": []},
+        {"cell_type": "code", "source": ["x = 1"]}
+    ],
+    "nbformat": 4
+}
+
+class TestChunkers(unittest.TestCase):
+
+    def test_markdown_sections(self):
+        chunks = extract_markdown_chunks(MARKDOWN)
+        by_name = {chunk["name"]: chunk for chunk in chunks}
+
+        self.assertEqual([chunk["name"] for chunk in chunks],
+                         ["preamble", "section_Title", "section_Install", "section_Usage", "section_Appendix"])
+        self.assertIn("# not a heading", by_name["section_Install"]["code"])
+        self.assertEqual(by_name["section_Install"]["parent"], by_name["section_Title"]["uuid"])
+        self.assertEqual(by_name["section_Usage"]["parent"], by_name["section_Title"]["uuid"])
+        self.assertIsNone(by_name["section_Appendix"]["parent"])
+        self.assertEqual((by_name["section_Title"]["start_line"], by_name["section_Title"]["end_line"]), (3, 6))
+        self.assertEqual(MARKDOWN.splitlines()[by_name["section_Usage"]["start_line"] - 1], "## Usage")
+
+    def test_json_paths(self):
+        text = json.dumps(TEMPLATE, indent=2)
+        self.assertEqual([chunk["name"] for chunk in extract_json_chunks(text)], ["$"])
+
+        chunks = extract_json_chunks(text, max_chars=200)
+        by_name = {chunk["name"]: chunk for chunk in chunks}
+        self.assertEqual(set(by_name), {"$", '$["$schema"]', "$.parameters", "$.resources",
+                                        "$.resources[0]", "$.resources[1]"})
+        self.assertEqual(by_name["$"]["code"], "$: object with keys $schema, parameters, resources")
+        self.assertEqual(by_name["$.resources"]["code"], "$.resources: array of 2 items")
+        self.assertEqual(by_name["$.resources[1]"]["parent"], by_name["$.resources"]["uuid"])
+        self.assertEqual(json.loads(by_name["$.resources[0]"]["code"]), TEMPLATE["resources"][0])
+        self.assertTrue(by_name["$.parameters"]["code"].startswith('"parameters": {'))
+        lines = text.splitlines()
+        resource = by_name["$.resources[0]"]
+        self.assertEqual(lines[resource["start_line"] - 1].strip(), "{")
+        self.assertIn("pipeline_a", "\n".join(lines[resource["start_line"] - 1:resource["end_line"]]))
+
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            extract_json_chunks('{"a": 1,}')
+        with self.assertRaises(ValueError):
+            extract_json_chunks('{"a": 1} {}')
+
+    def test_deeply_nested_json(self):
+        # Splitting follows the nesting without recursing, however deep the split goes
+        depth = 300
+        text = '{"a": ' * depth + '"' + 'x' * 50 + '"' + '}' * depth
+        chunks = extract_json_chunks(text, max_chars=40)
+        self.assertEqual(len(chunks), depth + 1)
+        self.assertEqual(chunks[-1]["name"], "$" + ".a" * depth)
+        self.assertEqual(chunks[-1]["code"], '"a": "' + 'x' * 50 + '"')
+
+        # Deeper than the json module can parse: a ValueError for this file, not a RecursionError
+        with self.assertRaises(ValueError):
+            extract_json_chunks("[" * 100000 + "]" * 100000)
+
+    def test_bad_json_file_is_skipped(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for name, content in (("deep.json", "[" * 100000 + "]" * 100000), ("ok.json", '{"a": [1, 2]}')):
+                with open(os.path.join(temp_dir, name), "w", encoding="utf-8") as f:
+                    f.write(content)
+            chunker = ParallelChunker(workers=1)
+            documents = list(chunker.iter_documents([os.path.join(temp_dir, "deep.json"), os.path.join(temp_dir, "ok.json")]))
+            self.assertEqual([doc["metadata"]["name"] for doc in documents], ["$"])
+            self.assertEqual([os.path.basename(path) for path, _ in chunker.errors], ["deep.json"])
+            self.assertIn("ValueError", chunker.errors[0][1])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_notebook_cells(self):
+        chunks = extract_notebook_chunks(json.dumps(NOTEBOOK))
+        self.assertEqual([chunk["name"] for chunk in chunks], ["markdown_cell_0", "code_cell_1", "code_cell_3"])
+        self.assertEqual([(chunk["start_line"], chunk["end_line"]) for chunk in chunks], [(1, 2), (3, 4), (6, 6)])
+        self.assertEqual(chunks[1]["code"], "import os\nprint(os.getcwd())\n")
+
+    def test_dispatch_by_extension(self):
+        for path, code in (("a.py", "def f():\n    pass\n"), ("README.md", MARKDOWN), ("t.json", "[1, 2]"),
+                           ("n.ipynb", json.dumps(NOTEBOOK))):
+            documents = chunk_source(code, path, object_id="oid", commit_id="c1", mode="slice")
+            self.assertTrue(documents, path)
+            for document in documents:
+                self.assertEqual(document["page_content"], document["metadata"]["code"])
+                self.assertEqual(set(document["metadata"]) - {"start_offset", "end_offset"},
+                                 {"uuid", "name", "qualified_name", "code", "start_line", "end_line", "parent",
+                                  "file_path", "object_id", "commit_id"})
+        self.assertEqual(chunker_kind("a.py", "slice"), "slice")
+        self.assertEqual(chunker_kind("README.MD", "slice"), "markdown")
+        with self.assertRaises(ValueError):
+            chunk_source("", "notes.txt")
+
+class TestSingleWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        files = {"a.py": "def f():\n    pass\n", "docs/README.md": MARKDOWN, "t.json": json.dumps(TEMPLATE),
+                 "n.ipynb": json.dumps(NOTEBOOK), "notes.txt": "ignored\n"}
+        for rel_path, content in files.items():
+            file_path = os.path.join(self.temp_dir, rel_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_one_walk_feeds_every_chunker(self):
+        self.assertEqual(set(registered_suffixes()), {".py", ".md", ".markdown", ".json", ".ipynb"})
+        documents = list(iter_repo_documents(self.temp_dir, workers=1))
+        files = {os.path.relpath(d["metadata"]["file_path"], self.temp_dir) for d in documents}
+        self.assertEqual(files, {"a.py", os.path.join("docs", "README.md"), "t.json", "n.ipynb"})
+        self.assertEqual(len(documents), 1 + 5 + 1 + 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,60 +2,84 @@ import os
 import shutil
 import tempfile
 import unittest
-from unittest.mock import patch, Mock
-from db.connectors import ingest_git_repo
+import git
+from unittest.mock import patch
+from db.benchmarks.synthetic import build_synthetic_repo, build_bare_remote
+from db.connectors import ingest_git_repo, hash_blob, get_blob_ids, iter_files_with_blob_ids
+from db.fetch import fetch_repo
 
 class TestIngestGitRepo(unittest.TestCase):
 
     def setUp(self):
         self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, 'ingest', 'base')
+        self.source = build_synthetic_repo(os.path.join(self.temp_dir, 'source', 'berlayar'), num_files=2,
+                                           num_classes=1, methods_per_class=1, depth=1)
+        self.repo_url = build_bare_remote(self.source, os.path.join(self.temp_dir, 'remote', 'berlayar.git'))
+        self.repo_path = os.path.join(self.temp_dir, 'ingest', 'raw_data', 'git', 'berlayar')
 
     def tearDown(self):
         shutil.rmtree(self.temp_dir)
 
-    @patch('db.connectors.git.Repo')
-    @patch('db.connectors.git.cmd.Git')
-    def test_clone_existing_repo(self, mock_Git, mock_Repo):
-        repo_url = 'https://github.com/erniesg/berlayar.git'
-        repo_name = 'berlayar'
-        commit_id = 'fake_commit_id'
-        commit_id_path = os.path.join(self.temp_dir, 'raw_data', 'git', 'test_git', repo_name, commit_id)
-
-        # Mock the existence of the repository
-        mock_Repo.return_value.exists.return_value = True
-        mock_Repo.return_value.remote.return_value = Mock()
-
-        # Call the function
-        result = ingest_git_repo(repo_url, self.temp_dir)
-
-        # Check if the correct paths are returned
-        self.assertEqual(result, os.path.abspath(commit_id_path))
-        mock_Git.assert_not_called()
-        mock_Repo.assert_called_once_with(commit_id_path)
-        mock_Repo.return_value.remote.assert_called_once_with(name='origin')
-        mock_Repo.return_value.remote.return_value.pull.assert_called_once()
-
-    @patch('db.connectors.git.Repo')
-    @patch('db.connectors.git.cmd.Git')
-    def test_clone_new_repo(self, mock_Git, mock_Repo):
-        repo_url = 'https://github.com/erniesg/berlayar.git'
-        repo_name = 'berlayar'
-        commit_id = 'fake_commit_id'
-        commit_id_path = os.path.join(self.temp_dir, 'raw_data', 'git', 'test_git', repo_name, commit_id)
-
-        # Mock the non-existence of the repository
-        mock_Repo.return_value.exists.return_value = False
-        mock_Repo.return_value.remote.return_value = Mock()
-
-        # Call the function
-        result = ingest_git_repo(repo_url, self.temp_dir)
-
-        # Check if the correct paths are returned
-        self.assertEqual(result, os.path.abspath(commit_id_path))
-        mock_Git().clone.assert_called_once_with(
-            repo_url, commit_id_path, depth=1, branch='master')
-        mock_Repo.assert_called_once_with(commit_id_path)
-        mock_Repo.return_value.remote.assert_not_called()
+    @patch('db.connectors.fetch_repo', wraps=fetch_repo)
+    def test_clone_new_repo(self, mock_fetch):
+        result = ingest_git_repo(self.repo_url, self.base_path, token='secret')
+
+        commit_id = self.source.head.commit.hexsha
+        self.assertEqual(result, os.path.join(os.path.dirname(self.repo_path), commit_id))
+        mock_fetch.assert_called_once_with(self.repo_url, self.repo_path, strategy=None, token='secret')
+        self.assertTrue(os.path.exists(os.path.join(result, 'pkg_0', 'module_0.py')))
+        # The token is passed per command and never persisted in the clone's config
+        with open(os.path.join(self.repo_path, '.git', 'config'), 'r', encoding='utf-8') as f:
+            self.assertNotIn('secret', f.read())
+
+    def test_clone_existing_repo(self):
+        ingest_git_repo(self.repo_url, self.base_path, snapshot='git')
+        with open(os.path.join(self.source.working_tree_dir, 'extra.py'), 'w', encoding='utf-8') as f:
+            f.write('x = 1\n')
+        self.source.index.add(['extra.py'])
+        actor = git.Actor('Test', 'test@example.com')
+        new_commit = self.source.index.commit('extra', author=actor, committer=actor)
+        self.source.git.push(self.repo_url[len('file://'):], 'HEAD:' + self.source.active_branch.name)
+
+        result = ingest_git_repo(self.repo_url, self.base_path, snapshot='git')
+        self.assertEqual(result, self.repo_path)
+        self.assertEqual(git.Repo(result).head.commit.hexsha, new_commit.hexsha)
+        self.assertTrue(os.path.exists(os.path.join(result, 'extra.py')))
+
+class TestBlobIds(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.repo = git.Repo.init(self.temp_dir)
+        os.makedirs(os.path.join(self.temp_dir, 'pkg'))
+        for rel_path, content in [('a.py', 'x = 1\n'), ('pkg/b.py', 'def f():\n    return 2\n'), ('README.md', '# hi\n')]:
+            with open(os.path.join(self.temp_dir, rel_path), 'w', encoding='utf-8') as f:
+                f.write(content)
+        self.repo.index.add(['a.py', 'pkg/b.py', 'README.md'])
+        actor = git.Actor('Test', 'test@example.com')
+        self.repo.index.commit('initial', author=actor, committer=actor)
+
+    def tearDown(self):
+        self.repo.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_hash_blob_matches_git(self):
+        file_path = os.path.join(self.temp_dir, 'pkg', 'b.py')
+        self.assertEqual(hash_blob(file_path), self.repo.git.hash_object(file_path))
+
+    def test_get_blob_ids_from_tree(self):
+        blob_ids = get_blob_ids(self.repo)
+        self.assertEqual(set(blob_ids), {'a.py', 'pkg/b.py'})
+        self.assertEqual(blob_ids['a.py'], self.repo.git.hash_object(os.path.join(self.temp_dir, 'a.py')))
+
+    def test_untracked_files_are_hashed_in_process(self):
+        untracked = os.path.join(self.temp_dir, 'new.py')
+        with open(untracked, 'w', encoding='utf-8') as f:
+            f.write('y = 2\n')
+        files = [os.path.join(self.temp_dir, 'a.py'), untracked]
+        pairs = dict(iter_files_with_blob_ids(self.temp_dir, files, get_blob_ids(self.repo)))
+        self.assertEqual(pairs[untracked], self.repo.git.hash_object(untracked))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from ..embeddings import EmbeddingService, HashingEncoder, get_embedding_service
+
+class FailingEncoder(HashingEncoder):
+
+    def embed_documents(self, texts):
+        raise RuntimeError("model unavailable")
+
+class TestEmbeddingService(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_matches_backend_and_is_deterministic(self):
+        encoder = HashingEncoder(dim=16)
+        service = EmbeddingService(encoder, warm_start=False)
+        vectors = service.embed_documents(["a", "b", "a"])
+        self.assertEqual(vectors, HashingEncoder(dim=16).embed_documents(["a", "b", "a"]))
+        self.assertEqual(service.embed_query("b"), vectors[1])
+        self.assertEqual(len(vectors[0]), 16)
+        service.close()
+
+    def test_micro_batches_concurrent_callers(self):
+        encoder = HashingEncoder()
+        service = EmbeddingService(encoder, max_batch_size=1000, max_latency=0.2, warm_start=False)
+        results = {}
+
+        def call(i):
+            results[i] = service.embed_documents([f"text {i}"])
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 8)
+        self.assertLess(encoder.calls, 8)
+        service.close()
+
+    def test_memoizes_vectors_in_persistent_cache(self):
+        cache_path = os.path.join(self.temp_dir, "cache.sqlite3")
+        first = EmbeddingService(HashingEncoder(), cache_path=cache_path, warm_start=False)
+        vectors = first.embed_documents(["def foo(): pass"])
+        first.close()
+
+        encoder = HashingEncoder()
+        second = EmbeddingService(encoder, cache_path=cache_path, warm_start=False)
+        cached = second.embed_documents(["def foo(): pass"])
+        second.close()
+
+        self.assertEqual(encoder.calls, 0)
+        self.assertEqual(second.stats()["vector_hits"], 1)
+        for a, b in zip(vectors[0], cached[0]):
+            self.assertAlmostEqual(a, b, places=6)
+
+    def test_propagates_backend_errors(self):
+        service = EmbeddingService(FailingEncoder(), warm_start=False)
+        with self.assertRaises(RuntimeError):
+            service.embed_documents(["x"])
+        service.close()
+
+    def test_cache_startup_failure_fails_requests(self):
+        cache_path = os.path.join(self.temp_dir, "missing", "cache.sqlite3")
+        service = EmbeddingService(HashingEncoder(), cache_path=cache_path, warm_start=False)
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                service.embed_documents(["x"])
+        service.close()
+
+    def test_one_service_per_model(self):
+        first = get_embedding_service("fake-model", backend="hashing")
+        self.assertIs(get_embedding_service("fake-model", backend="hashing"), first)
+        self.assertIsNot(get_embedding_service("other-model", backend="hashing"), first)
+
+if __name__ == "__main__":
+    unittest.main()
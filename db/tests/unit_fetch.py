@@ -0,0 +1,184 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import git
+from db.benchmarks.synthetic import build_bare_remote
+from db.connectors import ingest_git_repo
+from db.fetch import FetchStrategy, fetch_repo, open_repo
+from db.pipeline import iter_repo_documents
+
+class AuthenticatedGitServer:
+    """
+    Serves the bare repositories under `root` over smart HTTP (git http-backend as a CGI) and
+    answers 401 to any request without `Authorization: bearer <token>`, like a private GitHub
+    repository. `requests` records (path, authorized) for every request.
+    """
+    def __init__(self, root, token):
+        self.root = root
+        self.token = token
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.handle_git()
+
+            def do_POST(self):
+                self.handle_git()
+
+            def read_body(self):
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    body = b''
+                    while True:
+                        size = int(self.rfile.readline().strip(), 16)
+                        if not size:
+                            self.rfile.readline()
+                            return body
+                        body += self.rfile.read(size)
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+            def handle_git(self):
+                authorized = self.headers.get('Authorization') == f'bearer {server.token}'
+                server.requests.append((self.path, authorized))
+                if not authorized:
+                    self.send_response(401)
+                    self.send_header('WWW-Authenticate', 'Basic realm="git"')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                path, _, query = self.path.partition('?')
+                env = dict(os.environ, GIT_PROJECT_ROOT=server.root, GIT_HTTP_EXPORT_ALL='1', PATH_INFO=path,
+                           QUERY_STRING=query, REQUEST_METHOD=self.command, REMOTE_ADDR='127.0.0.1',
+                           CONTENT_TYPE=self.headers.get('Content-Type', ''),
+                           HTTP_CONTENT_ENCODING=self.headers.get('Content-Encoding', ''),
+                           HTTP_GIT_PROTOCOL=self.headers.get('Git-Protocol', ''))
+                body = self.read_body() if self.command == 'POST' else b''
+                output = subprocess.run(['git', 'http-backend'], input=body, env=env, capture_output=True).stdout
+                head, _, content = output.partition(b'\r\n\r\n')
+                headers = [line.split(': ', 1) for line in head.decode().split('\r\n') if line]
+                status = next((int(value.split()[0]) for name, value in headers if name == 'Status'), 200)
+                self.send_response(status)
+                for name, value in headers:
+                    if name != 'Status':
+                        self.send_header(name, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class TestFetchRepo(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.actor = git.Actor('Test', 'test@example.com')
+        self.source = git.Repo.init(os.path.join(self.temp_dir, 'source'))
+        self.commit({'a.py': 'def f():\n    return 1\n', 'pkg/b.py': 'x = 1\n', 'README.md': '# readme\n', 'setup.cfg': '[metadata]\n'})
+        self.commit({'a.py': 'def f():\n    return 2\n'})
+        self.url = build_bare_remote(self.source, os.path.join(self.temp_dir, 'remote.git'))
+        self.remote = git.Repo(os.path.join(self.temp_dir, 'remote.git'))
+        self.dest = os.path.join(self.temp_dir, 'clone')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def commit(self, files, message='change'):
+        for rel_path, content in files.items():
+            file_path = os.path.join(self.source.working_tree_dir, rel_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        self.source.index.add(list(files))
+        return self.source.index.commit(message, author=self.actor, committer=self.actor)
+
+    def push(self):
+        self.source.git.push(self.remote.git_dir, 'HEAD:refs/heads/' + self.remote.active_branch.name)
+
+    def test_default_is_shallow_partial_and_sparse(self):
+        repo = fetch_repo(self.url, self.dest)
+        self.assertEqual(repo.head.commit.hexsha, self.source.head.commit.hexsha)
+        self.assertEqual(repo.git.rev_list('--count', 'HEAD'), '1')
+        self.assertTrue(os.path.exists(os.path.join(repo.git_dir, 'shallow')))
+        self.assertEqual(repo.config_reader().get_value('remote "origin"', 'partialclonefilter'), 'blob:none')
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'pkg', 'b.py')))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'README.md')))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'setup.cfg')))
+
+    def test_full_strategy(self):
+        repo = fetch_repo(self.url, self.dest, strategy=FetchStrategy.full())
+        self.assertEqual(repo.git.rev_list('--count', 'HEAD'), '2')
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'setup.cfg')))
+
+    def test_update_fetches_new_tip(self):
+        first = fetch_repo(self.url, self.dest).head.commit.hexsha
+        new_commit = self.commit({'c.py': 'y = 2\n'})
+        self.push()
+
+        repo = fetch_repo(self.url, self.dest)
+        self.assertEqual(repo.head.commit.hexsha, new_commit.hexsha)
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'c.py')))
+        # The previously processed commit is still available for diffing
+        self.assertEqual([d.b_path for d in repo.commit(first).diff(new_commit.hexsha)], ['c.py'])
+
+    def test_ref_selects_branch_and_commit(self):
+        self.source.git.checkout('-b', 'feature')
+        feature = self.commit({'feature.py': 'z = 3\n'})
+        self.source.git.push(self.remote.git_dir, 'feature')
+
+        repo = fetch_repo(self.url, self.dest, strategy=FetchStrategy(ref='feature'))
+        self.assertEqual(repo.head.commit.hexsha, feature.hexsha)
+
+        first = self.source.commit('HEAD~2').hexsha
+        repo = fetch_repo(self.url, self.dest, strategy=FetchStrategy(ref=first))
+        self.assertEqual(repo.head.commit.hexsha, first)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'feature.py')))
+
+    def test_ingest_git_repo_reads_documents(self):
+        base_path = os.path.join(self.temp_dir, 'ingest', 'base')
+        repo_path = ingest_git_repo(self.url, base_path, snapshot='git')
+        documents = list(iter_repo_documents(repo_path, workers=1))
+        self.assertEqual({doc['metadata']['name'] for doc in documents}, {'func_f', 'section_readme'})
+        function = next(doc for doc in documents if doc['metadata']['name'] == 'func_f')
+        self.assertIn('return 2', function['page_content'])
+
+    def test_token_authenticates_lazy_blob_fetches(self):
+        # Never prompt for credentials: an unauthenticated request has to fail
+        with AuthenticatedGitServer(self.temp_dir, 'secret') as server, \
+             patch.dict(os.environ, {'GIT_TERMINAL_PROMPT': '0', 'GIT_ASKPASS': 'true'}):
+            url = f'{server.url}/remote.git'
+            with self.assertRaises(git.GitCommandError):
+                fetch_repo(url, os.path.join(self.temp_dir, 'anonymous'))
+
+            # The checkout after the fetch downloads the blobs of a blob:none clone
+            repo = fetch_repo(url, self.dest, token='secret')
+            self.assertEqual(repo.head.commit.hexsha, self.source.head.commit.hexsha)
+            with open(os.path.join(self.dest, 'a.py'), encoding='utf-8') as f:
+                self.assertIn('return 2', f.read())
+            self.assertNotIn(('/remote.git/git-upload-pack', False), server.requests)
+
+            # setup.cfg is outside the sparse checkout, so reading it fetches its blob on demand
+            with self.assertRaises(Exception):
+                git.Repo(self.dest).head.commit.tree['setup.cfg'].data_stream.read()
+            blob = open_repo(self.dest, token='secret').head.commit.tree['setup.cfg']
+            self.assertEqual(blob.data_stream.read(), b'[metadata]\n')
+
+if __name__ == '__main__':
+    unittest.main()
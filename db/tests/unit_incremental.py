@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+import git
+from ..incremental import diff_commits, remove_changed_vectors
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.repo = git.Repo.init(self.temp_dir)
+        self.actor = git.Actor('Test', 'test@example.com')
+        self.write('keep.py', 'a = 1\n')
+        self.write('change.py', 'b = 1\n')
+        self.write('remove.py', 'c = 1\n')
+        self.write('move.py', 'def moved():\n    return "same content"\n')
+        self.write('notes.txt', 'notes\n')
+        self.first = self.commit('first')
+
+    def tearDown(self):
+        self.repo.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, rel_path, content):
+        path = os.path.join(self.temp_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def commit(self, message):
+        self.repo.git.add(A=True)
+        return self.repo.index.commit(message, author=self.actor, committer=self.actor).hexsha
+
+    def test_first_run_adds_every_python_file(self):
+        changes = diff_commits(self.repo, None)
+        self.assertEqual(set(changes.added), {'keep.py', 'change.py', 'remove.py', 'move.py'})
+        self.assertEqual(changes.to_remove(), [])
+
+    def test_classifies_changes(self):
+        old_change_blob = self.repo.commit(self.first).tree['change.py'].hexsha
+        self.write('change.py', 'b = 2\n')
+        os.remove(os.path.join(self.temp_dir, 'remove.py'))
+        os.makedirs(os.path.join(self.temp_dir, 'pkg'))
+        shutil.move(os.path.join(self.temp_dir, 'move.py'), os.path.join(self.temp_dir, 'pkg', 'moved.py'))
+        self.write('new.py', 'd = 1\n')
+        self.write('notes.txt', 'more notes\n')
+        second = self.commit('second')
+
+        changes = diff_commits(self.repo, self.first, second)
+        self.assertEqual(set(changes.added), {'new.py'})
+        self.assertEqual(set(changes.modified), {'change.py'})
+        self.assertEqual(set(changes.deleted), {'remove.py'})
+        self.assertEqual([(old[0], new[0]) for old, new in changes.renamed], [('move.py', 'pkg/moved.py')])
+        self.assertEqual(set(changes.to_index()), {'new.py', 'change.py', 'pkg/moved.py'})
+        self.assertIn(('change.py', old_change_blob), changes.to_remove())
+
+    def test_remove_changed_vectors_filters_by_metadata(self):
+        self.write('change.py', 'b = 3\n')
+        second = self.commit('second')
+        changes = diff_commits(self.repo, self.first, second)
+        db = MagicMock()
+
+        self.assertEqual(remove_changed_vectors(db, '/repo', changes), 1)
+        db.delete.assert_called_once_with(filter={"metadata": {
+            "file_path": os.path.join('/repo', 'change.py'),
+            "object_id": changes.modified_from['change.py'],
+        }})
+
+if __name__ == "__main__":
+    unittest.main()
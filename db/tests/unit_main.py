@@ -0,0 +1,76 @@
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from db import main as main_module
+from db.benchmarks.bench_ingest import InMemoryVectorStore
+from db.benchmarks.synthetic import build_synthetic_repo, build_bare_remote
+from db.state import CheckpointStore
+from db.utils import save_to_db
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, 'ingest', 'base')
+        source = build_synthetic_repo(os.path.join(self.temp_dir, 'source', 'repo'), num_files=4,
+                                      num_classes=1, methods_per_class=1, depth=1)
+        self.url = build_bare_remote(source, os.path.join(self.temp_dir, 'remote', 'repo.git'))
+        self.state_path = os.path.join(self.temp_dir, 'checkpoints.sqlite3')
+        self.store = InMemoryVectorStore()
+        self.prompts = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def vectorstore(self, target_path, embedding):
+        self.store.embedding_function = embedding
+        return self.store
+
+    def run_main(self, answer):
+        answers = iter([self.url, self.base_path, answer])
+
+        def fake_input(prompt):
+            self.prompts.append(prompt)
+            return next(answers)
+
+        save = functools.partial(save_to_db, workers=1, cache_path=None, embedding_backend='hashing',
+                                 vectorstore=self.vectorstore)
+        with patch('builtins.input', fake_input), \
+             patch.object(main_module, 'save_to_db', save), \
+             patch.object(main_module, 'CheckpointStore', lambda: CheckpointStore(self.state_path)), \
+             patch.object(main_module, 'load_dotenv', lambda path: None):
+            main_module.main()
+
+    def last_commit(self):
+        state = CheckpointStore(self.state_path)
+        try:
+            return state.get_commit(self.url)
+        finally:
+            state.close()
+
+    def test_full_first_run_is_checkpointed(self):
+        self.run_main('y')
+        self.assertTrue(self.prompts[-1].startswith('First run detected'))
+        self.assertEqual(len(self.store.texts), 12)
+        self.assertIsNotNone(self.last_commit())
+
+        self.run_main('y')
+        # The second run sees the checkpoint and has nothing to ask
+        self.assertEqual(len(self.prompts), 5)
+        self.assertFalse(any(prompt.startswith('First run detected') for prompt in self.prompts[3:]))
+
+    def test_sampled_first_run_can_be_followed_by_a_full_run(self):
+        self.run_main('1')
+        self.assertEqual(len(self.store.texts), 3)
+        self.assertIsNone(self.last_commit())
+
+        self.run_main('y')
+        self.assertTrue(self.prompts[-1].startswith('First run detected'))
+        self.assertEqual(len(self.store.texts), 12)
+        self.assertIsNotNone(self.last_commit())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from ..parallel import ParallelChunker
+
+class TestParallelChunker(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.files = []
+        for i in range(6):
+            file_path = os.path.join(self.temp_dir, f"module_{i}.py")
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(f"def foo_{i}():\n    return {i}\n\nclass Bar{i}:\n    def baz(self):\n        pass\n")
+            self.files.append(file_path)
+        self.bad_file = os.path.join(self.temp_dir, "broken.py")
+        with open(self.bad_file, 'w', encoding='utf-8') as f:
+            f.write("def broken(:\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_streams_documents_from_pool(self):
+        chunker = ParallelChunker(workers=2, max_in_flight=2)
+        documents = list(chunker.iter_documents(self.files, commit_id="abc"))
+
+        self.assertEqual(len(documents), 18)
+        self.assertEqual(chunker.files_processed, 6)
+        self.assertEqual(chunker.errors, [])
+        self.assertTrue(all(doc["metadata"]["commit_id"] == "abc" for doc in documents))
+
+    def test_collects_errors(self):
+        chunker = ParallelChunker(workers=2)
+        files = [(path, f"oid{i}") for i, path in enumerate(self.files + [self.bad_file])]
+        documents = list(chunker.iter_documents(files))
+
+        self.assertEqual(len(documents), 18)
+        self.assertEqual(len(chunker.errors), 1)
+        self.assertEqual(chunker.errors[0][0], self.bad_file)
+        self.assertIn("SyntaxError", chunker.errors[0][1])
+
+    def test_single_worker_runs_inline(self):
+        chunker = ParallelChunker(workers=1)
+        results = list(chunker.iter_file_results(self.files[:2]))
+        self.assertEqual([path for path, _ in results], self.files[:2])
+
+    def test_shared_executor_needs_worker_count(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            with self.assertRaises(ValueError):
+                ParallelChunker(executor=executor)
+            chunker = ParallelChunker(workers=2, executor=executor)
+            self.assertEqual(chunker.max_in_flight, 8)
+            self.assertEqual(len(list(chunker.iter_documents(self.files))), 18)
+
+if __name__ == "__main__":
+    unittest.main()
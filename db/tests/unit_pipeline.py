@@ -0,0 +1,62 @@
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+import git
+from ..batching import BatchWriter
+from ..parallel import ParallelChunker
+from ..pipeline import iter_repo_documents, sample_documents
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for i in range(5):
+            with open(os.path.join(self.temp_dir, f"module_{i}.py"), 'w', encoding='utf-8') as f:
+                f.write(f"def foo_{i}():\n    return {i}\n\ndef bar_{i}():\n    return -{i}\n")
+        with open(os.path.join(self.temp_dir, "notes.txt"), 'w', encoding='utf-8') as f:
+            f.write("not python\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_walks_plain_directory_lazily(self):
+        chunker = ParallelChunker(workers=1)
+        documents = iter_repo_documents(self.temp_dir, chunker=chunker)
+        first = list(itertools.islice(documents, 2))
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(chunker.files_processed, 1)
+        self.assertEqual(len(first[0]["metadata"]["object_id"]), 40)
+
+    def test_reads_git_repository_at_head(self):
+        repo = git.Repo.init(self.temp_dir)
+        repo.git.add(A=True)
+        actor = git.Actor('Test', 'test@example.com')
+        commit = repo.index.commit('initial', author=actor, committer=actor).hexsha
+        os.remove(os.path.join(self.temp_dir, "module_0.py"))
+
+        documents = list(iter_repo_documents(self.temp_dir, workers=1))
+        self.assertEqual(len(documents), 10)
+        self.assertTrue(all(d["metadata"]["commit_id"] == commit for d in documents))
+        repo.close()
+
+    def test_streams_into_batch_writer(self):
+        db = MagicMock()
+        with BatchWriter(db, batch_size=4, verbose=False) as writer:
+            writer.add_documents(iter_repo_documents(self.temp_dir, workers=1))
+
+        self.assertEqual(writer.chunks_saved, 10)
+        self.assertEqual([len(c.args[0]) for c in db.add_texts.call_args_list], [4, 4, 2])
+
+    def test_sample_documents(self):
+        self.assertEqual(sample_documents(iter([]), k=1), [])
+        sampled = sample_documents(iter(range(100)), k=3, rng=random.Random(0))
+        self.assertEqual(len(sampled), 3)
+        self.assertEqual(len(set(sampled)), 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from langchain.vectorstores import DeepLake
+from langchain.vectorstores.utils import maximal_marginal_relevance
+from ..retrieval import MMRRetriever, mmr, top_k_cosine
+from ..vectorstore import LocalVectorStore
+from .unit_vectorstore import FixedEmbeddings
+
+VECTORS = {"query": [1.0, 0.0, 0.0], "near": [0.9, 0.1, 0.0], "near copy": [0.9, 0.1, 0.0],
+           "other": [0.7, 0.0, 0.7], "far": [0.0, 0.0, 1.0]}
+
+class TestRanking(unittest.TestCase):
+
+    def test_mmr_matches_langchain(self):
+        rng = np.random.default_rng(0)
+        for fetch_k, k in ((1, 4), (20, 4), (100, 10), (300, 25)):
+            candidates = rng.normal(size=(fetch_k, 16)).astype(np.float32)
+            query = rng.normal(size=16).astype(np.float32)
+            for lambda_mult in (0.0, 0.25, 0.5, 0.9, 1.0):
+                expected = maximal_marginal_relevance(query, candidates, lambda_mult=lambda_mult, k=k)
+                self.assertEqual(mmr(query, candidates, k=k, lambda_mult=lambda_mult), expected,
+                                 (fetch_k, k, lambda_mult))
+        self.assertEqual(mmr(query, np.zeros((0, 16)), k=4), [])
+
+    def test_top_k_cosine(self):
+        candidates = np.array([VECTORS[t] for t in ("far", "other", "near")])
+        indices, similarities = top_k_cosine(VECTORS["query"], candidates, k=2)
+        self.assertEqual(list(indices), [2, 1])
+        self.assertTrue(np.all(np.diff(similarities) <= 0))
+        self.assertEqual(list(top_k_cosine(VECTORS["query"], candidates, k=10)[0]), [2, 1, 0])
+
+class TestMMRRetriever(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.embeddings = FixedEmbeddings(VECTORS)
+        self.texts = [t for t in VECTORS if t != "query"]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def check(self, store):
+        retriever = MMRRetriever(store=store, embeddings=self.embeddings, k=2, fetch_k=4, lambda_mult=0.5)
+        self.assertEqual([d.page_content for d in retriever.get_relevant_documents("query")], ["near", "other"])
+        retriever.search_type = "similarity"
+        self.assertEqual([d.page_content for d in retriever.get_relevant_documents("query")], ["near", "near copy"])
+        retriever.lambda_mult, retriever.search_type = 1.0, "mmr"
+        self.assertEqual([d.page_content for d in retriever.get_relevant_documents("query")], ["near", "near copy"])
+
+    def test_local_store(self):
+        store = LocalVectorStore(os.path.join(self.temp_dir, 'store'), self.embeddings)
+        store.add_texts(self.texts, metadatas=[{"name": t} for t in self.texts])
+        self.check(store)
+        store.close()
+
+    def test_deeplake_store(self):
+        store = DeepLake(dataset_path="mem://retrieval", embedding_function=self.embeddings, verbose=False)
+        store.add_texts(self.texts, metadatas=[{"name": t} for t in self.texts])
+        self.check(store)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import git
+from ..benchmarks.bench_ingest import InMemoryVectorStore
+from ..benchmarks.synthetic import build_synthetic_repo, build_bare_remote
+from ..fetch import fetch_repo
+from ..scheduler import IngestScheduler, load_manifest
+from ..state import CheckpointStore
+from ..utils import save_to_db
+
+class TestIngestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, 'ingest', 'base')
+        self.cache_path = os.path.join(self.temp_dir, 'cache.sqlite3')
+        self.state = CheckpointStore(os.path.join(self.temp_dir, 'checkpoints.sqlite3'))
+        self.stores = {}
+        self.specs = []
+        for name, num_files in (('alpha', 3), ('beta', 2)):
+            repo = build_synthetic_repo(os.path.join(self.temp_dir, 'source', name), num_files=num_files,
+                                        num_classes=1, methods_per_class=1, depth=1)
+            url = build_bare_remote(repo, os.path.join(self.temp_dir, 'remote', f'{name}.git'))
+            self.specs.append({'url': url, 'target': f'memory://{name}'})
+
+    def tearDown(self):
+        self.state.close()
+        shutil.rmtree(self.temp_dir)
+
+    def vectorstore(self, target_path, embedding):
+        return self.stores.setdefault(target_path, InMemoryVectorStore(target_path, embedding))
+
+    def scheduler(self, **kwargs):
+        kwargs.setdefault('cpu_workers', 1)
+        return IngestScheduler(self.base_path, state=self.state, cache_path=self.cache_path,
+                               embedding_backend='hashing', vectorstore=self.vectorstore, **kwargs)
+
+    def test_ingests_every_repo_and_keeps_per_repo_state(self):
+        results = self.scheduler(cpu_workers=2).run(self.specs)
+
+        self.assertEqual({r['status'] for r in results.values()}, {'indexed'})
+        # Three chunks (class, method, nested function) per synthetic file
+        self.assertEqual(len(self.stores['memory://alpha'].texts), 9)
+        self.assertEqual(len(self.stores['memory://beta'].texts), 6)
+        for spec in self.specs:
+            self.assertEqual(self.state.get_commit(spec['url']), results[spec['url']]['commit_id'])
+
+        results = self.scheduler().run(self.specs)
+        self.assertEqual({r['status'] for r in results.values()}, {'unchanged'})
+        self.assertEqual(len(self.stores['memory://alpha'].texts), 9)
+
+    def test_slow_repo_does_not_block_others(self):
+        slow_url, fast_url = self.specs[0]['url'], self.specs[1]['url']
+        fast_indexed = threading.Event()
+        order = []
+
+        def fetch(url, repo_path, **kwargs):
+            if url == slow_url:
+                # Only returns once the other repository made it all the way through indexing
+                self.assertTrue(fast_indexed.wait(timeout=30))
+            return fetch_repo(url, repo_path, **kwargs)
+
+        def save(repo_url, *args, **kwargs):
+            summary = save_to_db(repo_url, *args, **kwargs)
+            order.append(repo_url)
+            if repo_url == fast_url:
+                fast_indexed.set()
+            return summary
+
+        results = self.scheduler(io_workers=2, index_workers=1, fetch=fetch, save=save).run(self.specs)
+        self.assertEqual(order, [fast_url, slow_url])
+        self.assertEqual({r['status'] for r in results.values()}, {'indexed'})
+
+    def test_failures_are_isolated(self):
+        missing = {'url': 'file://' + os.path.join(self.temp_dir, 'remote', 'missing.git'), 'target': 'memory://missing'}
+        results = self.scheduler().run([missing] + self.specs)
+
+        self.assertEqual(results[missing['url']]['status'], 'fetch_failed')
+        self.assertIn('error', results[missing['url']])
+        self.assertIsNone(self.state.get_commit(missing['url']))
+        for spec in self.specs:
+            self.assertEqual(results[spec['url']]['status'], 'indexed')
+
+    def test_refs_and_same_named_repos_get_their_own_clones(self):
+        source = build_synthetic_repo(os.path.join(self.temp_dir, 'source', 'gamma'), num_files=2,
+                                      num_classes=1, methods_per_class=1, depth=1)
+        main_commit = source.head.commit.hexsha
+        source.git.checkout('-b', 'feature')
+        with open(os.path.join(source.working_tree_dir, 'feature.py'), 'w', encoding='utf-8') as f:
+            f.write('class Feature:\n    def run(self):\n        def step():\n            pass\n')
+        source.git.add(A=True)
+        actor = git.Actor('Test', 'test@example.com')
+        feature_commit = source.index.commit('feature', author=actor, committer=actor).hexsha
+        source.git.checkout('-')
+        url = build_bare_remote(source, os.path.join(self.temp_dir, 'remote', 'gamma.git'))
+        # Another owner's repository with the same name
+        other = build_synthetic_repo(os.path.join(self.temp_dir, 'source', 'other', 'gamma'), num_files=1,
+                                     num_classes=1, methods_per_class=1, depth=1)
+        other_url = build_bare_remote(other, os.path.join(self.temp_dir, 'remote', 'other', 'gamma.git'))
+        specs = [{'url': url, 'target': 'memory://main'},
+                 {'url': url, 'ref': 'feature', 'target': 'memory://feature'},
+                 {'url': other_url, 'target': 'memory://other'}]
+
+        results = self.scheduler(io_workers=3, index_workers=3).run(specs)
+        self.assertEqual({r['status'] for r in results.values()}, {'indexed'})
+        self.assertEqual(results[url]['commit_id'], main_commit)
+        self.assertEqual(results[f'{url}@feature']['commit_id'], feature_commit)
+        self.assertEqual(self.state.get_commit(url), main_commit)
+        self.assertEqual(self.state.get_commit(url, 'feature'), feature_commit)
+        self.assertEqual(self.state.get_commit(other_url), other.head.commit.hexsha)
+        self.assertEqual(len(self.stores['memory://main'].texts), 6)
+        self.assertEqual(len(self.stores['memory://feature'].texts), 9)
+        self.assertEqual(len(self.stores['memory://other'].texts), 3)
+        self.assertFalse(any('feature.py' in m['file_path'] for m in self.stores['memory://main'].metadatas))
+
+    def test_load_manifest_rejects_duplicate_entries(self):
+        path = os.path.join(self.temp_dir, 'manifest.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'repos': [{'url': 'https://example.com/org/one.git', 'ref': 'dev'},
+                                 {'url': 'https://example.com/org/one.git'},
+                                 {'url': 'https://example.com/org/one.git', 'ref': 'dev'}]}, f)
+        with self.assertRaises(ValueError):
+            load_manifest(path)
+
+    def test_load_manifest_fills_in_targets(self):
+        path = os.path.join(self.temp_dir, 'manifest.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'target_template': 'memory://{repo_name}', 'repos': [
+                {'url': 'https://example.com/org/one.git'},
+                {'url': 'https://example.com/org/two.git', 'target': 'memory://custom', 'ref': 'dev'}]}, f)
+        manifest = load_manifest(path)
+        self.assertEqual([r['target'] for r in manifest['repos']], ['memory://one', 'memory://custom'])
+
+if __name__ == '__main__':
+    unittest.main()
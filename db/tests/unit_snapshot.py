@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+import git
+from ..snapshot import iter_commit_files, link_py_files
+from ..parallel import ParallelChunker
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.repo_dir = os.path.join(self.temp_dir, 'repo')
+        self.repo = git.Repo.init(self.repo_dir)
+        os.makedirs(os.path.join(self.repo_dir, 'pkg'))
+        for rel_path, content in [('a.py', 'def a():\n    return 1\n'), ('pkg/b.py', 'class B:\n    pass\n'), ('c.txt', 'text\n')]:
+            with open(os.path.join(self.repo_dir, rel_path), 'w', encoding='utf-8') as f:
+                f.write(content)
+        self.repo.git.add(A=True)
+        actor = git.Actor('Test', 'test@example.com')
+        self.commit = self.repo.index.commit('initial', author=actor, committer=actor).hexsha
+
+    def tearDown(self):
+        self.repo.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_reads_commit_contents_without_checkout(self):
+        with open(os.path.join(self.repo_dir, 'a.py'), 'w', encoding='utf-8') as f:
+            f.write('dirty = True\n')
+
+        files = {os.path.relpath(path, self.repo_dir): (blob_id, content)
+                 for path, blob_id, content in iter_commit_files(self.repo, self.commit)}
+        self.assertEqual(set(files), {'a.py', os.path.join('pkg', 'b.py')})
+        self.assertEqual(files['a.py'][1], b'def a():\n    return 1\n')
+        self.assertEqual(files['a.py'][0], self.repo.commit(self.commit).tree['a.py'].hexsha)
+
+    def test_lazy_contents_feed_chunker(self):
+        files = list(iter_commit_files(self.repo, paths=['pkg/b.py'], lazy=True))
+        self.assertTrue(callable(files[0][2]))
+
+        documents = list(ParallelChunker(workers=1).iter_documents(files, commit_id=self.commit))
+        self.assertEqual([d['metadata']['name'] for d in documents], ['class_B'])
+        self.assertEqual(documents[0]['metadata']['file_path'], os.path.join(self.repo_dir, 'pkg/b.py'))
+
+    def test_link_py_files(self):
+        dest = os.path.join(self.temp_dir, 'snapshot')
+        link_py_files(self.repo_dir, dest)
+
+        self.assertFalse(os.path.exists(os.path.join(dest, 'c.txt')))
+        self.assertFalse(os.path.exists(os.path.join(dest, '.git')))
+        self.assertTrue(os.path.samefile(os.path.join(dest, 'pkg', 'b.py'), os.path.join(self.repo_dir, 'pkg', 'b.py')))
+
+if __name__ == "__main__":
+    unittest.main()
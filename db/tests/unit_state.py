@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ..benchmarks.bench_ingest import InMemoryVectorStore
+from ..benchmarks.synthetic import build_synthetic_repo, build_bare_remote
+from ..connectors import ingest_git_repo
+from ..state import CheckpointStore, FileProgress
+from ..utils import save_to_db
+
+class Crash(BaseException):
+    pass
+
+class FlakyVectorStore(InMemoryVectorStore):
+    """
+    Fails the `fail_on`-th add_texts call, with a Crash (simulating a killed process) or an Exception.
+    """
+    def __init__(self, fail_on=None, error=Crash):
+        super().__init__()
+        self.fail_on = fail_on
+        self.error = error
+        self.calls = 0
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise self.error("vector store went away")
+        return super().add_texts(texts, metadatas, ids)
+
+class TestCheckpointStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'checkpoints.sqlite3')
+        self.store = CheckpointStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_repositories_and_refs_are_independent(self):
+        self.store.set_commit('repo-a', 'a1')
+        self.store.set_commit('repo-b', 'b1')
+        self.store.set_commit('repo-a', 'a2', ref='dev')
+        self.assertEqual(self.store.get_commit('repo-a'), 'a1')
+        self.assertEqual(self.store.get_commit('repo-b'), 'b1')
+        self.assertEqual(self.store.get_commit('repo-a', 'dev'), 'a2')
+        self.assertIsNone(self.store.get_commit('repo-c'))
+
+    def test_interrupted_run_resumes_with_written_files(self):
+        self.assertEqual(self.store.begin('repo', None, 'c1'), {})
+        self.store.record_files('repo', None, 'c1', [('a.py', 'blob-a', 3)])
+        self.store.close()
+
+        self.store = CheckpointStore(self.path)
+        self.assertIsNone(self.store.get_commit('repo'))
+        self.assertEqual(self.store.begin('repo', None, 'c1'), {'a.py': 'blob-a'})
+        # A different commit starts from scratch
+        self.assertEqual(self.store.begin('repo', None, 'c2'), {})
+
+    def test_complete_records_counts_and_forgets_removed_files(self):
+        self.store.begin('repo', None, 'c1')
+        self.store.record_files('repo', None, 'c1', [('a.py', 'blob-a', 3), ('b.py', 'blob-b', 2)])
+        self.store.complete('repo', None, 'c1')
+        self.store.begin('repo', None, 'c2')
+        self.store.record_files('repo', None, 'c2', [('a.py', 'blob-a2', 4)])
+        self.store.complete('repo', None, 'c2', removed_paths=['b.py'])
+
+        checkpoint = self.store.get_checkpoint('repo')
+        self.assertEqual(checkpoint['commit_id'], 'c2')
+        self.assertIsNone(checkpoint['pending_commit_id'])
+        self.assertEqual((checkpoint['files'], checkpoint['chunks']), (1, 4))
+        self.assertGreaterEqual(checkpoint['seconds'], 0)
+        self.assertEqual(self.store.get_files('repo'), {'a.py': 'blob-a2'})
+
+    def test_imports_legacy_commit_file_once(self):
+        repo = build_synthetic_repo(os.path.join(self.temp_dir, 'repo'), num_files=1, num_classes=1, methods_per_class=1)
+        commit_id = repo.head.commit.hexsha
+        legacy_path = os.path.join(self.temp_dir, 'last_processed_commit.txt')
+        with open(legacy_path, 'w') as f:
+            f.write('0' * 40)
+        # A commit the repository does not contain belongs to some other repository
+        self.assertIsNone(self.store.import_legacy_commit('repo', repo, path=legacy_path))
+        self.assertTrue(os.path.exists(legacy_path))
+
+        with open(legacy_path, 'w') as f:
+            f.write(commit_id)
+        self.assertEqual(self.store.import_legacy_commit('repo', repo, path=legacy_path), commit_id)
+        self.assertEqual(self.store.get_commit('repo'), commit_id)
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertTrue(os.path.exists(legacy_path + '.imported'))
+        self.assertIsNone(self.store.import_legacy_commit('repo', repo, path=legacy_path))
+
+    def test_file_progress_waits_for_every_chunk(self):
+        progress = FileProgress(self.store, 'repo', None, 'c1')
+        self.store.begin('repo', None, 'c1')
+        progress.queued('/r/a.py')
+        progress.queued('/r/a.py')
+        progress.flushed([{'file_path': '/r/a.py'}])
+        progress.finish('/r/a.py', 'a.py', 'blob-a')
+        self.assertEqual(self.store.get_files('repo'), {})
+        progress.flushed([{'file_path': '/r/a.py'}])
+        self.assertEqual(self.store.get_files('repo'), {'a.py': 'blob-a'})
+
+class TestSaveToDbCheckpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, 'ingest', 'base')
+        # Three chunks per file, so with batch_size=3 every batch holds exactly one file
+        source = build_synthetic_repo(os.path.join(self.temp_dir, 'source', 'repo'), num_files=4,
+                                      num_classes=1, methods_per_class=1, depth=1)
+        self.url = build_bare_remote(source, os.path.join(self.temp_dir, 'remote', 'repo.git'))
+        ingest_git_repo(self.url, self.base_path, snapshot='git')
+        self.commit_id = source.head.commit.hexsha
+        self.state = CheckpointStore(os.path.join(self.temp_dir, 'checkpoints.sqlite3'))
+
+    def tearDown(self):
+        self.state.close()
+        shutil.rmtree(self.temp_dir)
+
+    def save(self, store):
+        return save_to_db(self.url, 'memory://repo', self.base_path, commit_id=self.commit_id, batch_size=3,
+                          workers=1, cache_path=None, embedding_backend='hashing',
+                          vectorstore=lambda path, embedding: self.bind(store, embedding), state=self.state)
+
+    def bind(self, store, embedding):
+        store.embedding_function = embedding
+        return store
+
+    def test_crash_mid_run_resumes_without_duplicates(self):
+        store = FlakyVectorStore(fail_on=3)
+        with self.assertRaises(Crash):
+            self.save(store)
+        self.assertIsNone(self.state.get_commit(self.url))
+        self.assertEqual(len(self.state.get_files(self.url, commit_id=self.commit_id)), 2)
+
+        summary = self.save(store)
+        self.assertEqual(summary['resumed'], 2)
+        self.assertEqual(summary['files'], 2)
+        self.assertEqual(self.state.get_commit(self.url), self.commit_id)
+        self.assertEqual(len(store.texts), 12)
+        self.assertEqual(len(set(store.texts)), 12)
+        self.assertEqual(self.state.get_checkpoint(self.url)['chunks'], 12)
+
+        self.assertTrue(self.save(store)['skipped'])
+
+    def test_failed_batch_leaves_commit_pending(self):
+        store = FlakyVectorStore(fail_on=2, error=RuntimeError)
+        summary = self.save(store)
+        self.assertFalse(summary['completed'])
+        self.assertIsNone(self.state.get_commit(self.url))
+
+        summary = self.save(store)
+        self.assertTrue(summary['completed'])
+        self.assertEqual(summary['resumed'], 3)
+        self.assertEqual(len(store.texts), 12)
+
+if __name__ == '__main__':
+    unittest.main()
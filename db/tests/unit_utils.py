@@ -1,41 +1,94 @@
+import os
+import shutil
+import tempfile
 import unittest
-from unittest.mock import patch, MagicMock, call
+import git
+from db.benchmarks.bench_ingest import InMemoryVectorStore
+from db.benchmarks.synthetic import build_synthetic_repo, build_bare_remote
+from db.connectors import ingest_git_repo, get_repo_name_and_path
+from db.incremental import diff_commits
+from db.state import CheckpointStore
 from db.utils import save_to_db
 
 class TestSaveToDB(unittest.TestCase):
-    @patch('db.utils.git.Repo')  # Mock the git.Repo class
-    @patch('db.utils.random.sample')  # Mock the random.sample function
-    @patch('db.utils.DeepLake')  # Mock the DeepLake class
-    @patch('db.utils.HuggingFaceEmbeddings')  # Mock the HuggingFaceEmbeddings class
-    @patch('db.utils.process_python_file')  # Mock the process_python_file function
-    def test_save_to_db(self, mock_process, mock_embed, mock_deeplake, mock_random, mock_repo):
-        # Mock instances and setup
-        mock_repo_instance = MagicMock()
-        mock_embed_instance = MagicMock()
-        mock_deeplake_instance = MagicMock()
-
-        # Mock random.sample to return a predefined repo path
-        mock_random.return_value = ['/fake/repo/path']
-
-        mock_repo.return_value = mock_repo_instance
-        mock_embed.return_value = mock_embed_instance
-        mock_deeplake.return_value = mock_deeplake_instance
-
-        # Set up the mock_process return value
-        mock_chunks = [
-            {"name": "chunk1", "start_line": 1, "end_line": 5, "code": "code1"},
-            {"name": "chunk2", "start_line": 10, "end_line": 15, "code": "code2"}
-        ]
-        mock_process.return_value = mock_chunks
-
-        # Call the function you want to test
-        repo_path = "/fake/repo/path"
-        deeplake_path = "/fake/deeplake/path"
-        save_to_db(repo_path, deeplake_path, sample=True)
-
-        # Debugging and assertions
-        mock_process.assert_called_once_with("/fake/repo/path", repo=mock_repo_instance)
-        # ... rest of the assertions ...
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, 'ingest', 'base')
+        self.source = source = build_synthetic_repo(os.path.join(self.temp_dir, 'source', 'repo'), num_files=4,
+                                      num_classes=1, methods_per_class=1, depth=1)
+        self.url = build_bare_remote(source, os.path.join(self.temp_dir, 'remote', 'repo.git'))
+        ingest_git_repo(self.url, self.base_path, snapshot='git')
+        self.commit_id = source.head.commit.hexsha
+        self.state = CheckpointStore(os.path.join(self.temp_dir, 'checkpoints.sqlite3'))
+        self.store = InMemoryVectorStore()
+
+    def tearDown(self):
+        self.state.close()
+        shutil.rmtree(self.temp_dir)
+
+    def vectorstore(self, target_path, embedding):
+        self.store.dataset_path = target_path
+        self.store.embedding_function = embedding
+        return self.store
+
+    def save(self, **kwargs):
+        return save_to_db(self.url, 'memory://repo', self.base_path, commit_id=self.commit_id, workers=1,
+                          cache_path=None, embedding_backend='hashing', vectorstore=self.vectorstore,
+                          state=self.state, **kwargs)
+
+    def test_save_to_db(self):
+        summary = self.save(batch_size=5)
+
+        # Three chunks (class, method, nested function) per file, written in batches of five
+        self.assertEqual(summary['files'], 4)
+        self.assertEqual(summary['chunks'], 12)
+        self.assertEqual(summary['batches'], 3)
+        self.assertEqual(len(self.store.texts), 12)
+        self.assertEqual(len(self.store.vectors), 12)
+        self.assertTrue(all(m['commit_id'] == self.commit_id for m in self.store.metadatas))
+        self.assertEqual(self.state.get_commit(self.url), self.commit_id)
+
+        self.assertTrue(self.save()['skipped'])
+
+    def test_rerun_without_checkpoint_skips_stored_chunks(self):
+        self.save()
+        ids = list(self.store.ids)
+        self.state.close()
+        self.state = CheckpointStore(os.path.join(self.temp_dir, 'fresh.sqlite3'))
+
+        summary = self.save()
+        self.assertTrue(summary['completed'])
+        self.assertEqual((summary['chunks'], summary['existing']), (0, 12))
+        self.assertEqual(self.store.ids, ids)
+
+    def test_sampled_run_is_not_checkpointed(self):
+        summary = self.save(sample=True)
+        self.assertEqual(summary['files'], 1)
+        self.assertFalse(summary['completed'])
+        self.assertIsNone(self.state.get_commit(self.url))
+
+    def test_sample_is_ignored_for_incremental_runs(self):
+        self.save()
+        for path in ('pkg_0/module_0.py', 'pkg_0/sub_0/module_1.py'):
+            with open(os.path.join(self.source.working_tree_dir, path), 'a', encoding='utf-8') as f:
+                f.write('# changed\n')
+        self.source.git.add(A=True)
+        actor = git.Actor('Test', 'test@example.com')
+        self.source.index.commit('change two files', author=actor, committer=actor)
+        self.source.git.push(self.url[len('file://'):], 'HEAD:' + self.source.active_branch.name)
+        ingest_git_repo(self.url, self.base_path, snapshot='git')
+        repo = git.Repo(get_repo_name_and_path(self.url, self.base_path)[1])
+        previous, self.commit_id = self.commit_id, repo.head.commit.hexsha
+        changes = diff_commits(repo, previous, self.commit_id)
+        self.assertEqual(len(changes.modified), 2)
+
+        summary = self.save(sample=True, changes=changes)
+        self.assertEqual(summary['files'], 2)
+        self.assertTrue(summary['completed'])
+        self.assertEqual(len(self.store.texts), 12)
+        self.assertEqual(len({m['file_path'] for m in self.store.metadatas}), 4)
+        self.assertEqual(self.state.get_commit(self.url), self.commit_id)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from ..benchmarks.synthetic import build_synthetic_repo, build_bare_remote
+from ..connectors import ingest_git_repo
+from ..embeddings import HashingEncoder
+from ..state import CheckpointStore
+from ..utils import save_to_db
+from ..vectorstore import LocalVectorStore, open_vector_store, vector_store_exists
+
+class FixedEmbeddings(Embeddings):
+    """
+    Maps texts to the vectors given for them, so tests control every similarity.
+    """
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+class TestLocalVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = 'local://' + os.path.join(self.temp_dir, 'store')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_search_persists_across_reopen(self):
+        store = open_vector_store(self.path, HashingEncoder())
+        self.assertIsInstance(store, LocalVectorStore)
+        self.assertEqual(len(store), 0)
+        texts = [f"def func_{i}(): return {i}" for i in range(50)]
+        store.add_texts(texts, metadatas=[{"i": i} for i in range(50)], ids=[f"id-{i}" for i in range(50)])
+        store.close()
+
+        store = open_vector_store(self.path, HashingEncoder(), read_only=True)
+        self.assertTrue(vector_store_exists(self.path))
+        self.assertEqual(len(store), 50)
+        document, score = store.similarity_search_with_score(texts[7], k=3)[0]
+        self.assertEqual((document.page_content, document.metadata), (texts[7], {"i": 7}))
+        self.assertAlmostEqual(score, 1.0, places=5)
+        self.assertEqual(store.stored_ids(), {f"id-{i}" for i in range(50)})
+        with self.assertRaises(ValueError):
+            store.add_texts(["x"])
+        store.close()
+
+    def test_upsert_and_delete(self):
+        store = LocalVectorStore(self.path, HashingEncoder())
+        store.add_texts(["a", "b", "c"], metadatas=[{"file_path": "x.py"}, {"file_path": "y.py"}, {"file_path": "y.py"}],
+                        ids=["1", "2", "3"])
+        store.add_texts(["a2"], metadatas=[{"file_path": "x.py"}], ids=["1"])
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.similarity_search("a2", k=1)[0].page_content, "a2")
+
+        store.delete(filter={"metadata": {"file_path": "y.py"}})
+        self.assertEqual(store.stored_ids(), {"1"})
+        store.delete(ids=["1"])
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.similarity_search("a", k=2), [])
+        store.close()
+
+    def test_mmr_prefers_diverse_results(self):
+        vectors = {"query": [1.0, 0.0, 0.0], "near": [0.9, 0.1, 0.0], "near copy": [0.9, 0.1, 0.0],
+                   "other": [0.7, 0.0, 0.7], "far": [0.0, 0.0, 1.0]}
+        store = LocalVectorStore(self.path, FixedEmbeddings(vectors))
+        store.add_texts([t for t in vectors if t != "query"])
+
+        self.assertEqual([d.page_content for d in store.similarity_search("query", k=2)], ["near", "near copy"])
+        mmr = store.max_marginal_relevance_search("query", k=2, fetch_k=4, lambda_mult=0.5)
+        self.assertEqual([d.page_content for d in mmr], ["near", "other"])
+
+        # The DeepLake retriever options used by chat_adf work unchanged
+        retriever = store.as_retriever()
+        retriever.search_kwargs.update(distance_metric='cos', fetch_k=4, maximal_marginal_relevance=True, k=2)
+        self.assertEqual([d.page_content for d in retriever.get_relevant_documents("query")], ["near", "other"])
+        store.close()
+
+    def test_ivf_index_keeps_recall(self):
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(20, 32))
+        data = np.repeat(centers, 100, axis=0) + rng.normal(scale=0.3, size=(2000, 32))
+        vectors = {str(i): list(v) for i, v in enumerate(data)}
+        exact = LocalVectorStore(os.path.join(self.temp_dir, 'exact'), FixedEmbeddings(vectors))
+        approximate = LocalVectorStore(self.path, FixedEmbeddings(vectors), ivf_min_vectors=500, nprobe=4)
+        for store in (exact, approximate):
+            for i in range(0, 2000, 250):
+                store.add_texts([str(j) for j in range(i, i + 250)])
+        self.assertIsNone(exact.centroids)
+        self.assertEqual(len(approximate.centroids), int(np.sqrt(2000)))
+
+        recall = []
+        for query in rng.normal(size=(20, 32)):
+            truth = {d.page_content for d in exact.similarity_search_by_vector(list(query), k=10)}
+            found = {d.page_content for d in approximate.similarity_search_by_vector(list(query), k=10)}
+            recall.append(len(truth & found) / 10)
+        self.assertGreaterEqual(np.mean(recall), 0.9)
+
+        # The index is reloaded from disk
+        approximate.close()
+        reopened = LocalVectorStore(self.path, FixedEmbeddings(vectors), ivf_min_vectors=500)
+        self.assertEqual(len(reopened.centroids), int(np.sqrt(2000)))
+        self.assertEqual(reopened.similarity_search("5", k=1)[0].page_content, "5")
+        exact.close()
+        reopened.close()
+
+class TestSaveToLocalStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, 'ingest', 'base')
+        source = build_synthetic_repo(os.path.join(self.temp_dir, 'source', 'repo'), num_files=3,
+                                      num_classes=1, methods_per_class=1, depth=1)
+        self.url = build_bare_remote(source, os.path.join(self.temp_dir, 'remote', 'repo.git'))
+        ingest_git_repo(self.url, self.base_path, snapshot='git')
+        self.target = 'local://' + os.path.join(self.temp_dir, 'vectors')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def save(self, state_name):
+        state = CheckpointStore(os.path.join(self.temp_dir, state_name))
+        try:
+            return save_to_db(self.url, self.target, self.base_path, workers=1, cache_path=None,
+                              embedding_backend='hashing', state=state)
+        finally:
+            state.close()
+
+    def test_save_to_db_writes_offline(self):
+        self.assertEqual(self.save('a.sqlite3')['chunks'], 9)
+        # A fresh checkpoint reingests the commit, but every chunk is already stored
+        summary = self.save('b.sqlite3')
+        self.assertEqual((summary['chunks'], summary['existing']), (0, 9))
+        store = open_vector_store(self.target, HashingEncoder(), read_only=True)
+        self.assertEqual(len(store), 9)
+        store.close()
+
+if __name__ == "__main__":
+    unittest.main()
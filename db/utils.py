@@ -1,8 +1,16 @@
 import os
 import random
-from langchain.vectorstores import DeepLake
-from langchain.embeddings import HuggingFaceEmbeddings
-from chunks import process_python_file
+from .batching import BatchWriter, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_BYTES, stored_ids
+from .parallel import ParallelChunker
+from .cache import ChunkCache, DEFAULT_CACHE_PATH
+from .chunkers import registered_suffixes
+from .embeddings import get_embedding_service, DEFAULT_MODEL_NAME
+from .connectors import get_blob_ids
+from .fetch import open_repo
+from .incremental import remove_changed_vectors, remove_file_vectors
+from .pipeline import iter_repo_file_results
+from .state import CheckpointStore, FileProgress
+from .vectorstore import open_vector_store
 from dotenv import load_dotenv
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -10,76 +18,143 @@ load_dotenv(dotenv_path)
 active_loop_token = os.environ.get('ACTIVELOOP_TOKEN')
 random.seed()
 
-LAST_COMMIT_FILE_PATH = os.path.join(os.path.dirname(__file__), 'last_processed_commit.txt')
-
-def get_last_processed_commit():
-    if not os.path.exists(LAST_COMMIT_FILE_PATH):
-        with open(LAST_COMMIT_FILE_PATH, 'w') as file:
-            file.write("")
-        return None
-
-    with open(LAST_COMMIT_FILE_PATH, 'r') as file:
-        return file.read().strip() or None
-
-def save_last_processed_commit(commit_id):
-    with open(LAST_COMMIT_FILE_PATH, 'w') as file:
-        file.write(commit_id)
-
-def save_to_db(repo_url, target_path, base_path, sample=False, commit_id=None):
-    repo_name = repo_url.rstrip('/').split('/')[-1].replace('.git', '')
-    repo_path = os.path.join(os.path.dirname(os.path.abspath(base_path)), 'raw_data', 'git', repo_name)
-
-    last_commit = get_last_processed_commit()
+def save_to_db(repo_url, target_path, base_path, sample=False, commit_id=None,
+               batch_size=DEFAULT_BATCH_SIZE, batch_bytes=DEFAULT_BATCH_BYTES, workers=None,
+               cache_path=DEFAULT_CACHE_PATH, changes=None, embedding_backend="huggingface", vectorstore=None,
+               state=None, ref=None, executor=None, suffixes=None, token=None, repo_path=None):
+    """
+    Chunks and embeds the repository's files into a vector store: every file with one of
+    `suffixes`, by default every file type a chunker is registered for (see db.chunkers). If `changes` (a ChangeSet
+    from db.incremental.diff_commits) is given, only its added/modified/renamed files are indexed
+    and the vectors of deleted, modified and renamed-away files are removed first.
+
+    `sample=True` indexes one random file of a full run as a preview and leaves the checkpoint
+    alone; it is ignored for incremental runs.
+
+    `target_path` is a DeepLake dataset path or a "local://<directory>" path for an offline
+    LocalVectorStore (see db.vectorstore.open_vector_store). `vectorstore` is an optional
+    factory called as vectorstore(target_path, embedding_function) to open any other store, and `embedding_backend` selects the encoder
+    (see db.embeddings.BACKENDS).
+
+    Progress is checkpointed per repository and `ref` in `state` (a db.state.CheckpointStore,
+    the default store if omitted): each file is recorded once all of its chunks are written, and
+    the commit is marked processed only when every batch succeeded. Rerunning an interrupted
+    commit skips the files it already wrote. Chunks are written under their chunk IDs, and
+    chunks whose ID is already stored (an unchanged chunk of an unchanged file) are skipped, so
+    reingesting a commit does not duplicate vectors. `executor` is a process pool shared with other
+    concurrent runs; pass its worker count as `workers`. `token` authenticates the blob reads of a
+    partial clone of a private repository (see db.fetch.open_repo). `repo_path` is the clone to
+    read, by default the one ingest_git_repo makes for `repo_url`. Returns a summary dict of the run.
+    """
+    if repo_path is None:
+        repo_name = repo_url.rstrip('/').split('/')[-1].replace('.git', '')
+        repo_path = os.path.join(os.path.dirname(os.path.abspath(base_path)), 'raw_data', 'git', repo_name)
+
+    # Files are read from the commit's git objects, so no snapshot has to be written to disk
+    repo = open_repo(repo_path, token)
+    commit_id = commit_id or repo.head.commit.hexsha
+    state = state if state is not None else CheckpointStore()
+
+    last_commit = state.get_commit(repo_url, ref)
     if last_commit == commit_id:
         print("No new commits found. Exiting...")
-        return
-
-    allowed_extensions = ['.py']
-
-    all_files = []
-    for dirpath, _, filenames in os.walk(repo_path):
-        for file in filenames:
-            if os.path.splitext(file)[1] in allowed_extensions:
-                all_files.append(os.path.join(dirpath, file))
-
-    print("All files being considered:", all_files)
-    print(f"Total .py files found: {len(all_files)}")
-
-    files_to_process = random.sample(all_files, 1) if sample else all_files
-
-    db = DeepLake(dataset_path=target_path, token=active_loop_token,
-                  embedding_function=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
-
-    total_py_files_processed = 0
-    chunks_saved = 0  # Counter for the number of chunks saved
-    all_documents = []
-
-    for file in files_to_process:
-        try:
-            documents = process_python_file(file, repo=repo_path, commit_id=commit_id)
-            for doc in documents:
-                file_type = "Valid" if 'page_content' in doc and 'metadata' in doc else "Invalid"
-                print(f"File Type: {file_type}")
-                print("Sample Document:", doc)
-            all_documents.extend(documents)
-        except Exception as e:
-            print(f"Error processing file {file}: {e}")
-
-        total_py_files_processed += 1
-
-        if all_documents:
-            for document in all_documents:
-                try:
-                    page_content = document.get('page_content', '')
-                    metadata = document.get('metadata', {})
-                    if page_content:
-                        db.add_texts([page_content], metadatas=[metadata])
-                        print("Added document to DeepLake:", metadata['name'])
-                        chunks_saved += 1  # Increment the counter when chunk is saved
-                except Exception as e:
-                    print("Error adding document to DeepLake:", e)
-
-    print(f"Saved {chunks_saved} chunks from {total_py_files_processed} files from {repo_url} to DeepLake dataset at {target_path}")
-
-    # Update the last processed commit ID after successfully processing the files.
-    save_last_processed_commit(commit_id)
+        return {"repo_url": repo_url, "commit_id": commit_id, "skipped": True}
+
+    allowed_extensions = tuple(suffixes or registered_suffixes())
+
+    if changes is not None:
+        all_files = changes.to_index()
+        print(f"Incremental run: {changes.summary()}")
+    else:
+        all_files = get_blob_ids(repo, commit_id, suffixes=allowed_extensions)
+
+    print(f"Total {', '.join(allowed_extensions)} files found: {len(all_files)}")
+
+    if sample and changes is not None:
+        # Sampling an incremental run would drop the vectors of every changed file but one
+        print("Sampling is not supported for incremental runs; indexing every changed file")
+        sample = False
+    files_to_process = random.sample(list(all_files), 1) if sample and all_files else list(all_files)
+
+    # Files an interrupted run of this commit already wrote completely are skipped. A sampled
+    # run is only a preview and never touches the checkpoint
+    written = state.begin(repo_url, ref, commit_id) if not sample else {}
+    resumed = {path for path in files_to_process if path in written and written[path] == all_files[path]}
+    if resumed:
+        files_to_process = [path for path in files_to_process if path not in resumed]
+        print(f"Resuming commit {commit_id}: {len(resumed)} files already written, {len(files_to_process)} left")
+
+    # The model is loaded once per process and vectors are memoized in the same cache file
+    embedding_service = get_embedding_service(DEFAULT_MODEL_NAME, backend=embedding_backend, cache_path=cache_path)
+    vector_stats_before = embedding_service.stats()
+    cache = ChunkCache(cache_path) if cache_path else None
+    if vectorstore is not None:
+        db = vectorstore(target_path, embedding_service)
+    else:
+        db = open_vector_store(target_path, embedding_service, token=active_loop_token)
+
+    if changes is not None:
+        removed = remove_changed_vectors(db, repo_path, changes)
+        print(f"Removed vectors of {removed} deleted, modified or renamed files")
+    if resumed:
+        # The interrupted run may have written part of a remaining file's chunks
+        for path in files_to_process:
+            remove_file_vectors(db, os.path.join(repo.working_tree_dir, path), all_files[path])
+
+    # Read after the removals above, so only chunks that are still stored are skipped
+    existing_ids = stored_ids(db)
+
+    # Documents stream from git objects through the chunker into the batch writer; blob IDs key
+    # the chunk cache, so cached blobs are never read or parsed
+    chunker = ParallelChunker(workers=workers, cache=cache, executor=executor)
+    progress = FileProgress(state if not sample else None, repo_url, ref, commit_id)
+    results = iter_repo_file_results(repo_path, commit_id, paths=files_to_process, chunker=chunker, token=token)
+
+    with BatchWriter(db, batch_size=batch_size, batch_bytes=batch_bytes, on_flush=progress.flushed,
+                     existing_ids=existing_ids) as writer:
+        for file_path, documents in results:
+            for document in documents:
+                if writer.add(document.get('page_content', ''), document.get('metadata', {})):
+                    progress.queued(file_path)
+            rel_path = os.path.relpath(file_path, repo.working_tree_dir).replace(os.sep, '/')
+            progress.finish(file_path, rel_path, all_files.get(rel_path))
+
+    for file, error in chunker.errors:
+        print(f"Error processing file {file}: {error}")
+    print(f"Saved {writer.chunks_saved} chunks in {len(writer.batches)} batches from {chunker.files_processed} files "
+          f"from {repo_url} to vector store at {target_path} ({writer.duplicates} duplicates and "
+          f"{writer.existing} already stored chunks skipped)")
+    if cache is not None:
+        stats = cache.stats()
+        # The embedding service is shared by the process, so report this run's share of its lookups
+        vector_stats = embedding_service.stats()
+        vector_hits = vector_stats.get('vector_hits', 0) - vector_stats_before.get('vector_hits', 0)
+        vector_misses = vector_stats.get('vector_misses', 0) - vector_stats_before.get('vector_misses', 0)
+        vector_ratio = vector_hits / (vector_hits + vector_misses) if vector_hits + vector_misses else 0.0
+        print(f"Chunk cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_ratio']:.0%} hit ratio); "
+              f"vectors: {vector_hits} hits, {vector_misses} misses ({vector_ratio:.0%} hit ratio)")
+        cache.close()
+
+    # Only a run whose batches were all written completes the commit; otherwise the next run
+    # resumes from the files recorded so far
+    if sample:
+        print(f"Sampled run: commit {commit_id} is not marked as processed")
+    elif writer.errors:
+        print(f"{len(writer.errors)} batches failed; commit {commit_id} stays pending and will be resumed")
+    else:
+        removed_paths = [path for path, _ in changes.to_remove() if path not in all_files] if changes is not None else []
+        state.complete(repo_url, ref, commit_id, removed_paths=removed_paths)
+
+    return {
+        "repo_url": repo_url,
+        "commit_id": commit_id,
+        "skipped": False,
+        "completed": not sample and not writer.errors,
+        "sampled": bool(sample),
+        "files": chunker.files_processed,
+        "resumed": len(resumed),
+        "chunks": writer.chunks_saved,
+        "existing": writer.existing,
+        "batches": len(writer.batches),
+        "errors": list(chunker.errors),
+    }
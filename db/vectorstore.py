@@ -0,0 +1,344 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import uuid
+import deeplake
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.vectorstores import DeepLake
+from langchain.vectorstores.base import VectorStore
+from .retrieval import mmr, normalize
+
+LOCAL_PREFIX = "local://"
+# Searches are exact up to this many vectors; beyond it an IVF index narrows them down
+IVF_MIN_VECTORS = 4096
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+# k-means is trained on at most this many vectors per list
+KMEANS_SAMPLE_PER_LIST = 256
+
+def open_vector_store(path, embedding_function, read_only=False, token=None):
+    """
+    Opens the vector store at `path`: a LocalVectorStore for "local://<directory>" paths,
+    otherwise a DeepLake dataset (hub://, s3://, mem:// or a directory).
+    """
+    if path.startswith(LOCAL_PREFIX):
+        return LocalVectorStore(path, embedding_function, read_only=read_only)
+    return DeepLake(dataset_path=path, token=token, embedding_function=embedding_function, read_only=read_only)
+
+def vector_store_exists(path, token=None):
+    if path.startswith(LOCAL_PREFIX):
+        return LocalVectorStore.exists(path)
+    return deeplake.exists(path, token=token)
+
+def assign_lists(vectors, centroids, batch_size=65536):
+    """
+    Returns the index of the closest centroid for every vector.
+    """
+    if not len(vectors):
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([np.argmax(vectors[i:i + batch_size] @ centroids.T, axis=1)
+                           for i in range(0, len(vectors), batch_size)])
+
+def train_ivf(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Spherical k-means over unit vectors. Returns `nlist` unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+    for _ in range(iterations):
+        assignments = assign_lists(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        sums = np.empty_like(centroids)
+        for i in range(nlist):
+            members = order[bounds[i]:bounds[i + 1]]
+            # An empty list is reseeded with a random vector
+            sums[i] = vectors[members].sum(axis=0) if len(members) else vectors[rng.integers(len(vectors))]
+        centroids = normalize(sums)
+    return centroids
+
+class LocalVectorStore(VectorStore):
+    """
+    A vector store that runs fully offline: float32 vectors live in a memory-mapped file and
+    documents, metadata and IDs in SQLite, all in one directory.
+
+    Vectors are normalized on insert, so cosine similarity is a dot product. Up to
+    `ivf_min_vectors` vectors every search is exact. Beyond that an IVF index (spherical
+    k-means over sqrt(n) lists, retrained whenever the store doubles) restricts each search to
+    the vectors of the `nprobe` lists closest to the query. Adding a document under an ID that
+    is already stored replaces it; deleted vectors are masked, not compacted.
+
+    Searches accept the DeepLake retriever options used in this repo (`fetch_k`,
+    `maximal_marginal_relevance`, `distance_metric="cos"`), so either store can back a retriever.
+    """
+    STORE_FILE = "store.sqlite3"
+    VECTORS_FILE = "vectors.f32"
+    CENTROIDS_FILE = "ivf.npy"
+
+    def __init__(self, path, embedding_function, read_only=False, nprobe=DEFAULT_NPROBE,
+                 ivf_min_vectors=IVF_MIN_VECTORS):
+        self.path = path[len(LOCAL_PREFIX):] if path.startswith(LOCAL_PREFIX) else path
+        self.embedding_function = embedding_function
+        self.read_only = read_only
+        self.nprobe = nprobe
+        self.ivf_min_vectors = ivf_min_vectors
+        self.lock = threading.RLock()
+        if read_only and not LocalVectorStore.exists(self.path):
+            raise ValueError(f"No local vector store at {self.path}")
+        os.makedirs(self.path, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(self.path, self.STORE_FILE), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (row INTEGER PRIMARY KEY, id TEXT NOT NULL, text TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, list INTEGER NOT NULL DEFAULT -1, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS docs_id ON docs (id) WHERE deleted = 0")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+        settings = dict(self.conn.execute("SELECT key, value FROM settings"))
+        self.dim = int(settings["dim"]) if "dim" in settings else None
+        self.trained_on = int(settings.get("trained_on", 0))
+        rows = np.array(self.conn.execute("SELECT row, list, deleted FROM docs ORDER BY row").fetchall(),
+                        dtype=np.int64).reshape(-1, 3)
+        self.count = int(rows[-1, 0]) + 1 if len(rows) else 0
+        self.lists = np.full(self.count, -1, dtype=np.int64)
+        self.alive = np.zeros(self.count, dtype=bool)
+        self.lists[rows[:, 0]] = rows[:, 1]
+        self.alive[rows[:, 0]] = rows[:, 2] == 0
+
+        centroids_path = os.path.join(self.path, self.CENTROIDS_FILE)
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        self._build_inverted_lists()
+        self.vectors = None
+        self._map_vectors()
+
+    @staticmethod
+    def exists(path):
+        path = path[len(LOCAL_PREFIX):] if path.startswith(LOCAL_PREFIX) else path
+        return os.path.exists(os.path.join(path, LocalVectorStore.STORE_FILE))
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def _map_vectors(self, capacity=None):
+        """
+        Memory-maps the vectors file, growing it to `capacity` rows first if given.
+        """
+        vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        if capacity is not None:
+            self.vectors = None
+            with open(vectors_path, "ab") as f:
+                f.truncate(capacity * self.dim * 4)
+        if self.dim is None or not os.path.exists(vectors_path) or not os.path.getsize(vectors_path):
+            return
+        self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r" if self.read_only else "r+")
+        self.vectors = self.vectors.reshape(-1, self.dim)
+
+    def _reserve(self, n):
+        capacity = len(self.vectors) if self.vectors is not None else 0
+        if self.count + n > capacity:
+            self._map_vectors(max(1024, 2 * capacity, self.count + n))
+
+    def _build_inverted_lists(self):
+        """
+        Groups rows by IVF list, so a search gathers its probed lists without scanning every row.
+        """
+        if self.centroids is None:
+            self.inverted = None
+            return
+        order = np.argsort(self.lists, kind="stable")
+        bounds = np.searchsorted(self.lists[order], np.arange(len(self.centroids) + 1))
+        self.inverted = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def _set(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _mark_deleted(self, rows):
+        rows = [int(row) for row in rows]
+        if rows:
+            self.conn.executemany("UPDATE docs SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+            self.alive[rows] = False
+        return len(rows)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """
+        Embeds and stores texts, replacing documents already stored under the same IDs.
+        Returns the IDs, generating random ones if none are given.
+        """
+        if self.read_only:
+            raise ValueError(f"Local vector store at {self.path} is read-only")
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{}] * len(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = normalize(self.embedding_function.embed_documents(texts))
+
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set("dim", self.dim)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+            self._reserve(len(texts))
+            start = self.count
+            self.vectors[start:start + len(texts)] = vectors
+            self.vectors.flush()
+            lists = assign_lists(vectors, self.centroids) if self.centroids is not None else np.full(len(texts), -1)
+
+            self.lists = np.concatenate([self.lists, lists])
+            self.alive = np.concatenate([self.alive, np.ones(len(texts), dtype=bool)])
+            if self.inverted is not None:
+                for i in np.unique(lists):
+                    self.inverted[i] = np.concatenate([self.inverted[i], start + np.flatnonzero(lists == i)])
+            for i, doc_id in enumerate(ids):
+                self._mark_deleted(row for (row,) in self.conn.execute(
+                    "SELECT row FROM docs WHERE id = ? AND deleted = 0", (doc_id,)))
+                self.conn.execute("INSERT INTO docs (row, id, text, metadata, list) VALUES (?, ?, ?, ?, ?)",
+                                  (start + i, doc_id, texts[i], json.dumps(metadatas[i]), int(lists[i])))
+            self.count += len(texts)
+            self._maybe_train()
+            self.conn.commit()
+        return ids
+
+    def delete(self, ids=None, filter=None, delete_all=None, **kwargs):
+        """
+        Deletes documents by ID, by metadata filter ({"metadata": {key: value}}, as for
+        DeepLake) or all of them.
+        """
+        with self.lock:
+            if delete_all:
+                self._mark_deleted(np.flatnonzero(self.alive))
+            for doc_id in ids or ():
+                self._mark_deleted(row for (row,) in self.conn.execute(
+                    "SELECT row FROM docs WHERE id = ? AND deleted = 0", (doc_id,)))
+            wanted = (filter or {}).get("metadata", {})
+            if wanted:
+                clauses = " AND ".join("json_extract(metadata, ?) = ?" for _ in wanted)
+                params = [value for key, match in wanted.items() for value in (f'$."{key}"', match)]
+                self._mark_deleted(row for (row,) in self.conn.execute(
+                    f"SELECT row FROM docs WHERE deleted = 0 AND {clauses}", params))
+            self.conn.commit()
+        return True
+
+    def stored_ids(self):
+        with self.lock:
+            return {doc_id for (doc_id,) in self.conn.execute("SELECT id FROM docs WHERE deleted = 0")}
+
+    def _maybe_train(self):
+        alive = len(self)
+        if alive < self.ivf_min_vectors or (self.centroids is not None and alive < 2 * self.trained_on):
+            return
+        rows = np.flatnonzero(self.alive)
+        nlist = max(1, int(math.sqrt(alive)))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, min(len(rows), nlist * KMEANS_SAMPLE_PER_LIST), replace=False))
+        self.centroids = train_ivf(np.asarray(self.vectors[sample]), nlist)
+        batch_size = 65536
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            self.lists[batch] = assign_lists(np.asarray(self.vectors[batch]), self.centroids)
+        self.lists[~self.alive] = -1
+        self._build_inverted_lists()
+        self.conn.executemany("UPDATE docs SET list = ? WHERE row = ?",
+                              ((int(self.lists[row]), int(row)) for row in rows))
+        centroids_path = os.path.join(self.path, self.CENTROIDS_FILE)
+        np.save(centroids_path + ".tmp.npy", self.centroids)
+        os.replace(centroids_path + ".tmp.npy", centroids_path)
+        self.trained_on = alive
+        self._set("trained_on", alive)
+
+    def _search(self, embedding, k):
+        """
+        Returns the rows of the `k` stored vectors most similar to `embedding` and their cosine
+        similarities, best first.
+        """
+        query = normalize(embedding)[0]
+        with self.lock:
+            if self.vectors is None or k <= 0 or not self.alive.any():
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            if self.centroids is not None and len(self) >= self.ivf_min_vectors:
+                probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+                rows = np.concatenate([self.inverted[probe] for probe in probes])
+                rows = rows[self.alive[rows]]
+                scores = self.vectors[rows] @ query
+            else:
+                rows = np.arange(self.count)
+                scores = self.vectors[:self.count] @ query
+                scores[~self.alive] = -np.inf
+            k = min(k, int(np.isfinite(scores).sum()))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")][:k]
+            return rows[top], scores[top]
+
+    def _documents(self, rows):
+        rows = [int(row) for row in rows]
+        if not rows:
+            return []
+        with self.lock:
+            found = {row: (text, metadata) for row, text, metadata in self.conn.execute(
+                f"SELECT row, text, metadata FROM docs WHERE row IN ({', '.join('?' * len(rows))})", rows)}
+        return [Document(page_content=found[row][0], metadata=json.loads(found[row][1])) for row in rows]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        rows, scores = self._search(embedding, k)
+        return list(zip(self._documents(rows), (float(score) for score in scores)))
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        """
+        Returns (document, cosine similarity) pairs, most similar first.
+        """
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k)
+
+    def _similarity_search_with_relevance_scores(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score(query, k)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        if kwargs.get("distance_metric", "cos") != "cos":
+            raise ValueError("LocalVectorStore only supports the cosine distance metric")
+        if kwargs.get("maximal_marginal_relevance"):
+            return self.max_marginal_relevance_search_by_vector(
+                embedding, k=k, fetch_k=kwargs.get("fetch_k", 20), lambda_mult=kwargs.get("lambda_mult", 0.5))
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k=k, **kwargs)
+
+    def similarity_search_with_vectors(self, embedding, k=4):
+        """
+        Returns the `k` documents most similar to `embedding` and their stored (unit) vectors as
+        a matrix, for reranking (see db.retrieval).
+        """
+        rows, _ = self._search(embedding, k)
+        with self.lock:
+            vectors = np.asarray(self.vectors[rows]) if len(rows) else np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._documents(rows), vectors
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5, **kwargs):
+        documents, vectors = self.similarity_search_with_vectors(embedding, max(k, fetch_k))
+        return [documents[i] for i in mmr(embedding, vectors, k=k, lambda_mult=lambda_mult)]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, path=None, ids=None, **kwargs):
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def close(self):
+        with self.lock:
+            self.vectors = None
+            self.conn.close()
@@ -1,6 +1,6 @@
 import streamlit as st
 import os
-import time
+import uuid
 from utils import Embedder, send_email
 import json
 
@@ -18,10 +18,17 @@ os.environ['DEEPLAKE_PATH'] = deeplake_path
 os.environ['JSON_PATH'] = json_path
 os.environ['HUGGINGFACE_TOKEN'] = huggingface_token
 
-embedder = Embedder()
+@st.cache_resource
+def get_embedder():
+    # Streamlit reruns this script on every message; the model, store and chain are built once per process
+    return Embedder()
+
+embedder = get_embedder()
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Display chat messages from history on app rerun
 for message in st.session_state.messages:
@@ -36,38 +43,15 @@ if prompt := st.chat_input("Type your question here."):
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Get assistant response
-    response = embedder.retrieve_results(prompt)
-
-    # Debugging: Print the type of the response
-    st.write(f"Type of response: {type(response)}")
-
-    if isinstance(response, str):
-        response_content = response
-    elif isinstance(response, dict) and "content" in response:
-        response_content = response["content"]
-    else:
-        response_content = ""
-
-    # Check for function calls within the response
-    if isinstance(response, dict) and "function_call" in response:
-        function_name = response["function_call"]["name"]
-        if function_name == "send_email":
-            chat_log = "\n".join([message["content"] for message in st.session_state.messages])
-            arguments = response["function_call"].get("arguments", {})
-            to_address = arguments.get("to_address", "enjiao.chen@nationalgallery.sg")
-            send_email(chat_log, to_address)
-            response_content = "Email sent successfully!"
-
-    # Display assistant's response with streaming effect
+    # Render the assistant's response token by token as the LLM generates it
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
         full_response = ""
-        for chunk in response_content.split():
-            full_response += chunk + " "
-            time.sleep(0.1)  # Adjust this value to make the delay longer or shorter
+        for token in embedder.stream_results(prompt, session_id=st.session_state.session_id):
+            full_response += token
             message_placeholder.markdown(full_response + "▌")
         message_placeholder.markdown(full_response)
+    response_content = full_response
 
     # Add assistant response to chat history
     st.session_state.messages.append({"role": "assistant", "content": response_content})
@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from collections import deque
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+
+DEFAULT_SESSION = "default"
+# Question/answer turns kept per session for condensing follow-up questions
+DEFAULT_HISTORY_SIZE = 2
+STAGES = ("condense", "retrieve", "generate")
+_DONE = object()
+
+def format_history(turns):
+    """
+    Renders (question, answer) turns the way ConversationalRetrievalChain does.
+    """
+    return "".join(f"\nHuman: {question}\nAssistant: {answer}" for question, answer in turns)
+
+class QueryEngine:
+    """
+    Answers questions over a retriever with one ConversationalRetrievalChain built up front, so
+    a message costs only the condense, retrieve and generate calls. Each session keeps its last
+    `history_size` turns in a deque, and every query records how long each stage took.
+    """
+    def __init__(self, retriever, llm, condense_llm=None, qa_prompt=None,
+                 condense_prompt=CONDENSE_QUESTION_PROMPT, history_size=DEFAULT_HISTORY_SIZE):
+        self.retriever = retriever
+        self.llm = llm
+        self.history_size = history_size
+        combine_docs_chain_kwargs = {"prompt": qa_prompt} if qa_prompt is not None else None
+        self.chain = ConversationalRetrievalChain.from_llm(
+            llm, retriever, condense_question_prompt=condense_prompt, chain_type="stuff",
+            condense_question_llm=condense_llm, combine_docs_chain_kwargs=combine_docs_chain_kwargs)
+        self.histories = {}
+        self.lock = threading.Lock()
+
+    def history(self, session_id=DEFAULT_SESSION):
+        """
+        Returns the bounded deque of (question, answer) turns for a session.
+        """
+        with self.lock:
+            if session_id not in self.histories:
+                self.histories[session_id] = deque(maxlen=self.history_size)
+            return self.histories[session_id]
+
+    def reset(self, session_id=DEFAULT_SESSION):
+        with self.lock:
+            self.histories.pop(session_id, None)
+
+    def _retrieve(self, question, chat_history, callbacks):
+        """
+        Runs the condense and retrieve stages. Returns the standalone question, the documents and
+        the stage timings so far.
+        """
+        timings = dict.fromkeys(STAGES, 0.0)
+        standalone = question
+        if chat_history:
+            # A follow-up is rewritten into a standalone question; the first one needs no LLM call
+            start = time.perf_counter()
+            standalone = self.chain.question_generator.run(question=question, chat_history=chat_history,
+                                                           callbacks=callbacks)
+            timings["condense"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        documents = self.retriever.get_relevant_documents(standalone, callbacks=callbacks)
+        timings["retrieve"] = time.perf_counter() - start
+        return standalone, documents, timings
+
+    def _generate(self, documents, standalone, chat_history, callbacks):
+        return self.chain.combine_docs_chain.run(input_documents=documents, question=standalone,
+                                                 chat_history=chat_history, callbacks=callbacks)
+
+    def query(self, question, session_id=DEFAULT_SESSION, callbacks=None):
+        """
+        Answers `question` in the context of the session's history and records the turn.
+        Returns a dict with the answer, the standalone question used for retrieval, the source
+        documents and the seconds spent in each stage.
+        """
+        history = self.history(session_id)
+        chat_history = format_history(list(history))
+        standalone, documents, timings = self._retrieve(question, chat_history, callbacks)
+
+        start = time.perf_counter()
+        answer = self._generate(documents, standalone, chat_history, callbacks)
+        timings["generate"] = time.perf_counter() - start
+
+        history.append((question, answer))
+        return {"answer": answer, "generated_question": standalone, "source_documents": documents,
+                "timings": timings}
+
+    def stream(self, question, session_id=DEFAULT_SESSION, callbacks=None):
+        """
+        Like query, but returns an AnswerStream that yields the answer's tokens as the LLM
+        produces them. The turn is recorded once the stream is exhausted.
+        """
+        return AnswerStream(self, question, session_id, callbacks)
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """
+    Forwards the tokens of a streaming LLM to a queue.
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.tokens.put(token)
+
+class AnswerStream:
+    """
+    Iterates over the tokens of one answer. Condense and retrieve run when iteration starts, and
+    generation runs in a worker thread that feeds tokens through a queue, so the first token is
+    rendered while the rest are still being generated. After iteration, `answer`,
+    `generated_question`, `source_documents` and `timings` (with "first_token", the seconds from
+    the start of the query to the first token) hold the same results as QueryEngine.query.
+    """
+    def __init__(self, engine, question, session_id, callbacks=None):
+        self.engine = engine
+        self.question = question
+        self.session_id = session_id
+        self.callbacks = callbacks
+        self.answer = None
+        self.generated_question = None
+        self.source_documents = None
+        self.timings = None
+
+    def __iter__(self):
+        started = time.perf_counter()
+        history = self.engine.history(self.session_id)
+        chat_history = format_history(list(history))
+        standalone, documents, timings = self.engine._retrieve(self.question, chat_history, self.callbacks)
+        self.generated_question, self.source_documents = standalone, documents
+
+        tokens = queue.Queue()
+        outcome = {}
+        callbacks = [TokenQueueHandler(tokens)] + list(self.callbacks or [])
+
+        def generate():
+            try:
+                outcome["answer"] = self.engine._generate(documents, standalone, chat_history, callbacks)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                tokens.put(_DONE)
+
+        start = time.perf_counter()
+        worker = threading.Thread(target=generate, daemon=True)
+        worker.start()
+        streamed = False
+        while (token := tokens.get()) is not _DONE:
+            if not streamed:
+                timings["first_token"] = time.perf_counter() - started
+                streamed = True
+            yield token
+        worker.join()
+        if "error" in outcome:
+            raise outcome["error"]
+        timings["generate"] = time.perf_counter() - start
+        self.answer = outcome["answer"]
+        if not streamed:
+            # LLMs without token callbacks produce the answer in one piece
+            timings["first_token"] = time.perf_counter() - started
+            yield self.answer
+        self.timings = timings
+        history.append((self.question, self.answer))
@@ -0,0 +1,52 @@
+import json
+from db.chunkers import JSON_MAX_CHARS, extract_json_chunks
+from db.chunks import chunk_id
+
+# Top-level sections of an ARM/ADF template that are indexed; "resources" is indexed per resource
+TEMPLATE_SECTIONS = ("parameters", "variables", "resources")
+
+def _section_documents(value, json_path, label, source, max_chars):
+    """
+    Yields the documents for one section value: the value itself if its JSON is at most
+    `max_chars` characters, otherwise the chunks db.chunkers.extract_json_chunks splits it into,
+    each headed by `label` and its JSON path so it keeps its context.
+    """
+    text = json.dumps(value)
+    if len(text) <= max_chars:
+        chunks = [{"qualified_name": "$", "code": text}]
+    else:
+        chunks = extract_json_chunks(json.dumps(value, indent=1), max_chars=max_chars)
+    for chunk in chunks:
+        path = json_path + chunk["qualified_name"][1:]
+        content = chunk["code"] if len(chunks) == 1 else f"{label} {path}\n{chunk['code']}"
+        yield {
+            "page_content": content,
+            "metadata": {"uuid": chunk_id(source, path, content), "source": source, "path": path},
+        }
+
+def iter_template_documents(file_path, max_chars=JSON_MAX_CHARS):
+    """
+    Reads an ARM/ADF template with a single json.load and yields one document per section
+    ("parameters", "variables") and per entry of "resources", as dicts with "page_content" and
+    "metadata" (see db.batching.BatchWriter.add_documents). Values over `max_chars` characters
+    are split by JSON path. Missing sections are skipped.
+
+    Sections are taken out of the parsed template as they are consumed, and resources are
+    released one by one, so peak memory stays close to that of the parsed file.
+    """
+    with open(file_path, encoding="utf-8") as f:
+        template = json.load(f)
+    for section in TEMPLATE_SECTIONS:
+        value = template.pop(section, None)
+        if value is None:
+            continue
+        if section != "resources":
+            yield from _section_documents(value, f"$.{section}", section, file_path, max_chars)
+            continue
+        value.reverse()
+        index = 0
+        while value:
+            resource = value.pop()
+            label = resource.get("name", f"resource {index}") if isinstance(resource, dict) else f"resource {index}"
+            yield from _section_documents(resource, f"$.resources[{index}]", label, file_path, max_chars)
+            index += 1
@@ -1,6 +1,13 @@
 import json
+import threading
 import pytest
+from typing import Any, List
+from langchain.docstore.document import Document
 from langchain.document_loaders import JSONLoader
+from langchain.llms.base import LLM
+from langchain.schema import BaseRetriever
+from engine import QueryEngine
+from loader import iter_template_documents
 
 # Path to your JSON file
 file_path = '../../../raw_data/arm_template/ARMTemplateForFactory.json'
@@ -27,3 +34,145 @@ def test_jsonloader():
     with open(file_path) as f:
         json_data = json.load(f)
         assert len(data_resources) == len(json_data["resources"])
+
+
+TEMPLATE = {
+    "$schema": "http://schema.management.azure.com/schemas/2015-01-01/deploymentTemplate.json#",
+    "parameters": {"factoryName": {"type": "string"}},
+    "variables": {"factoryId": "[concat('Microsoft.DataFactory/factories/', parameters('factoryName'))]"},
+    "resources": [
+        {"name": "[concat(parameters('factoryName'), '/daily_email')]", "type": "Microsoft.DataFactory/factories/pipelines",
+         "properties": {"activities": [{"name": "send_email", "type": "WebActivity"}]}},
+        {"name": "[concat(parameters('factoryName'), '/big_copy')]", "type": "Microsoft.DataFactory/factories/pipelines",
+         "properties": {"activities": [{"name": f"copy_{i}", "type": "Copy", "inputs": ["x" * 40]} for i in range(20)]}},
+    ],
+}
+
+def test_template_loader_reads_every_section(tmp_path):
+    file_path = tmp_path / "template.json"
+    file_path.write_text(json.dumps(TEMPLATE))
+    documents = list(iter_template_documents(str(file_path), max_chars=500))
+    paths = [document["metadata"]["path"] for document in documents]
+
+    assert paths[:3] == ["$.parameters", "$.variables", "$.resources[0]"]
+    assert json.loads(documents[0]["page_content"]) == TEMPLATE["parameters"]
+    assert json.loads(documents[2]["page_content"]) == TEMPLATE["resources"][0]
+    # The oversized resource is split by JSON path, each chunk headed by the resource name
+    big = documents[3:]
+    assert big[0]["page_content"] == "[concat(parameters('factoryName'), '/big_copy')] $.resources[1]\n" \
+                                     "$: object with keys name, type, properties"
+    assert "$.resources[1].properties.activities[19]" in paths
+    assert all(len(document["page_content"]) <= 500 + 100 for document in big)
+    assert len({document["metadata"]["uuid"] for document in documents}) == len(documents)
+    assert [d["metadata"]["uuid"] for d in iter_template_documents(str(file_path), max_chars=500)] == \
+        [d["metadata"]["uuid"] for d in documents]
+
+def test_template_loader_skips_missing_sections(tmp_path):
+    file_path = tmp_path / "template.json"
+    file_path.write_text(json.dumps({"resources": TEMPLATE["resources"][:1]}))
+    documents = list(iter_template_documents(str(file_path)))
+    assert [document["metadata"]["path"] for document in documents] == ["$.resources[0]"]
+
+class RecordingLLM(LLM):
+    """Fake LLM that answers from a list and keeps every prompt it was given."""
+    responses: List[str]
+    prompts: List[str] = []
+
+    @property
+    def _llm_type(self):
+        return "recording"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(prompt)
+        return self.responses[(len(self.prompts) - 1) % len(self.responses)]
+
+class StaticRetriever(BaseRetriever):
+    documents: List[Any]
+    queries: List[str] = []
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        self.queries.append(query)
+        return self.documents
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        return self._get_relevant_documents(query)
+
+def test_query_engine_condenses_follow_ups():
+    llm = RecordingLLM(responses=["The pipeline runs daily.", "When does the daily pipeline send email?", "At 9am."])
+    retriever = StaticRetriever(documents=[Document(page_content='{"name": "daily_pipeline"}')])
+    engine = QueryEngine(retriever, llm, history_size=2)
+    chain = engine.chain
+
+    first = engine.query("How often does the pipeline run?", session_id="a")
+    assert first["answer"] == "The pipeline runs daily."
+    assert first["generated_question"] == "How often does the pipeline run?"
+    assert set(first["timings"]) == {"condense", "retrieve", "generate"}
+    assert first["timings"]["condense"] == 0.0
+    assert "daily_pipeline" in llm.prompts[0]
+
+    second = engine.query("And the email?", session_id="a")
+    assert second["answer"] == "At 9am."
+    assert retriever.queries == ["How often does the pipeline run?", "When does the daily pipeline send email?"]
+    assert "Human: How often does the pipeline run?" in llm.prompts[1]
+    assert all(seconds >= 0 for seconds in second["timings"].values())
+    # The chain is built once, not per query
+    assert engine.chain is chain
+
+def test_query_engine_history_is_bounded_per_session():
+    llm = RecordingLLM(responses=["answer"])
+    engine = QueryEngine(StaticRetriever(documents=[]), llm, history_size=2)
+    for i in range(3):
+        engine.query(f"question {i}", session_id="a")
+    engine.query("other", session_id="b")
+
+    assert list(engine.history("a")) == [("question 1", "answer"), ("question 2", "answer")]
+    assert list(engine.history("b")) == [("other", "answer")]
+    engine.reset("a")
+    assert list(engine.history("a")) == []
+
+class StreamingLLM(LLM):
+    """Fake streaming LLM: emits the answer word by word, waiting on `release` after the first."""
+    answer: str
+    release: Any = None
+
+    @property
+    def _llm_type(self):
+        return "streaming"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        words = self.answer.split(" ")
+        for i, word in enumerate(words):
+            if run_manager:
+                run_manager.on_llm_new_token(word if i == 0 else " " + word)
+            if i == 0 and self.release is not None:
+                assert self.release.wait(5)
+        return self.answer
+
+def test_stream_yields_tokens_before_generation_finishes():
+    release = threading.Event()
+    engine = QueryEngine(StaticRetriever(documents=[]), StreamingLLM(answer="It runs at 9am.", release=release))
+    stream = engine.stream("When does it run?", session_id="a")
+    tokens = iter(stream)
+
+    # The first token arrives while the LLM is still blocked mid-answer
+    assert next(tokens) == "It"
+    assert stream.answer is None
+    release.set()
+    assert "It" + "".join(tokens) == "It runs at 9am."
+    assert stream.answer == "It runs at 9am."
+    assert 0 <= stream.timings["first_token"] <= sum(stream.timings[s] for s in ("condense", "retrieve", "generate"))
+    assert list(engine.history("a")) == [("When does it run?", "It runs at 9am.")]
+
+def test_stream_falls_back_to_whole_answers():
+    engine = QueryEngine(StaticRetriever(documents=[]), RecordingLLM(responses=["Daily."]))
+    assert list(engine.stream("How often?")) == ["Daily."]
+
+def test_stream_raises_generation_errors():
+    class FailingLLM(StreamingLLM):
+        def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+            raise RuntimeError("rate limited")
+
+    engine = QueryEngine(StaticRetriever(documents=[]), FailingLLM(answer=""))
+    with pytest.raises(RuntimeError, match="rate limited"):
+        list(engine.stream("How often?", session_id="a"))
+    assert list(engine.history("a")) == []
@@ -1,17 +1,10 @@
-from langchain.document_loaders import JSONLoader
 from pprint import pprint
 import json
 import os
-import deeplake
 import logging
-from queue import Queue
-from langchain.document_loaders import JSONLoader
 from langchain.text_splitter import CharacterTextSplitter
 from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import DeepLake
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.chat_models import ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
 import smtplib
 from email.message import EmailMessage
 from dotenv import load_dotenv
@@ -25,6 +18,16 @@ dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
 load_dotenv(dotenv_path)
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+from db.batching import DEFAULT_BATCH_SIZE, BatchWriter
+from db.embeddings import get_embedding_service
+from db.retrieval import DEFAULT_FETCH_K, DEFAULT_K, DEFAULT_LAMBDA_MULT, MMRRetriever
+from db.vectorstore import open_vector_store, vector_store_exists
+from engine import DEFAULT_HISTORY_SIZE, DEFAULT_SESSION, QueryEngine
+from loader import iter_template_documents
+
+# The demo memoizes its vectors in its own cache, apart from the code ingestion cache
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'embedding_cache.sqlite3')
+
 def send_email(chat_log, to_address):
     """Send an email containing the chat log."""
     msg = EmailMessage()
@@ -39,11 +42,20 @@ def send_email(chat_log, to_address):
         server.send_message(msg)
 
 class Embedder:
-    def __init__(self) -> None:
-        self.deeplake_path = os.getenv("DEEPLAKE_PATH")  # Get the DEEPLAKE_PATH from the environment variables
-        self.hf = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2", model_kwargs={"device": "cpu"})
-        self.MyQueue = Queue(maxsize=2)
+    def __init__(self, k=DEFAULT_K, fetch_k=DEFAULT_FETCH_K, lambda_mult=DEFAULT_LAMBDA_MULT,
+                 history_size=DEFAULT_HISTORY_SIZE, llm=None) -> None:
+        # Get the DEEPLAKE_PATH from the environment variables; a local://<directory> path keeps the store offline
+        self.deeplake_path = os.getenv("DEEPLAKE_PATH")
+        # Shared, process-wide model; vectors are memoized in the db package's cache
+        self.hf = get_embedding_service("sentence-transformers/all-MiniLM-L6-v2", cache_path=EMBEDDING_CACHE_PATH, model_kwargs={"device": "cpu"})
+        # MMR over fetch_k candidates: lambda_mult 1.0 ranks by relevance only, lower values favour diversity
+        self.k = k
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
         self.load_db()
+        # One LLM client and chain for the lifetime of the Embedder, shared by every session
+        self.llm = llm or ChatOpenAI(temperature=0, model='gpt-3.5-turbo-16k', streaming=True, callbacks=[StreamingStdOutCallbackHandler()])
+        self.engine = QueryEngine(self.retriever, self.llm, history_size=history_size)
 
     def chunk_json_objects(self, json_data):
         json_objects = []
@@ -51,67 +63,40 @@ class Embedder:
             json_objects.append((json.dumps(obj), {})) # assuming you don't have specific metadata to add
         return json_objects
 
-    def embed_json_data(self, documents):
-        texts = [doc.page_content for doc in documents]
-        metadatas = [doc.metadata for doc in documents]  # if metadata exists, or use [{} for _ in documents]
-        db = DeepLake(dataset_path=self.deeplake_path, embedding=self.hf, read_only=False)
-        db.add_texts(texts, metadatas=metadatas)
+    def embed_json_data(self, documents, batch_size=DEFAULT_BATCH_SIZE):
+        # Documents are embedded and written a batch at a time as the loader yields them
+        db = open_vector_store(self.deeplake_path, self.hf)
+        with BatchWriter(db, batch_size=batch_size) as writer:
+            writer.add_documents(documents)
+        if writer.errors:
+            raise RuntimeError(f"{len(writer.errors)} batches failed to embed: {writer.errors[0]}")
+        print(f"Embedded {writer.chunks_saved} documents in {len(writer.batches)} batches.")
         return db
 
     def load_db(self):
-        exists = deeplake.exists(self.deeplake_path)
+        exists = vector_store_exists(self.deeplake_path)
         if exists:
-            self.db = DeepLake(
-                dataset_path=self.deeplake_path,
-                read_only=True,
-                embedding_function=self.hf,
-            )
+            self.db = open_vector_store(self.deeplake_path, self.hf, read_only=True)
         else:
             file_path = os.getenv("JSON_PATH")  # Get the JSON_PATH from the environment variables
 
-            try:
-                loader_parameters = JSONLoader(file_path, '.parameters', text_content=False)
-                data_parameters = loader_parameters.load()
-                print("Parameters loaded successfully.")
-            except Exception as e:
-                print(f"Error loading parameters: {e}")
-
-            try:
-                loader_variables = JSONLoader(file_path, '.variables', text_content=False)
-                data_variables = loader_variables.load()
-                print("Variables loaded successfully.")
-            except Exception as e:
-                print(f"Error loading variables: {e}")
-
-            try:
-                loader_resources = JSONLoader(file_path, '.resources[]', text_content=False)
-                data_resources = loader_resources.load()
-                print("Resources loaded successfully.")
-            except Exception as e:
-                print(f"Error loading resources: {e}")
-
-            # Process all data (parameters, variables, resources) together
-            all_data = data_parameters + data_variables + data_resources
-            self.db = self.embed_json_data(all_data)
-
-        self.retriever = self.db.as_retriever()
-        self.retriever.search_kwargs['distance_metric'] = 'cos'
-        self.retriever.search_kwargs['fetch_k'] = 2
-        self.retriever.search_kwargs['maximal_marginal_relevance'] = True
-        self.retriever.search_kwargs['k'] = 2
-
-    def retrieve_results(self, query):
+            # One pass over the template yields the parameters, variables and resources
+            self.db = self.embed_json_data(iter_template_documents(file_path))
+
+        self.retriever = MMRRetriever(store=self.db, embeddings=self.hf, k=self.k, fetch_k=self.fetch_k,
+                                      lambda_mult=self.lambda_mult)
+
+    def retrieve_results(self, query, session_id=DEFAULT_SESSION):
         print("Starting retrieve_results function...")
-        chat_history = list(self.MyQueue.queue)
+        chat_history = list(self.engine.history(session_id))
         print(f"Chat history: {chat_history}")
 
         # Wrap both the ConversationalRetrievalChain and ChatCompletion API calls with the callback context manager
         with get_openai_callback() as cb:
             # Step 1: Use ConversationalRetrievalChain for the initial response
-            qa = ConversationalRetrievalChain.from_llm(ChatOpenAI(temperature=0, model='gpt-3.5-turbo-16k', streaming=True, callbacks=[StreamingStdOutCallbackHandler()]), chain_type="stuff", retriever=self.retriever)
-            result = qa({"question": query, "chat_history": chat_history})
-            print(f"Initial result from ConversationalRetrievalChain: {result}")
-            self.add_to_queue((query, result["answer"]))
+            result = self.engine.query(query, session_id=session_id)
+            print(f"Initial result from ConversationalRetrievalChain: {result['answer']}")
+            print("Stage timings: " + ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in result["timings"].items()))
 
             # Check if a function call is present in the initial result
             if "function_call" not in result:
@@ -133,7 +118,9 @@ class Embedder:
                         }
                     }
                 ]
-                messages = [{"role": "user", "content": query}] + [{"role": role, "content": content} for role, content in chat_history]
+                messages = [{"role": role, "content": content} for question, answer in chat_history
+                            for role, content in (("user", question), ("assistant", answer))]
+                messages.append({"role": "user", "content": query})
                 response = ChatCompletion.create(
                     model="gpt-3.5-turbo",
                     messages=messages,
@@ -168,12 +155,14 @@ class Embedder:
 
         return response
 
-    def add_to_queue(self, chat):
-        if self.MyQueue.full():
-            self.MyQueue.get()
-        self.MyQueue.put(chat)
+    def stream_results(self, query, session_id=DEFAULT_SESSION):
+        """Yield the answer's tokens as the LLM produces them, for rendering incrementally."""
+        stream = self.engine.stream(query, session_id=session_id)
+        yield from stream
+        print("Stage timings: " + ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in stream.timings.items()))
 
 # Usage
-embedder = Embedder()
-# query = "How do I update the GHQ to the latest dataset?"
-# print(embedder.retrieve_results(query))
+if __name__ == "__main__":
+    embedder = Embedder()
+    # query = "How do I update the GHQ to the latest dataset?"
+    # print(embedder.retrieve_results(query))
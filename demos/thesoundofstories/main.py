@@ -2,17 +2,21 @@ import chainlit as cl
 from langchain.llms import OpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from langchain.memory import ConversationBufferMemory
 import os
 from dotenv import load_dotenv
-import aiohttp
 import re
-from diffusers import AutoPipelineForText2Image
-import torch
 from chainlit.input_widget import Select  # NEW: Import Select from chainlit.input_widget
+from chainlit.server import app
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 import json
 from datetime import datetime
 from PIL import Image
+from functools import lru_cache
+from models import LazyPipeline
+from sessions import StorySession
+from narration import narrate, stream_chain
+from tts import AudioStreams, CachedTTS, ElevenLabsClient, TTSError
 
 load_dotenv()
 
@@ -53,60 +57,81 @@ def construct_path_from_root(relative_path):
     project_root = get_project_root()
     return os.path.join(project_root, relative_path)
 
+@lru_cache(maxsize=None)
 def load_story_details():
     story_path = construct_path_from_root('raw_data/the_sound_of_stories/story.json')
     with open(story_path, 'r', encoding='utf-8') as file:
         story_data = json.load(file)
         return story_data
 
-def load_instructions():
+@lru_cache(maxsize=None)
+def load_all_instructions():
     instructions_path = construct_path_from_root('raw_data/instructions.json')
     with open(instructions_path, 'r', encoding='utf-8') as file:
-        all_instructions = json.load(file)
-        return all_instructions.get(current_language, all_instructions.get("en"))
-
-current_language = "en"  # Default language. This should be updated based on user selection.
-instructions = {}  # A dictionary to hold instructions based on the selected language
-story_data = load_story_details()  # Assuming this loads the entire JSON content
-# Initially defined at the global level
-story_progress = {
-    "current_checkpoint": 0
-}
-
-# Declare pipeline_text2image at the top level so it's accessible globally.
-global pipeline_text2image
-pipeline_text2image = None
-
-def initialize_pipeline():
-    global pipeline_text2image
-    if pipeline_text2image is None:  # Check if pipeline_text2image has not been initialized
-        # Automatically select device: MPS for Apple silicon, CUDA for NVIDIA GPUs, or CPU as a fallback
-        if torch.cuda.is_available():
-            device = "cuda"
-            print("CUDA is available. Using CUDA for processing.")
-            torch_dtype = torch.float16  # Use float16 for CUDA to utilize Tensor Cores on compatible GPUs
-        elif torch.backends.mps.is_available():
-            device = "mps"
-            print("MPS is available. Using MPS (Metal Performance Shaders) for Apple silicon.")
-            torch_dtype = torch.float32  # Use float16 for MPS (Apple silicon)
-        else:
-            device = "cpu"
-            print("CUDA and MPS not available. Falling back to CPU.")
-            torch_dtype = torch.float32  # Use float32 for CPU to avoid 'Half' precision issues
+        return json.load(file)
+
+def load_instructions(language):
+    all_instructions = load_all_instructions()
+    return all_instructions.get(language, all_instructions.get("en"))
+
+def get_session():
+    """
+    Returns the StorySession of the current chainlit session, creating it on first use.
+    """
+    session = cl.user_session.get("story")
+    if session is None:
+        session = StorySession(load_instructions)
+        cl.user_session.set("story", session)
+    return session
+
+def load_text2image_pipeline(progress):
+    """
+    Loads SDXL for LazyPipeline; torch and diffusers are imported here so that sessions which
+    never enable image generation do not pay for them.
+    """
+    progress(0.05, "Importing torch and diffusers")
+    import torch
+    from diffusers import AutoPipelineForText2Image
+
+    # Automatically select device: MPS for Apple silicon, CUDA for NVIDIA GPUs, or CPU as a fallback
+    if torch.cuda.is_available():
+        device = "cuda"
+        print("CUDA is available. Using CUDA for processing.")
+        torch_dtype = torch.float16  # Use float16 for CUDA to utilize Tensor Cores on compatible GPUs
+    elif torch.backends.mps.is_available():
+        device = "mps"
+        print("MPS is available. Using MPS (Metal Performance Shaders) for Apple silicon.")
+        torch_dtype = torch.float32  # Use float16 for MPS (Apple silicon)
+    else:
+        device = "cpu"
+        print("CUDA and MPS not available. Falling back to CPU.")
+        torch_dtype = torch.float32  # Use float32 for CPU to avoid 'Half' precision issues
+
+    # Instantiate the pipeline using the .from_pretrained() method
+    progress(0.2, "Loading stable-diffusion-xl-base-1.0 weights")
+    pipeline = AutoPipelineForText2Image.from_pretrained(
+        "stabilityai/stable-diffusion-xl-base-1.0",
+        torch_dtype=torch_dtype,
+        use_safetensors=True  # Use SafeTensors to reduce memory footprint
+    )
+    progress(0.8, f"Moving the pipeline to {device}")
+    pipeline = pipeline.to(device)
 
-        # Instantiate the pipeline using the .from_pretrained() method
-        pipeline_text2image = AutoPipelineForText2Image.from_pretrained(
-            "stabilityai/stable-diffusion-xl-base-1.0",
-            torch_dtype=torch_dtype,
-            use_safetensors=True  # Use SafeTensors to reduce memory footprint
-        ).to(device)
+    if device == "mps":
+        # Recommended if your computer has < 64 GB of RAM and using MPS
+        pipeline.enable_attention_slicing()
+    return pipeline
 
-        if device == "mps":
-            # Recommended if your computer has < 64 GB of RAM and using MPS
-            pipeline_text2image.enable_attention_slicing()
+def release_text2image_pipeline(pipeline):
+    import torch
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
 
-# Ensure initialize_pipeline is called before generate_and_display_cover_image
-initialize_pipeline()
+# SDXL is loaded in the background the first time a session turns image generation on,
+# and unloaded again once no session has used it for IMAGE_IDLE_TIMEOUT seconds
+IMAGE_IDLE_TIMEOUT = int(os.getenv("IMAGE_IDLE_TIMEOUT", 15 * 60))
+pipeline_text2image = LazyPipeline(load_text2image_pipeline, idle_timeout=IMAGE_IDLE_TIMEOUT,
+                                   on_unload=release_text2image_pipeline)
 
 def remove_emojis(text):
     print(f"Before emoji removal: {text}")
@@ -130,56 +155,93 @@ if not OPENAI_API_KEY:
     raise ValueError("OpenAI API key not found in the .env file!")
 os.environ['OPENAI_API_KEY'] = OPENAI_API_KEY
 
-user_data = {}
-# story_memory = ConversationBufferMemory(input_key='human_input', output_key='output')
-narrative_memory = ConversationBufferMemory(input_key='user_response', output_key='story_segment')
-story_started = False
-
-# Update the send_audio function to use ElevenLabs API
-async def send_audio(content):
-    cleaned_content = remove_emojis(content)
-    url = "https://api.elevenlabs.io/v1/text-to-speech/0M23V8kIecNGWiNzhRRn/stream"
-    querystring = {"optimize_streaming_latency": "1"}
-
-    model_id = "eleven_multilingual_v2"  # This model supports multiple languages, including Mandarin.
+# One pooled ElevenLabs client for the process; the browser streams each segment from /tts/<token>.
+# Narrations already synthesized (e.g. retried segments) come from the on-disk audio cache
+tts_client = ElevenLabsClient(os.getenv('ELEVENLABS_API_KEY'))
+tts = CachedTTS(tts_client)
+audio_streams = AudioStreams()
 
-    payload = {
-        "text": cleaned_content,
-        "model_id": model_id,
-    }
+async def stream_audio(token: str):
+    chunks = audio_streams.take(token)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired audio stream")
+    return StreamingResponse(chunks, media_type="audio/mpeg")
 
-    if user_data.get('language') == 'zh':
-        payload["language"] = "zh"
+def mount_audio_route(app):
+    """
+    Serves the opened audio streams at /tts/<token>. Routes are matched in order, and chainlit
+    may have registered its catch-all UI route ("/{path:path}") already, so this one goes first.
+    """
+    app.add_api_route("/tts/{token}", stream_audio, methods=["GET"])
+    app.router.routes.insert(0, app.router.routes.pop())
 
-    elevenlabs_api_key = os.getenv('ELEVENLABS_API_KEY')
-    if not elevenlabs_api_key:
-        raise ValueError("ELEVENLABS API key not found in the .env file!")
+mount_audio_route(app)
 
-    headers = {
-        "xi-api-key": elevenlabs_api_key,
-        "Content-Type": "application/json"
-    }
+async def send_audio(content, language="en"):
+    """
+    Starts narrating `content` and returns an audio element that plays it while it is still
+    being synthesized, or None if ElevenLabs could not produce any audio.
+    """
+    cleaned_content = remove_emojis(content)
+    cached_audio = tts.cached(cleaned_content, language)
+    if cached_audio is not None:
+        print("Audio served from cache.")
+        return cl.Audio(name="story_segment.mp3", content=cached_audio, display="inline")
 
     # Console message indicating that audio generation has started
     print("Starting audio generation...")
+    try:
+        token = await audio_streams.open(tts.stream(cleaned_content, language))
+    except TTSError as e:
+        print(e)
+        return None
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers, params=querystring) as response:
-            if response.status != 200:
-                print(f"Error with ElevenLabs API: {await response.text()}")
-                return None
+    # Console message indicating that the first audio arrived; the rest streams to the browser
+    print("Audio streaming started.")
+    return cl.Audio(name="story_segment.mp3", url=f"/tts/{token}", display="inline")
 
-            audio_data = await response.read()
+# Narrating the instructions.json prompts as well is opt-in; `python tts.py <instructions.json>`
+# fills the audio cache with them at deploy time
+NARRATE_PROMPTS = os.getenv("NARRATE_PROMPTS", "").lower() in ("1", "true", "yes")
 
-            # Console message indicating that audio generation is completed
-            print("Audio generation completed.")
-            return cl.Audio(name="story_segment.mp3", content=audio_data, display="inline")
+async def send_prompt(content, language, actions=None):
+    """
+    Sends one of the instructions.json prompts. With NARRATE_PROMPTS on, its narration follows in
+    a message of its own, so the text never waits for ElevenLabs.
+    """
+    await cl.Message(content=content, author="Storyteller", actions=actions or []).send()
+    if NARRATE_PROMPTS:
+        audio_element = await send_audio(content, language)
+        if audio_element is not None:
+            await cl.Message(content="", elements=[audio_element], author="Storyteller").send()
+
+async def tell_story_segment(chain, inputs, language):
+    """
+    Generates a story segment from the chain's `inputs` without blocking the event loop,
+    streaming its text into one message and narrating each sentence in `language` as soon as
+    it is complete, in order. Returns the text and whether every sentence was narrated.
+    """
+    text_message = cl.Message(content="", author="Storyteller")
+    await text_message.send()
+    narrated = True
+    async for sentence, audio_element in narrate(stream_chain(chain, **inputs),
+                                                 lambda sentence: send_audio(sentence, language),
+                                                 on_token=text_message.stream_token):
+        if audio_element is not None:
+            await cl.Message(content="", elements=[audio_element], author="Storyteller").send()
+        else:
+            print(f"Audio generation failed for: {sentence}")
+            narrated = False
+    await text_message.update()
+    return text_message.content, narrated
 
 @cl.action_callback("begin_button")
 async def on_begin_storytelling(action):
-    global story_started, story_progress, story_data, user_data
-    story_started = True
+    session = get_session()
+    user_data = session.user_data
+    session.story_started = True
     # Retrieve the intro and encounter_0 text from the story data
+    story_data = load_story_details()
     intro_text = story_data["checkpoints"][0]["text"]
     encounter_0_text = story_data["checkpoints"][1]["text"]
     # Prepare the initial story segment with user data
@@ -201,38 +263,32 @@ async def on_begin_storytelling(action):
     )
 
     # Enable streaming when creating the LLM object
-    llm = OpenAI(model_name="gpt-4-0125-preview", temperature=0.45)
+    llm = OpenAI(model_name="gpt-4-0125-preview", temperature=0.45, streaming=True)
 
     # story_chain = LLMChain(llm=llm, prompt=initial_story_template, verbose=True, output_key='story_segment')
     # res = await llm_math.acall(message.content, callbacks=[cl.LangchainCallbackHandler()])
     story_chain = LLMChain(llm=llm, prompt=initial_story_template, verbose=True, output_key='story_segment')
 
-    initial_story_segment = story_chain.run(
+    # The text streams in as it is generated and each sentence is narrated as soon as it is complete
+    initial_story_segment, narrated = await tell_story_segment(story_chain, dict(
         name=user_data['name'],
         age=user_data['age'],
         language=user_data['language'],
         location=user_data['location'],
         intro=intro_text,
         encounter_0=encounter_0_text
-    )
+    ), session.language)
 
-    narrative_memory.save_context({"user_response": "Begin"}, {"story_segment": initial_story_segment})
-    # narrative_memory.save_context({"story_segment": initial_story_segment}, {"user_response": ""})
-    # Display story segment text immediately
-    await cl.Message(content=initial_story_segment, author="Storyteller").send()
-    # Attempt to generate audio, but do not wait to display text
-    audio_element = await send_audio(initial_story_segment)
-    if audio_element is not None:
-        # Include a brief description or placeholder text as content
-        await cl.Message(content="", elements=[audio_element], author="Storyteller").send()
-    else:
+    session.remember("Begin", initial_story_segment)
+    if not narrated:
         print("Audio generation failed or returned None")
 
 @cl.on_message
 async def main(message: cl.Message):
-    global story_started, narrative_memory, story_progress, story_data, user_data
+    session = get_session()
+    user_data = session.user_data
 
-    if not story_started:
+    if not session.story_started:
         # Collect user data if the story hasn't started
         await collect_user_data(message.content)
         return
@@ -240,20 +296,18 @@ async def main(message: cl.Message):
     # Fetch the current story segment and user's latest response to update the narrative memory
     user_response = message.content
     # Directly appending the user's response to the existing history
-    existing_history = narrative_memory.load_memory_variables({}).get("history", "")
+    existing_history = session.history()
     updated_history = f"{existing_history}\Human: {user_response}"
 
-    # Fetch the next story segment based on the current_checkpoint
-    current_checkpoint = story_progress["current_checkpoint"]
-    next_segment_id = current_checkpoint + 1  # Assuming the next segment follows sequentially
+    # Fetch the next story segment and advance this session's checkpoint
+    next_segment_text = session.next_checkpoint(load_story_details())
 
-    if next_segment_id < len(story_data["checkpoints"]):
-        next_segment_text = story_data["checkpoints"][next_segment_id]["text"]
-        story_progress["current_checkpoint"] = next_segment_id  # Update the checkpoint
+    if next_segment_text is not None:
 
         # Generate the continuation of the story, incorporating user response and next segment
+        # The segment and user details are already in the f-string; only the history is a variable
         continuation_template = PromptTemplate(
-            input_variables=['history', 'next_segment', 'name', 'age', 'language', 'location'],
+            input_variables=['history'],
             template=f"""
             Given the ongoing story for "The Boy and the Drum":
             {{history}}
@@ -276,31 +330,23 @@ async def main(message: cl.Message):
         # Including the user's response in the existing history
         updated_history = f"{existing_history}\Human: {user_response}"
 
-        llm = OpenAI(model_name="gpt-4-0125-preview", temperature=0.45)
+        llm = OpenAI(model_name="gpt-4-0125-preview", temperature=0.45, streaming=True)
         continuation_chain = LLMChain(llm=llm, prompt=continuation_template, verbose=True, output_key='story_continuation')
-        continuation_response = continuation_chain.run(
+        # Narrate the continuation sentence by sentence while it is being generated
+        continuation_response, narrated = await tell_story_segment(continuation_chain, dict(
             history=updated_history,
             next_segment=next_segment_text,
             name=user_data['name'],
             age=user_data['age'],
             language=user_data['language'],
-            location=user_data['location'])
-
-        # Narrate the continuation before sending it to the user
-        await cl.Message(content=continuation_response, author="Storyteller").send()
-        audio_element = await send_audio(continuation_response)
-
-        if audio_element is not None:
-            # Including the continuation response into the existing history
-            final_updated_history = f"{updated_history}\nAI: {continuation_response}"
-            narrative_memory.save_context(inputs={"history": final_updated_history, "user_response": user_response}, outputs={"story_segment": continuation_response})
-            await cl.Message(content="", elements=[audio_element], author="Storyteller").send()
-        else:
-            # If audio generation fails, send the text response only
-            final_updated_history = f"{updated_history}\nAI: {continuation_response}"
-            narrative_memory.save_context({"history": final_updated_history, "user_response": user_response}, outputs={"story_segment": continuation_response})
-            await cl.Message(content="Sorry, I couldn't narrate this part. Here's what happens next:", author="Storyteller").send()
-            await cl.Message(content=continuation_response, author="Storyteller").send()
+            location=user_data['location']), session.language)
+
+        # Including the continuation response into the existing history
+        final_updated_history = f"{updated_history}\nAI: {continuation_response}"
+        session.remember(user_response, continuation_response, history=final_updated_history)
+        if not narrated:
+            # If audio generation fails, the streamed text is all the user gets
+            await cl.Message(content="Sorry, I couldn't narrate all of this part; the story is written above.", author="Storyteller").send()
     else:
         # Handle end of story or no more segments available
         await cl.Message(content="The story has reached its end. Thank you for participating!", author="Storyteller").send()
@@ -316,10 +362,10 @@ async def start():
     await cl.Avatar(name="Storyteller", path=storyteller_avatar_path).send()
     await cl.Avatar(name="User", path=user_avatar_path).send()
 
-    # Setting the image generation to off by default
-    global image_generation_enabled
-    image_generation_enabled = False  # Ensure this is false initially
-    print("[Debug] Initial image generation enabled status:", image_generation_enabled)
+    # A fresh session: image generation is off by default
+    session = StorySession(load_instructions)
+    cl.user_session.set("story", session)
+    print("[Debug] Initial image generation enabled status:", session.image_generation_enabled)
 
     # Request user to enable/disable image generation
     settings = await cl.ChatSettings(
@@ -334,61 +380,52 @@ async def start():
     ).send()
 
     # Update based on user selection
-    image_generation_enabled = settings["ImageGeneration"] == "On"
-    print("[Debug] Image generation enabled after selection:", image_generation_enabled)
+    session.image_generation_enabled = settings["ImageGeneration"] == "On"
+    print("[Debug] Image generation enabled after selection:", session.image_generation_enabled)
 
-    if image_generation_enabled:
-        # Initialize the image generation pipeline only if enabled
-        print("[Debug] Initializing image generation pipeline...")
-        initialize_pipeline()
+    if session.image_generation_enabled:
+        # Start loading the image generation pipeline in the background only if enabled
+        print("[Debug] Loading image generation pipeline in the background...")
+        pipeline_text2image.start()
     # await cl.Message(content="Hello! What's your name?", author="Storyteller").send()
     # Send language selection buttons
-    global instructions  # Assuming 'instructions' is a global variable
-    instructions = load_instructions()  # Load default language instructions first
-
-    # Now it's safe to access instructions["welcome_message"]
+    instructions = session.instructions  # Default language instructions
     language_action_english = cl.Action(name="select_language", value="English", label="English")
     language_action_mandarin = cl.Action(name="select_language", value="Mandarin", label="中文")
-    await cl.Message(content=instructions["welcome_message"], author="Storyteller", actions=[language_action_english, language_action_mandarin]).send()
+    await send_prompt(instructions["welcome_message"], session.language, actions=[language_action_english, language_action_mandarin])
 
 @cl.on_settings_update
 async def setup_agent(settings):
-    global image_generation_enabled
-    image_generation_enabled = settings.get("ImageGeneration", "Off") == "On"
-    print(f"[Debug] on_settings_update - Image generation enabled: {image_generation_enabled}")
+    session = get_session()
+    session.image_generation_enabled = settings.get("ImageGeneration", "Off") == "On"
+    print(f"[Debug] on_settings_update - Image generation enabled: {session.image_generation_enabled}")
 
-    # Optionally, re-initialize or adjust settings related to image generation here
-    if image_generation_enabled and pipeline_text2image is None:
-        print("[Debug] Re-initializing image generation pipeline due to settings update...")
-        initialize_pipeline()
+    # Loading starts now, while the user is still answering the name, age and location prompts
+    if session.image_generation_enabled:
+        print(f"[Debug] Image generation pipeline: {pipeline_text2image.start()}")
 
 async def collect_user_data(message_text: str):
-    global user_data, instructions
+    session = get_session()
 
     # Directly using message_text as it's the raw string input from the user
-    if 'name' not in user_data:
-        user_data['name'] = message_text
-        await cl.Message(content=instructions["age_prompt"], author="Storyteller").send()
-    elif 'age' not in user_data:
-        try:
-            # Convert the age to an integer or handle it as you see fit
-            user_data['age'] = int(message_text)
-        except ValueError:
-            await cl.Message(content="Please enter a valid age.", author="Storyteller").send()
-            return  # Return to await a valid input
-        await cl.Message(content=instructions["location_prompt"], author="Storyteller").send()
-    elif 'location' not in user_data:
-        user_data['location'] = message_text
-        print(f"[Debug] Checking image generation flag: {image_generation_enabled}")
-        if image_generation_enabled:
+    reply = session.collect(message_text)
+    if reply == "invalid_age":
+        await cl.Message(content="Please enter a valid age.", author="Storyteller").send()
+    elif reply is not None:
+        await send_prompt(session.instructions[reply], session.language)
+    else:
+        print(f"[Debug] Checking image generation flag: {session.image_generation_enabled}")
+        if session.image_generation_enabled:
             print("[Debug] Triggering generate_and_display_cover_image")
             await generate_and_display_cover_image()
         else:
             await display_begin_button()
 
 async def generate_and_display_cover_image():
+    session = get_session()
+    user_data = session.user_data
     try:
-        if not image_generation_enabled:  # Return early if image generation is not enabled
+        if not session.image_generation_enabled:  # Return early if image generation is not enabled
             return
 
         # Get the current time and format it as a string (e.g., "2023-10-06 12:34:56")
@@ -396,10 +433,21 @@ async def generate_and_display_cover_image():
         # Define the text prompt for the cover image
         prompt = f"The Sound of Stories set in {current_time} in {user_data['location']}, featuring {user_data['age']} year old {user_data['name']}, magical, cute, children illustration style, anime"
 
+        # Wait for the background load, showing its progress
+        progress_message = cl.Message(content="Preparing the illustrator...", author="Storyteller")
+        await progress_message.send()
+
+        async def show_progress(status):
+            progress_message.content = f"Preparing the illustrator: {status['message']} ({status['progress']:.0%})"
+            await progress_message.update()
+
+        await pipeline_text2image.wait_ready(on_progress=show_progress)
+        await progress_message.remove()
+
         print("Generating image with prompt:", prompt)  # Debugging
         # Generate the cover image using the SDXL model
-        async_pipeline_text2image = cl.make_async(pipeline_text2image)
-        result = await async_pipeline_text2image(prompt=prompt)
+        with pipeline_text2image.use() as pipeline:
+            result = await cl.make_async(pipeline)(prompt=prompt)
         print(f"Image generation result type: {type(result)}")
         print(f"Number of images in result: {len(result.images)}")
         image = result.images[0]
@@ -431,35 +479,27 @@ async def generate_and_display_cover_image():
 
     except Exception as e:
         print("Error in generate_and_display_cover_image:", str(e))  # Print any errors that occur
+        # The story goes on without a cover image
+        await display_begin_button()
 
 @cl.action_callback("select_language")
 async def on_language_selected(action):
-    global current_language, instructions, user_data  # Ensure user_data is accessible globally
-    if action.value == "English":
-        current_language = "en"
-    elif action.value == "Mandarin":
-        current_language = "zh"
-    else:
-        # Default to English if an unknown value is encountered
-        current_language = "en"
-
-    user_data['language'] = current_language  # Correctly store the selected language in user_data
-
-    instructions = load_instructions()  # Correctly load instructions based on the newly selected language
-    await cl.Message(content=instructions["name_prompt"], author="Storyteller").send()
+    session = get_session()
+    # Stores the language in the session's user_data and loads its instructions (English if unknown)
+    session.set_language(action.value)
+    await send_prompt(session.instructions["name_prompt"], session.language)
 
     # Define session directory path
-    session_dir = construct_path_from_root(f'raw_data/the_sound_of_stories/session_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}')
+    session_dir = construct_path_from_root(f'raw_data/the_sound_of_stories/session_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}_{cl.user_session.get("id")}')
     os.makedirs(session_dir, exist_ok=True)
 
     # Save the preferred language in a JSON file
     language_preference_path = os.path.join(session_dir, 'user_preferences.json')
     with open(language_preference_path, 'w') as file:
-        json.dump({"preferred_language": user_data['language']}, file, indent=4)
+        json.dump({"preferred_language": session.language}, file, indent=4)
 
 async def display_begin_button():  # NEW: Function to display the 'Begin' button
-    # Assuming 'instructions' is a global variable already containing the loaded instructions
-    global instructions
-    begin_prompt = instructions["begin_story"]  # Get the begin prompt based on the selected language
+    session = get_session()
+    begin_prompt = session.instructions["begin_story"]  # Get the begin prompt based on the selected language
     begin_action = cl.Action(name="begin_button", value="Begin", label="Begin")
-    await cl.Message(content=begin_prompt, actions=[begin_action], author="Storyteller").send()
+    await send_prompt(begin_prompt, session.language, actions=[begin_action])
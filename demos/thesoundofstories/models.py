@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds a loaded pipeline may sit unused before it is unloaded to free its memory
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+
+UNLOADED = "unloaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+class LazyPipeline:
+    """
+    Holds a model pipeline that is only loaded when a session first asks for it.
+
+    start() calls `loader(progress)` in a background thread; the loader reports how far it got
+    by calling `progress(fraction, message)` and returns the pipeline. status() reports the
+    state and progress, wait_ready() awaits the load without blocking the event loop, and use()
+    hands out the loaded pipeline. Once nothing has used the pipeline for `idle_timeout`
+    seconds it is dropped (after calling `on_unload(pipeline)`, e.g. to empty the CUDA cache),
+    and the next start() loads it again.
+    """
+    def __init__(self, loader, idle_timeout=DEFAULT_IDLE_TIMEOUT, on_unload=None):
+        self.loader = loader
+        self.idle_timeout = idle_timeout
+        self.on_unload = on_unload
+        self.lock = threading.Lock()
+        self.pipeline = None
+        self.state = UNLOADED
+        self.progress = 0.0
+        self.message = ""
+        self.error = None
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.loaded = threading.Event()
+        self.timer = None
+
+    def start(self):
+        """
+        Starts loading the pipeline unless it is loading or loaded already (a failed load is
+        retried). Returns the state.
+        """
+        with self.lock:
+            if self.state in (LOADING, READY):
+                return self.state
+            self.state, self.progress, self.message, self.error = LOADING, 0.0, "Starting", None
+            self.loaded.clear()
+        threading.Thread(target=self._load, daemon=True).start()
+        return LOADING
+
+    def _report(self, fraction, message=""):
+        with self.lock:
+            self.progress, self.message = min(max(fraction, 0.0), 1.0), message
+
+    def _load(self):
+        try:
+            pipeline = self.loader(self._report)
+        except Exception as e:
+            with self.lock:
+                self.state, self.error, self.message = FAILED, e, f"Loading failed: {e}"
+            print(f"Pipeline loading failed: {e}")
+        else:
+            with self.lock:
+                self.pipeline, self.state, self.progress, self.message = pipeline, READY, 1.0, "Ready"
+                self.last_used = time.monotonic()
+            self._schedule_unload(self.idle_timeout)
+        finally:
+            self.loaded.set()
+
+    def status(self):
+        with self.lock:
+            return {"state": self.state, "progress": self.progress, "message": self.message,
+                    "error": self.error}
+
+    async def wait_ready(self, on_progress=None, poll_interval=0.5):
+        """
+        Starts the load if needed and waits for it, calling `on_progress(status)` (sync or
+        async) every `poll_interval` seconds while loading. Raises the loader's error if it failed.
+        """
+        self.start()
+        while not self.loaded.is_set():
+            if on_progress is not None:
+                result = on_progress(self.status())
+                if asyncio.iscoroutine(result):
+                    await result
+            await asyncio.sleep(poll_interval)
+        with self.lock:
+            if self.state == FAILED:
+                raise self.error
+            if self.state != READY:
+                raise RuntimeError(f"Pipeline is {self.state}")
+
+    @contextmanager
+    def use(self):
+        """
+        Yields the loaded pipeline; it is not unloaded while in use.
+        """
+        with self.lock:
+            if self.state != READY:
+                raise RuntimeError(f"Pipeline is {self.state}; call start() and wait_ready() first")
+            self.users += 1
+            pipeline = self.pipeline
+        try:
+            yield pipeline
+        finally:
+            with self.lock:
+                self.users -= 1
+                self.last_used = time.monotonic()
+            self._schedule_unload(self.idle_timeout)
+
+    def _schedule_unload(self, delay):
+        if self.idle_timeout is None:
+            return
+        timer = threading.Timer(delay, self._unload_if_idle)
+        timer.daemon = True
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = timer
+        timer.start()
+
+    def _unload_if_idle(self):
+        with self.lock:
+            if self.state != READY:
+                return
+            idle = time.monotonic() - self.last_used
+            if self.users or idle < self.idle_timeout:
+                remaining = self.idle_timeout - idle if not self.users else self.idle_timeout
+            else:
+                remaining = None
+        if remaining is not None:
+            self._schedule_unload(remaining)
+        else:
+            self.unload()
+
+    def unload(self):
+        """
+        Drops the loaded pipeline now, unless it is in use. Returns True if it was unloaded.
+        """
+        with self.lock:
+            if self.state != READY or self.users:
+                return False
+            pipeline, self.pipeline = self.pipeline, None
+            self.state, self.progress, self.message = UNLOADED, 0.0, "Unloaded after being idle"
+            self.loaded.clear()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if self.on_unload is not None:
+            self.on_unload(pipeline)
+        return True
@@ -0,0 +1,113 @@
+import asyncio
+import re
+from langchain.callbacks.base import AsyncCallbackHandler
+
+# Sentences shorter than this are joined with the next one rather than narrated on their own
+MIN_SENTENCE_CHARS = 40
+# Sentences being synthesized at once
+DEFAULT_CONCURRENCY = 3
+# A sentence ends at ., !, ? or an ellipsis (plus closing quotes or brackets) followed by
+# whitespace, or right after Chinese full stops, exclamation and question marks
+SENTENCE_END = re.compile(r'(?:[.!?…]+["\'”’)\]]*\s+|[。！？]+["\'”’」』）]*\s*)')
+
+def split_sentences(text, min_chars=MIN_SENTENCE_CHARS):
+    """
+    Splits the complete sentences off the front of `text`, joining short ones until they
+    reach `min_chars`. Returns the sentences and the unfinished remainder.
+    """
+    sentences, start, pending = [], 0, ""
+    for match in SENTENCE_END.finditer(text):
+        pending += text[start:match.end()]
+        start = match.end()
+        if len(pending.strip()) >= min_chars:
+            sentences.append(pending.strip())
+            pending = ""
+    return sentences, pending + text[start:]
+
+async def iter_sentences(tokens, min_chars=MIN_SENTENCE_CHARS):
+    """
+    Yields sentences from an async iterator of text tokens as soon as each one is complete;
+    whatever is left when the tokens run out is the last sentence.
+    """
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        sentences, buffer = split_sentences(buffer, min_chars)
+        for sentence in sentences:
+            yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+class TokenQueueHandler(AsyncCallbackHandler):
+    """
+    Puts the tokens of a streaming LLM on an asyncio queue.
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    async def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.tokens.put_nowait(token)
+
+async def stream_chain(chain, **inputs):
+    """
+    Runs an LLMChain with `inputs` on the event loop (chain.arun) and yields its output token
+    by token. An LLM that does not stream yields its whole output at the end. Errors from the
+    chain are raised once the tokens produced before them have been yielded.
+    """
+    tokens = asyncio.Queue()
+    run = asyncio.ensure_future(chain.arun(callbacks=[TokenQueueHandler(tokens)], **inputs))
+    run.add_done_callback(lambda _: tokens.put_nowait(None))
+    streamed = False
+    try:
+        while (token := await tokens.get()) is not None:
+            streamed = True
+            yield token
+        text = await run
+        if not streamed and text:
+            yield text
+    finally:
+        if not run.done():
+            run.cancel()
+
+async def narrate(tokens, synthesize, on_token=None, min_chars=MIN_SENTENCE_CHARS, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Cuts a stream of LLM tokens into sentences and starts `synthesize(sentence)` for each as
+    soon as it is complete, up to `concurrency` at a time, while later sentences are still
+    being generated. Yields (sentence, audio) pairs in story order, so the first sentence can
+    play while the rest are in flight. `on_token`, if given, is awaited with every token, e.g.
+    to stream the text into the UI.
+    """
+    limit = asyncio.Semaphore(concurrency)
+    pending = asyncio.Queue()
+
+    async def synthesize_limited(sentence):
+        async with limit:
+            return await synthesize(sentence)
+
+    async def watch(tokens):
+        async for token in tokens:
+            if on_token is not None:
+                await on_token(token)
+            yield token
+
+    async def produce():
+        try:
+            async for sentence in iter_sentences(watch(tokens), min_chars):
+                pending.put_nowait((sentence, asyncio.ensure_future(synthesize_limited(sentence))))
+        finally:
+            pending.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while (item := await pending.get()) is not None:
+            sentence, audio = item
+            yield sentence, await audio
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+        while not pending.empty():
+            item = pending.get_nowait()
+            if item is not None:
+                item[1].cancel()
@@ -0,0 +1,70 @@
+from langchain.memory import ConversationBufferMemory
+
+DEFAULT_LANGUAGE = "en"
+LANGUAGES = {"English": "en", "Mandarin": "zh"}
+# The details asked for, in order, before the story can begin
+USER_FIELDS = ("name", "age", "location")
+
+class StorySession:
+    """
+    Everything one child's storytelling session needs: the answers collected so far, the chosen
+    language and its instructions, the checkpoint reached in the story, the narrative memory
+    and whether image generation is on. main.py keeps one per chainlit session in
+    cl.user_session, so concurrent sessions in one process never share state; only the story
+    and the instruction texts are shared, read-only.
+    """
+    def __init__(self, instructions_loader):
+        self.instructions_loader = instructions_loader
+        self.user_data = {}
+        self.language = DEFAULT_LANGUAGE
+        self.instructions = instructions_loader(self.language)
+        self.story_started = False
+        self.current_checkpoint = 0
+        self.image_generation_enabled = False
+        self.narrative_memory = ConversationBufferMemory(input_key='user_response', output_key='story_segment')
+
+    def set_language(self, label):
+        """
+        Selects a language by its button label (unknown labels fall back to English) and loads
+        its instructions.
+        """
+        self.language = LANGUAGES.get(label, DEFAULT_LANGUAGE)
+        self.user_data['language'] = self.language
+        self.instructions = self.instructions_loader(self.language)
+        return self.language
+
+    def collect(self, text):
+        """
+        Records the answer to the next missing detail. Returns the key of the instruction to
+        reply with: "age_prompt" or "location_prompt" for the next question, "invalid_age" if the
+        age was not a number, or None once every detail is known.
+        """
+        field = next((field for field in USER_FIELDS if field not in self.user_data), None)
+        if field == "age":
+            try:
+                self.user_data['age'] = int(text)
+            except ValueError:
+                return "invalid_age"
+        elif field is not None:
+            self.user_data[field] = text
+        field = next((field for field in USER_FIELDS if field not in self.user_data), None)
+        return f"{field}_prompt" if field else None
+
+    def next_checkpoint(self, story_data):
+        """
+        Advances to the next checkpoint of the story and returns its text, or None at the end.
+        """
+        next_id = self.current_checkpoint + 1
+        if next_id >= len(story_data["checkpoints"]):
+            return None
+        self.current_checkpoint = next_id
+        return story_data["checkpoints"][next_id]["text"]
+
+    def history(self):
+        return self.narrative_memory.load_memory_variables({}).get("history", "")
+
+    def remember(self, user_response, story_segment, history=None):
+        inputs = {"user_response": user_response}
+        if history is not None:
+            inputs["history"] = history
+        self.narrative_memory.save_context(inputs, {"story_segment": story_segment})
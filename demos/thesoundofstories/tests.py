@@ -0,0 +1,577 @@
+import asyncio
+import contextvars
+import re
+import threading
+import time
+import aiohttp
+import pytest
+from aiohttp import web
+from typing import Any, List
+from langchain.chains import LLMChain
+from langchain.llms.base import LLM
+from langchain.prompts import PromptTemplate
+from models import FAILED, READY, UNLOADED, LazyPipeline
+from narration import narrate, split_sentences, stream_chain
+from sessions import StorySession
+from tts import AudioCache, AudioStreams, CachedTTS, ElevenLabsClient, TTSError, audio_key, static_narrations
+
+class StubPipeline:
+    """Stands in for SDXL: returns the prompt it was called with."""
+    def __call__(self, prompt):
+        return prompt
+
+def stub_loader(release=None, calls=None):
+    def load(progress):
+        if calls is not None:
+            calls.append(time.monotonic())
+        progress(0.5, "Loading weights")
+        if release is not None:
+            assert release.wait(5)
+        return StubPipeline()
+    return load
+
+def test_lazy_pipeline_loads_in_the_background_on_first_start():
+    release, calls = threading.Event(), []
+    pipeline = LazyPipeline(stub_loader(release, calls), idle_timeout=None)
+    assert pipeline.status()["state"] == UNLOADED
+    assert calls == []
+
+    pipeline.start()
+    pipeline.start()
+    seen = []
+    async def wait():
+        task = asyncio.ensure_future(pipeline.wait_ready(on_progress=seen.append, poll_interval=0.01))
+        await asyncio.sleep(0.05)
+        # Still loading, and the event loop keeps running meanwhile
+        assert not task.done()
+        release.set()
+        await task
+    asyncio.run(wait())
+
+    assert len(calls) == 1
+    assert seen and seen[-1]["progress"] == 0.5 and seen[-1]["message"] == "Loading weights"
+    assert pipeline.status()["state"] == READY
+    with pipeline.use() as loaded:
+        assert loaded("a fox") == "a fox"
+
+def test_lazy_pipeline_unloads_when_idle():
+    unloaded = []
+    pipeline = LazyPipeline(stub_loader(), idle_timeout=0.1, on_unload=unloaded.append)
+    asyncio.run(pipeline.wait_ready(poll_interval=0.01))
+    with pipeline.use():
+        time.sleep(0.2)
+        # Not unloaded while in use
+        assert pipeline.status()["state"] == READY
+    for _ in range(100):
+        if pipeline.status()["state"] == UNLOADED:
+            break
+        time.sleep(0.02)
+    assert pipeline.status()["state"] == UNLOADED
+    assert len(unloaded) == 1 and isinstance(unloaded[0], StubPipeline)
+    with pytest.raises(RuntimeError):
+        with pipeline.use():
+            pass
+    # The next session loads it again
+    asyncio.run(pipeline.wait_ready(poll_interval=0.01))
+    assert pipeline.status()["state"] == READY
+
+def test_lazy_pipeline_reports_load_failures():
+    attempts = []
+    def load(progress):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("no space left on device")
+        return StubPipeline()
+
+    pipeline = LazyPipeline(load, idle_timeout=None)
+    with pytest.raises(OSError):
+        asyncio.run(pipeline.wait_ready(poll_interval=0.01))
+    assert pipeline.status()["state"] == FAILED
+    asyncio.run(pipeline.wait_ready(poll_interval=0.01))
+    assert pipeline.status()["state"] == READY and len(attempts) == 2
+
+INSTRUCTIONS = {
+    "en": {"welcome_message": "Welcome!", "name_prompt": "What's your name?", "age_prompt": "How old are you?",
+           "location_prompt": "Where do you live?", "begin_story": "Shall we begin?"},
+    "zh": {"welcome_message": "欢迎！", "name_prompt": "你叫什么名字？", "age_prompt": "你几岁？",
+           "location_prompt": "你住在哪里？", "begin_story": "我们开始吧？"},
+}
+STORY = {"checkpoints": [{"text": f"checkpoint {i}"} for i in range(5)]}
+
+def load_test_instructions(language):
+    return INSTRUCTIONS.get(language, INSTRUCTIONS["en"])
+
+def test_story_session_collects_details_in_order():
+    session = StorySession(load_test_instructions)
+    assert session.set_language("Mandarin") == "zh"
+    assert session.collect("Mei") == "age_prompt"
+    assert session.collect("seven") == "invalid_age"
+    assert session.collect("7") == "location_prompt"
+    assert session.collect("Singapore") is None
+    assert session.user_data == {"language": "zh", "name": "Mei", "age": 7, "location": "Singapore"}
+    assert session.instructions["name_prompt"] == "你叫什么名字？"
+    assert [session.next_checkpoint(STORY) for _ in range(5)] == [f"checkpoint {i}" for i in range(1, 5)] + [None]
+
+class FakeElevenLabs:
+    """
+    Local aiohttp stand-in for the ElevenLabs streaming endpoint. Answers with the statuses in
+    `failures` first, then streams the request's text back in three chunks, holding the rest
+    until `release` is set if one is given.
+    """
+    def __init__(self, failures=(), delay=0.0):
+        self.failures = list(failures)
+        self.delay = delay
+        self.requests = []
+        self.release = None
+
+    async def handle(self, request):
+        self.requests.append({"payload": await request.json(), "headers": dict(request.headers),
+                              "query": dict(request.query), "peer": request.transport.get_extra_info("peername")})
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.failures:
+            return web.Response(status=self.failures.pop(0), text="busy")
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        text = self.requests[-1]["payload"]["text"].encode()
+        await response.write(text[:1])
+        if self.release is not None:
+            await self.release.wait()
+        await response.write(text[1:2])
+        await response.write(text[2:])
+        await response.write_eof()
+        return response
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/v1/text-to-speech/{voice_id}/stream", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+def test_tts_client_streams_over_one_pooled_connection():
+    async def run():
+        async with FakeElevenLabs() as server:
+            client = ElevenLabsClient("key", base_url=server.url)
+            server.release = asyncio.Event()
+            chunks = client.stream("Once upon a time", language="zh")
+            # The first chunk arrives while the server is still holding back the rest
+            assert await chunks.__anext__() == b"O"
+            server.release.set()
+            assert b"O" + b"".join([chunk async for chunk in chunks]) == b"Once upon a time"
+            assert await client.synthesize("there was a drum") == b"there was a drum"
+            await client.close()
+            return server.requests
+
+    first, second = asyncio.run(run())
+    assert first["payload"] == {"text": "Once upon a time", "model_id": "eleven_multilingual_v2", "language": "zh"}
+    assert first["headers"]["xi-api-key"] == "key"
+    assert first["query"] == {"optimize_streaming_latency": "1"}
+    assert "language" not in second["payload"]
+    assert first["peer"] == second["peer"]
+
+def test_tts_client_retries_with_backoff():
+    async def run(failures, **kwargs):
+        async with FakeElevenLabs(failures) as server:
+            client = ElevenLabsClient("key", base_url=server.url, backoff=0.01, **kwargs)
+            try:
+                return await client.synthesize("drum"), len(server.requests)
+            except TTSError as e:
+                return e, len(server.requests)
+            finally:
+                await client.close()
+
+    assert asyncio.run(run([503, 429])) == (b"drum", 3)
+    error, attempts = asyncio.run(run([503, 503, 503], retries=2))
+    assert isinstance(error, TTSError) and "503" in str(error) and attempts == 3
+    # A bad key is not retried
+    error, attempts = asyncio.run(run([401]))
+    assert isinstance(error, TTSError) and attempts == 1
+
+def test_tts_client_requires_an_api_key():
+    with pytest.raises(TTSError):
+        asyncio.run(ElevenLabsClient(None).synthesize("drum"))
+
+def test_tts_client_times_out_stalled_requests():
+    async def run():
+        async with FakeElevenLabs(delay=0.5) as server:
+            client = ElevenLabsClient("key", base_url=server.url, retries=1, backoff=0.01,
+                                      timeout=aiohttp.ClientTimeout(total=5, sock_read=0.1))
+            with pytest.raises(TTSError):
+                await client.synthesize("drum")
+            await client.close()
+            return len(server.requests)
+
+    assert asyncio.run(run()) == 2
+
+def test_audio_streams_hold_opened_streams_until_taken():
+    async def chunks(data, fail=False):
+        if fail:
+            raise TTSError("no audio")
+        for chunk in data:
+            yield chunk
+
+    async def run():
+        streams = AudioStreams(ttl=60)
+        token = await streams.open(chunks([b"a", b"b"]))
+        with pytest.raises(TTSError):
+            await streams.open(chunks([], fail=True))
+        assert b"".join([chunk async for chunk in streams.take(token)]) == b"ab"
+        assert streams.take(token) is None
+
+        streams.ttl = 0
+        token = await streams.open(chunks([b"a", b"b"]))
+        await asyncio.sleep(0.01)
+        await streams.expire()
+        assert streams.take(token) is None
+
+    asyncio.run(run())
+
+def test_send_audio_streams_through_the_audio_route(app_main, monkeypatch, tmp_path):
+    httpx = pytest.importorskip("httpx")
+    from chainlit.server import register_wildcard_route_handler
+    main = app_main
+    # As with chainlit versions that register their catch-all UI route before loading the app
+    monkeypatch.setattr(main.app.router, "routes", [route for route in main.app.router.routes
+                                                    if getattr(route, "path", None) != "/tts/{token}"])
+    register_wildcard_route_handler()
+    main.mount_audio_route(main.app)
+    monkeypatch.setattr(main.cl, "Audio", lambda **kwargs: kwargs)
+    monkeypatch.setattr(main, "audio_streams", AudioStreams(ttl=60))
+
+    async def run():
+        async with FakeElevenLabs() as server:
+            tts = CachedTTS(ElevenLabsClient("key", base_url=server.url), cache_path=str(tmp_path / "audio.sqlite3"))
+            monkeypatch.setattr(main, "tts", tts)
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://chainlit") as client:
+                audio = await main.send_audio("Once upon a time")
+                response = await client.get(audio["url"])
+                assert response.status_code == 200 and response.headers["content-type"] == "audio/mpeg"
+                assert response.content == b"Once upon a time"
+                # A stream is served once
+                assert (await client.get(audio["url"])).status_code == 404
+
+                # The completed narration was cached, so it is sent inline from now on
+                assert (await main.send_audio("Once upon a time"))["content"] == b"Once upon a time"
+                assert len(server.requests) == 1
+
+                # Streams nobody fetched are closed after the TTL
+                main.audio_streams.ttl = 0
+                audio = await main.send_audio("There was a drum")
+                await asyncio.sleep(0.01)
+                await main.audio_streams.expire()
+                assert (await client.get(audio["url"])).status_code == 404
+            server.failures = [401]
+            assert await main.send_audio("A bad key") is None
+            await tts.client.close()
+            tts.close()
+
+    asyncio.run(run())
+
+def test_prompts_are_sent_before_their_optional_narration(app_main, monkeypatch, tmp_path):
+    main = app_main
+    user_session = ContextUserSession()
+    ui = FakeUI(user_session)
+    monkeypatch.setattr(main.cl, "user_session", user_session)
+    monkeypatch.setattr(main.cl, "Message", ui.Message)
+    narrated = []
+
+    async def send_audio(content, language="en"):
+        # The prompt's text is already on screen
+        narrated.append((content, [message.content for message in user_session.get("sent")]))
+        return f"audio:{content}"
+
+    async def run():
+        user_session.start(0)
+        await main.send_prompt("Welcome!", "en")
+        assert narrated == [] and [m.content for m in user_session.get("sent")] == ["Welcome!"]
+
+        monkeypatch.setattr(main, "NARRATE_PROMPTS", True)
+        await main.send_prompt("What's your name?", "en")
+        assert narrated == [("What's your name?", ["Welcome!", "What's your name?"])]
+        assert user_session.get("sent")[-1].elements == ["audio:What's your name?"]
+
+        # Without an ElevenLabs key the prompt is still sent, just not narrated
+        monkeypatch.setattr(main, "send_audio", real_send_audio)
+        monkeypatch.setattr(main, "tts", CachedTTS(ElevenLabsClient(None), cache_path=str(tmp_path / "audio.sqlite3")))
+        await main.send_prompt("How old are you?", "en")
+        assert [m.content for m in user_session.get("sent")][-3:] == ["What's your name?", "", "How old are you?"]
+        main.tts.close()
+
+    real_send_audio = main.send_audio
+    monkeypatch.setattr(main, "send_audio", send_audio)
+    asyncio.run(run())
+
+class FakeStreamingLLM(LLM):
+    """Fake async LLM that streams `text` word by word, `delay` seconds apart."""
+    text: str
+    delay: float = 0.0
+    events: Any = None
+
+    @property
+    def _llm_type(self):
+        return "fake-streaming"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        raise AssertionError("The story must be generated without blocking the event loop")
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        words = self.text.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.delay)
+            if self.events is not None:
+                self.events.append(("token", word))
+            if run_manager:
+                await run_manager.on_llm_new_token(word if i == 0 else " " + word)
+        return self.text
+
+STORY_TEXT = ("Once upon a time, a boy found a drum by the river. He tapped it softly and the fish came to listen! "
+              "What would he buy at the market? 你好。")
+
+def test_split_sentences():
+    sentences, rest = split_sentences("Hi. I am a boy with a drum. He said \"Wow!\" Then", min_chars=10)
+    assert sentences == ["Hi. I am a boy with a drum.", 'He said "Wow!"']
+    assert rest == "Then"
+    assert split_sentences("他有一个鼓。他很高兴！还有", min_chars=1) == (["他有一个鼓。", "他很高兴！"], "还有")
+    assert split_sentences("Pi is 3.14 and counting", min_chars=1) == ([], "Pi is 3.14 and counting")
+
+def test_narration_overlaps_generation_and_keeps_order():
+    events = []
+
+    async def synthesize(sentence):
+        events.append(("tts start", sentence))
+        # Earlier sentences take longer, so they finish out of order
+        await asyncio.sleep(0.1 if sentence.startswith("Once") else 0.01)
+        return f"audio:{sentence}"
+
+    async def run():
+        llm = FakeStreamingLLM(text=STORY_TEXT, delay=0.005, events=events)
+        chain = LLMChain(llm=llm, prompt=PromptTemplate(input_variables=["name"], template="Tell {name} a story"))
+        tokens = []
+        async def on_token(token):
+            tokens.append(token)
+        results = [pair async for pair in narrate(stream_chain(chain, name="Mei"), synthesize, on_token=on_token,
+                                                   min_chars=20)]
+        return results, "".join(tokens)
+
+    results, text = asyncio.run(run())
+    assert text == STORY_TEXT
+    assert [sentence for sentence, _ in results] == [
+        "Once upon a time, a boy found a drum by the river.", "He tapped it softly and the fish came to listen!",
+        "What would he buy at the market?", "你好。"]
+    assert all(audio == f"audio:{sentence}" for sentence, audio in results)
+    # Synthesis of the first sentence starts before the LLM has produced the last word
+    first_tts = events.index(("tts start", results[0][0]))
+    assert first_tts < events.index(("token", "你好。"))
+
+def test_narration_raises_llm_errors():
+    class FailingLLM(FakeStreamingLLM):
+        async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+            await run_manager.on_llm_new_token("Once upon a time there was a drum. ")
+            raise RuntimeError("rate limited")
+
+    async def synthesize(sentence):
+        return sentence
+
+    async def run():
+        chain = LLMChain(llm=FailingLLM(text=""), prompt=PromptTemplate(input_variables=["name"], template="{name}"))
+        received = []
+        with pytest.raises(RuntimeError, match="rate limited"):
+            async for sentence, _ in narrate(stream_chain(chain, name="Mei"), synthesize, min_chars=1):
+                received.append(sentence)
+        return received
+
+    assert asyncio.run(run()) == ["Once upon a time there was a drum."]
+
+class ContextUserSession:
+    """
+    Stands in for cl.user_session: like chainlit, each task sees the session it was started
+    for (a context variable), so concurrent handlers only ever touch their own session.
+    """
+    def __init__(self):
+        self.current = contextvars.ContextVar("user_session")
+        self.sessions = {}
+
+    def start(self, session_id):
+        self.sessions[session_id] = {"id": session_id, "sent": []}
+        self.current.set(self.sessions[session_id])
+
+    def get(self, key, default=None):
+        return self.current.get().get(key, default)
+
+    def set(self, key, value):
+        self.current.get()[key] = value
+
+class FakeUI:
+    """The chainlit UI elements main.py sends; messages are recorded in the sending session."""
+    def __init__(self, user_session):
+        ui = self
+
+        class Message:
+            def __init__(self, content="", author=None, actions=None, elements=None, **kwargs):
+                self.content, self.author = content, author
+                self.actions, self.elements = actions or [], elements or []
+
+            async def send(self):
+                user_session.get("sent").append(self)
+                await asyncio.sleep(0)
+                return self
+
+            async def stream_token(self, token):
+                self.content += token
+
+            async def update(self):
+                pass
+
+            async def remove(self):
+                pass
+
+        class Element:
+            def __init__(self, *args, **kwargs):
+                self.__dict__.update(kwargs)
+
+            async def send(self):
+                return ui.settings
+
+        self.Message = Message
+        self.Avatar = self.ChatSettings = self.Action = self.Select = Element
+        self.settings = {"ImageGeneration": "Off"}
+
+class SessionEchoLLM(FakeStreamingLLM):
+    """Streams a story naming the child its prompt is about, and how many segments came before."""
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        name = re.search(r"child-\d+", prompt).group()
+        text = f"{name} heard the drum after {prompt.count('AI:')} segments. What happens next?"
+        for i, word in enumerate(text.split(" ")):
+            await asyncio.sleep(0.001)
+            await run_manager.on_llm_new_token(word if i == 0 else " " + word)
+        return text
+
+@pytest.fixture
+def app_main(monkeypatch):
+    """The chainlit app module, main.py."""
+    pytest.importorskip("chainlit")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import main
+    return main
+
+@pytest.fixture
+def storyteller(app_main, monkeypatch, tmp_path):
+    """main.py with chainlit's session and UI, the LLM, narration and the data files faked."""
+    main, cl = app_main, app_main.cl
+    user_session = ContextUserSession()
+    ui = FakeUI(user_session)
+    monkeypatch.setattr(cl, "user_session", user_session)
+    for name in ("Message", "Avatar", "ChatSettings", "Action"):
+        monkeypatch.setattr(cl, name, getattr(ui, name))
+    monkeypatch.setattr(main, "Select", ui.Select)
+    monkeypatch.setattr(main, "OpenAI", lambda **kwargs: SessionEchoLLM(text=""))
+    monkeypatch.setattr(main, "load_instructions", load_test_instructions)
+    monkeypatch.setattr(main, "load_story_details", lambda: STORY)
+    monkeypatch.setattr(main, "construct_path_from_root", lambda relative_path: str(tmp_path / relative_path))
+
+    async def send_audio(content, language="en"):
+        return f"audio:{content}"
+    monkeypatch.setattr(main, "send_audio", send_audio)
+    return main, user_session, ui
+
+async def run_session(main, user_session, ui, session_id, turns):
+    """Drives one child's session through main.py's handlers, the way chainlit would call them."""
+    user_session.start(session_id)
+    await main.start()
+    await main.on_language_selected(ui.Action(value="English" if session_id % 2 else "Mandarin"))
+    for answer in (f"child-{session_id}", str(4 + session_id % 6), f"town-{session_id}"):
+        await main.main(ui.Message(content=answer))
+    await main.on_begin_storytelling(ui.Action(value="Begin"))
+    for turn in range(turns):
+        await main.main(ui.Message(content=f"reply {turn} from child-{session_id}"))
+
+def test_concurrent_sessions_do_not_share_state(storyteller):
+    main, user_session, ui = storyteller
+
+    async def run(count):
+        await asyncio.gather(*(run_session(main, user_session, ui, i, turns=3) for i in range(count)))
+    asyncio.run(run(20))
+
+    for session_id, data in user_session.sessions.items():
+        name, language = f"child-{session_id}", "en" if session_id % 2 else "zh"
+        session = data["story"]
+        assert session.user_data == {"language": language, "name": name, "age": 4 + session_id % 6,
+                                     "location": f"town-{session_id}"}
+        assert session.language == language and session.current_checkpoint == 3
+        history = session.history()
+        assert set(re.findall(r"child-\d+", history)) == {name}
+        assert [f"after {n} segments" in history for n in range(4)] == [True] * 4
+        sent = [message.content for message in data["sent"]]
+        assert INSTRUCTIONS[language]["name_prompt"] in sent and INSTRUCTIONS[language]["location_prompt"] in sent
+        assert sum(content.startswith(f"{name} heard the drum") for content in sent) == 4
+        assert set(re.findall(r"child-\d+", " ".join(sent))) == {name}
+        # Each sentence was narrated into this session only
+        narrated = [element for message in data["sent"] for element in message.elements]
+        assert sum(element.startswith(f"audio:{name} heard the drum") for element in narrated) == 4
+        assert set(re.findall(r"child-\d+", " ".join(narrated))) == {name}
+
+def test_audio_key_normalizes_text():
+    key = audio_key("Once  upon\na time ", "voice", "model", "en")
+    assert key == audio_key("Once upon a time", "voice", "model", "en")
+    assert key != audio_key("Once upon a time", "voice", "model", "zh")
+    assert key != audio_key("Once upon a time", "other voice", "model", "en")
+    assert key != audio_key("Once upon a time", "voice", "other model", "en")
+
+def test_cached_tts_skips_the_network_on_hits(tmp_path):
+    async def run():
+        async with FakeElevenLabs() as server:
+            tts = CachedTTS(ElevenLabsClient("key", base_url=server.url), cache_path=str(tmp_path / "audio.sqlite3"))
+            assert tts.cached("The boy beat his drum.") is None
+            assert await tts.synthesize("The boy beat his drum.") == b"The boy beat his drum."
+            assert len(server.requests) == 1
+            # A repeat, or a retry with different spacing, is served from the cache
+            assert await tts.synthesize("The boy  beat his drum.") == b"The boy beat his drum."
+            assert [chunk async for chunk in tts.stream("The boy beat his drum.")] == [b"The boy beat his drum."]
+            assert len(server.requests) == 1
+            # Another language is synthesized separately
+            await tts.synthesize("The boy beat his drum.", language="zh")
+            assert len(server.requests) == 2
+
+            narrations = static_narrations({"en": {"name_prompt": "Name?", "age_prompt": "Age?"},
+                                            "zh": {"name_prompt": "名字？"}}, keys=("name_prompt",))
+            assert narrations == [("Name?", "en"), ("名字？", "zh")]
+            assert await tts.prewarm(narrations + [("The boy beat his drum.", None)]) == (2, 1)
+            assert len(server.requests) == 4
+            assert await tts.prewarm(narrations) == (0, 2)
+            assert tts.cached("名字？", "zh") == "名字？".encode()
+            await tts.client.close()
+            tts.close()
+
+    asyncio.run(run())
+
+def test_cached_tts_does_not_cache_failed_streams(tmp_path):
+    async def run():
+        async with FakeElevenLabs([401]) as server:
+            tts = CachedTTS(ElevenLabsClient("key", base_url=server.url), cache_path=str(tmp_path / "audio.sqlite3"))
+            with pytest.raises(TTSError):
+                await tts.synthesize("drum")
+            assert tts.cached("drum") is None
+            assert await tts.synthesize("drum") == b"drum"
+            await tts.client.close()
+            tts.close()
+
+    asyncio.run(run())
+
+def test_audio_cache_evicts_least_recently_used(tmp_path):
+    cache = AudioCache(str(tmp_path / "audio.sqlite3"), max_bytes=250)
+    for key in ("a", "b"):
+        cache.put_audio(key, b"x" * 100)
+    assert cache.get_audio("a") == b"x" * 100
+    time.sleep(0.01)
+    cache.put_audio("c", b"x" * 100)
+    assert cache.get_audio("b") is None
+    assert cache.get_audio("a") is not None and cache.get_audio("c") is not None
+    cache.close()
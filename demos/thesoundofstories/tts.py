@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import unicodedata
+import uuid
+import aiohttp
+from db.cache import ChunkCache
+
+ELEVENLABS_URL = "https://api.elevenlabs.io"
+DEFAULT_VOICE_ID = "0M23V8kIecNGWiNzhRRn"
+DEFAULT_MODEL_ID = "eleven_multilingual_v2"  # This model supports multiple languages, including Mandarin.
+# Connect quickly or retry; once audio flows, a stalled read fails after sock_read seconds
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=120, connect=5, sock_read=20)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+# Rate limiting and server errors are worth retrying; other errors (bad key, bad request) are not
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+# Seconds an opened audio stream waits for the browser to fetch it before it is closed
+DEFAULT_STREAM_TTL = 120
+AUDIO_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'audio_cache.sqlite3')
+AUDIO_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# instructions.json prompts that main.py narrates along with their text when NARRATE_PROMPTS is on
+NARRATED_PROMPTS = ("welcome_message", "name_prompt", "age_prompt", "location_prompt", "begin_story")
+
+class TTSError(Exception):
+    pass
+
+class ElevenLabsClient:
+    """
+    Text-to-speech over ElevenLabs' streaming endpoint, through one pooled aiohttp session so
+    segments after the first reuse the open TLS connection. stream() yields MP3 chunks as they
+    arrive. Requests that fail before any audio arrives (connection errors, timeouts, 429 and
+    5xx responses) are retried with exponential backoff.
+    """
+    def __init__(self, api_key, voice_id=DEFAULT_VOICE_ID, model_id=DEFAULT_MODEL_ID, base_url=ELEVENLABS_URL,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, connection_limit=16):
+        self.api_key = api_key
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.connection_limit = connection_limit
+        self.session = None
+        self.loop = None
+
+    def _session(self):
+        loop = asyncio.get_running_loop()
+        # A session belongs to the event loop it was created on
+        if self.session is None or self.session.closed or self.loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self.loop = loop
+        return self.session
+
+    def payload(self, text, language=None):
+        payload = {"text": text, "model_id": self.model_id}
+        if language == "zh":
+            payload["language"] = "zh"
+        return payload
+
+    async def _open(self, text, language):
+        if not self.api_key:
+            raise TTSError("ELEVENLABS API key not found in the .env file!")
+        url = f"{self.base_url}/v1/text-to-speech/{self.voice_id}/stream"
+        headers = {"xi-api-key": self.api_key, "Content-Type": "application/json"}
+        params = {"optimize_streaming_latency": "1"}
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (1 + random.random() / 2))
+            try:
+                response = await self._session().post(url, json=self.payload(text, language), headers=headers,
+                                                      params=params)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = TTSError(f"ElevenLabs request failed: {e!r}")
+                continue
+            if response.status == 200:
+                return response
+            error = TTSError(f"Error with ElevenLabs API ({response.status}): {await response.text()}")
+            response.release()
+            if response.status not in RETRY_STATUSES:
+                break
+        raise error
+
+    async def stream(self, text, language=None):
+        """
+        Yields the MP3 audio for `text` chunk by chunk as ElevenLabs produces it.
+        Raises TTSError if no audio could be obtained.
+        """
+        response = await self._open(text, language)
+        try:
+            async for chunk in response.content.iter_any():
+                yield chunk
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TTSError(f"ElevenLabs stream interrupted: {e!r}") from e
+        finally:
+            response.release()
+
+    async def synthesize(self, text, language=None):
+        return b"".join([chunk async for chunk in self.stream(text, language)])
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+class AudioStreams:
+    """
+    Audio streams waiting to be fetched by the browser. open() waits for a stream's first chunk,
+    so failures surface before a player is shown, and returns a token; take(token) returns the
+    whole stream to serve. Streams not taken within `ttl` seconds are closed.
+    """
+    def __init__(self, ttl=DEFAULT_STREAM_TTL):
+        self.ttl = ttl
+        self.streams = {}
+
+    async def open(self, chunks):
+        await self.expire()
+        iterator = chunks.__aiter__()
+        try:
+            first = await iterator.__anext__()
+        except StopAsyncIteration:
+            first = b""
+
+        async def replay():
+            if first:
+                yield first
+            async for chunk in iterator:
+                yield chunk
+
+        token = uuid.uuid4().hex
+        self.streams[token] = (time.monotonic(), replay(), iterator)
+        return token
+
+    def take(self, token):
+        entry = self.streams.pop(token, None)
+        return entry[1] if entry else None
+
+    async def expire(self):
+        now = time.monotonic()
+        for token, (opened, _, iterator) in list(self.streams.items()):
+            if now - opened > self.ttl:
+                del self.streams[token]
+                if hasattr(iterator, "aclose"):
+                    await iterator.aclose()
+
+def normalize_text(text):
+    """
+    Canonical form of a narration for cache keys: Unicode NFC with runs of whitespace collapsed.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def audio_key(text, voice_id, model_id, language):
+    parts = (normalize_text(text), voice_id, model_id, language or "")
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+class AudioCache(ChunkCache):
+    """
+    Synthesized MP3s in the SQLite LRU store of db.cache, keyed by audio_key, so narrating the
+    same text with the same voice, model and language again costs one lookup.
+    """
+    def __init__(self, path=AUDIO_CACHE_PATH, max_bytes=AUDIO_CACHE_MAX_BYTES, max_entries=None):
+        super().__init__(path, max_bytes=max_bytes, max_entries=max_entries)
+
+    def get_audio(self, key):
+        value = self._get([f"audio:{key}"]).get(f"audio:{key}")
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bytes(value)
+
+    def put_audio(self, key, audio):
+        self._put([(f"audio:{key}", audio)])
+
+class CachedTTS:
+    """
+    Serves narrations from an AudioCache and synthesizes only cache misses through the client,
+    storing the audio once its stream has completed. The cache is opened on first use, on the
+    thread of the event loop that uses it.
+    """
+    def __init__(self, client, cache_path=AUDIO_CACHE_PATH, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.client = client
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self._cache = None
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = AudioCache(self.cache_path, max_bytes=self.max_bytes)
+        return self._cache
+
+    def key(self, text, language=None):
+        return audio_key(text, self.client.voice_id, self.client.model_id, language)
+
+    def cached(self, text, language=None):
+        """
+        Returns the cached audio for `text`, or None.
+        """
+        return self.cache.get_audio(self.key(text, language))
+
+    async def stream(self, text, language=None):
+        """
+        Yields the audio for `text`: the cached MP3 in one piece, or the client's stream, which
+        is cached once it has been received completely.
+        """
+        key = self.key(text, language)
+        audio = self.cache.get_audio(key)
+        if audio is not None:
+            yield audio
+            return
+        chunks = []
+        async for chunk in self.client.stream(text, language):
+            chunks.append(chunk)
+            yield chunk
+        self.cache.put_audio(key, b"".join(chunks))
+
+    async def synthesize(self, text, language=None):
+        return b"".join([chunk async for chunk in self.stream(text, language)])
+
+    async def prewarm(self, narrations, concurrency=4):
+        """
+        Synthesizes every (text, language) pair not cached yet, `concurrency` at a time, e.g. at
+        deploy time. Returns the number synthesized and the number already cached.
+        """
+        narrations = list(dict.fromkeys((text, language) for text, language in narrations if text.strip()))
+        missing = [(text, language) for text, language in narrations if self.cached(text, language) is None]
+        limit = asyncio.Semaphore(concurrency)
+
+        async def synthesize(text, language):
+            async with limit:
+                await self.synthesize(text, language)
+
+        await asyncio.gather(*(synthesize(text, language) for text, language in missing))
+        return len(missing), len(narrations) - len(missing)
+
+    def close(self):
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+
+def static_narrations(all_instructions, keys=None):
+    """
+    Returns the (text, language) pairs of the instructions.json prompts that are narrated, for
+    every language in the file.
+    """
+    return [(text, language) for language, instructions in all_instructions.items()
+            for key, text in instructions.items()
+            if isinstance(text, str) and (keys is None or key in keys)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthesize the narrated instructions.json prompts into the audio cache.")
+    parser.add_argument("instructions", help="Path to instructions.json")
+    parser.add_argument("--cache", default=AUDIO_CACHE_PATH, help="Audio cache path")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    with open(args.instructions, encoding="utf-8") as f:
+        narrations = static_narrations(json.load(f), NARRATED_PROMPTS)
+
+    async def prewarm():
+        tts = CachedTTS(ElevenLabsClient(os.getenv("ELEVENLABS_API_KEY")), cache_path=args.cache)
+        try:
+            return await tts.prewarm(narrations, concurrency=args.concurrency)
+        finally:
+            await tts.client.close()
+            tts.close()
+
+    synthesized, cached = asyncio.run(prewarm())
+    print(f"Synthesized {synthesized} prompts; {cached} were already cached.")
+
+if __name__ == "__main__":
+    main()